@@ -0,0 +1,209 @@
+"""
+Controle de admissão das requisições por classe de tráfego.
+
+Cada requisição cai numa classe (pela rota ou pelo blueprint) e só entra
+se houver vaga na classe; se não houver, espera numa fila limitada até
+ESPERA segundos. Com a fila cheia (ou a espera esgotada) a resposta é 429
+com Retry-After, sem ocupar thread nem conexão com o banco.
+
+  - checkout: criar aluguel, devolver, pagamento. Nunca espera nem é
+    recusado aqui e é o único que usa as conexões da reserva do pool
+    (DB_POOL_RESERVA).
+  - catalogo: o resto do site (carros, clientes, cotação, imagens...).
+  - relatorios: relatórios, estatísticas e históricos. Também é recusado
+    na hora quando as vagas comuns do pool primário já estão todas em uso,
+    porque ficaria esperando conexão de qualquer forma.
+  - admin: funcionários e /metricas.
+  - stream: conexões longas (SSE de /eventos/stream). Seguram a vaga até o
+    cliente desconectar, então têm vagas próprias e não esperam na fila:
+    páginas abertas não ocupam as vagas do catálogo.
+
+Limites por classe em ADMISSAO_<CLASSE>="limite,fila" (ex.:
+ADMISSAO_RELATORIOS="4,8").
+"""
+import math
+import os
+import threading
+import time
+
+from flask import g, jsonify, request
+
+from database.conector import DB_REPLICA_CONFIG, PRIMARIO, monitor_replica, pool_existente
+
+CHECKOUT = "checkout"
+CATALOGO = "catalogo"
+RELATORIOS = "relatorios"
+ADMIN = "admin"
+STREAM = "stream"
+
+# classe das rotas sem @classe_admissao, pelo nome do blueprint
+CLASSES_BLUEPRINT = {
+    "relatorios": RELATORIOS,
+    "funcionarios": ADMIN,
+    "metricas": ADMIN,
+}
+
+
+def _limites(classe, limite, fila):
+    valor = os.environ.get(f"ADMISSAO_{classe.upper()}")
+    if valor:
+        limite, fila = (int(v) for v in valor.split(","))
+    return limite, fila
+
+
+class ClasseAdmissao:
+    """Vagas, fila limitada e contadores de uma classe de tráfego"""
+
+    def __init__(self, nome, limite, fila, espera, descartar_pool_cheio=False):
+        self.nome = nome
+        self.limite = limite           # None: sem limite
+        self.fila = fila
+        self.espera = espera
+        self.descartar_pool_cheio = descartar_pool_cheio
+        self.retry_after = max(math.ceil(espera), 1)
+        self._cond = threading.Condition()
+        self.ativas = 0
+        self.esperando = 0
+        self.admitidas = 0
+        self.esperaram = 0
+        self.tempo_espera = 0.0
+        self.recusadas_fila = 0
+        self.recusadas_espera = 0
+        self.recusadas_pool = 0
+
+    def entrar(self):
+        """True se admitida (chamar sair() depois); False se deve ser recusada"""
+        with self._cond:
+            if self.limite is None or self.ativas < self.limite:
+                self.ativas += 1
+                self.admitidas += 1
+                return True
+            if self.esperando >= self.fila:
+                self.recusadas_fila += 1
+                return False
+            self.esperando += 1
+            self.esperaram += 1
+            inicio = time.monotonic()
+            prazo = inicio + self.espera
+            try:
+                while self.ativas >= self.limite:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self.recusadas_espera += 1
+                        return False
+                    self._cond.wait(restante)
+                self.ativas += 1
+                self.admitidas += 1
+                return True
+            finally:
+                self.esperando -= 1
+                self.tempo_espera += time.monotonic() - inicio
+
+    def sair(self):
+        with self._cond:
+            self.ativas -= 1
+            self._cond.notify()
+
+    def metricas(self):
+        with self._cond:
+            return {
+                "limite": self.limite,
+                "fila": self.fila,
+                "ativas": self.ativas,
+                "esperando": self.esperando,
+                "admitidas": self.admitidas,
+                "esperaram": self.esperaram,
+                "espera_media_ms": round(1000 * self.tempo_espera / self.esperaram, 3) if self.esperaram else 0,
+                "recusadas_fila": self.recusadas_fila,
+                "recusadas_espera": self.recusadas_espera,
+                "recusadas_pool": self.recusadas_pool,
+            }
+
+
+class ControleAdmissao:
+    def __init__(self):
+        self.classes = {
+            CHECKOUT: ClasseAdmissao(CHECKOUT, None, 0, 0),
+            CATALOGO: ClasseAdmissao(CATALOGO, *_limites(CATALOGO, 32, 64), espera=2.0),
+            RELATORIOS: ClasseAdmissao(RELATORIOS, *_limites(RELATORIOS, 4, 8), espera=1.0,
+                                       descartar_pool_cheio=True),
+            ADMIN: ClasseAdmissao(ADMIN, *_limites(ADMIN, 4, 8), espera=2.0),
+            STREAM: ClasseAdmissao(STREAM, *_limites(STREAM, 256, 0), espera=0),
+        }
+
+    def classificar(self, view, blueprint):
+        nome = getattr(view, "classe_admissao", None) or CLASSES_BLUEPRINT.get(blueprint, CATALOGO)
+        return self.classes[nome]
+
+    @staticmethod
+    def _pool_primario_cheio():
+        # com réplica em uso as leituras nem disputam o pool do primário
+        if DB_REPLICA_CONFIG is not None and monitor_replica.disponivel:
+            return False
+        # pool ainda não criado (nenhuma requisição usou o banco): não está cheio.
+        # Aqui não se abre conexão: rotas sem banco não podem falhar por isso
+        pool = pool_existente(PRIMARIO)
+        try:
+            return pool is not None and pool.vagas_comuns_esgotadas()
+        except Exception as e:
+            print(f"Erro ao verificar o pool primário: {e}")
+            return False
+
+    def admitir(self, classe):
+        """True se a requisição pode seguir; em seguida chamar classe.sair()"""
+        if classe.descartar_pool_cheio and self._pool_primario_cheio():
+            classe.recusadas_pool += 1
+            return False
+        return classe.entrar()
+
+    def metricas(self):
+        return {nome: classe.metricas() for nome, classe in self.classes.items()}
+
+
+controle_admissao = ControleAdmissao()
+
+
+def classe_admissao(classe):
+    """Define a classe de admissão da rota (no lugar da do blueprint)"""
+    def decorador(func):
+        func.classe_admissao = classe
+        return func
+    return decorador
+
+
+def configurar_admissao(app):
+    """
+    Admite ou recusa (429) cada requisição antes da rota e libera a vaga no
+    fim; respostas em stream (arquivos dos jobs) só liberam quando o
+    stream termina de ser enviado.
+    """
+    @app.before_request
+    def admitir():
+        if request.method == "OPTIONS" or request.endpoint is None:
+            return None
+        classe = controle_admissao.classificar(app.view_functions.get(request.endpoint), request.blueprint)
+        if classe.nome == CHECKOUT:
+            g.usa_reserva_pool = True
+        if not controle_admissao.admitir(classe):
+            response = jsonify({"erro": "Servidor ocupado, tente novamente em instantes.",
+                                "classe": classe.nome})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(classe.retry_after)
+            return response
+        g.classe_admissao = classe
+        return None
+
+    @app.after_request
+    def manter_vaga_no_stream(response):
+        # o corpo em stream é gerado depois do teardown: a vaga vai junto com ele
+        if response.is_streamed:
+            classe = g.pop("classe_admissao", None)
+            if classe is not None:
+                response.call_on_close(classe.sair)
+        return response
+
+    @app.teardown_request
+    def liberar_vaga(_erro=None):
+        classe = g.pop("classe_admissao", None)
+        if classe is not None:
+            classe.sair()
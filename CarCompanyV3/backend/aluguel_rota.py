@@ -1,7 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for
 from database.conector import DatabaseManager
+from database.eventos import registrar_evento
+from admissao import CHECKOUT, classe_admissao
+from database import perfil_cliente
+from database.arquivamento import consulta_historico
+from pix import payload_pix, qrcode_pix
+from cotacao import (
+    ADICIONAL_SEGURO, ALUGUEIS_CLIENTE_FIEL, DESCONTO_CLIENTE_FIEL, DESCONTO_RESERVA_ANTECIPADA,
+    DESCONTO_SEM_MULTAS, DESCONTO_TODAS_CATEGORIAS, DESCONTO_TODOS_ACESSORIOS,
+    DIAS_RESERVA_ANTECIPADA, SEQUENCIA_SEM_MULTAS,
+)
 from datetime import datetime, date, timedelta
 import re
+from psycopg2.errors import UniqueViolation
 
 aluguel_blueprint = Blueprint("aluguel", __name__)
 
@@ -53,23 +64,45 @@ def parse_date(s):
     except Exception:
         return None
 
+
+def filtro_retirada(db, num_locacao, coluna):
+    """
+    (sql, params) que restringe `coluna` (data_retirada) ao dia da retirada,
+    para as consultas em Aluguel/Devolucao lerem só a partição do mês. O dia
+    vem de ?data_retirada= ou, sem ele, de AluguelAberto (locação aberta).
+    Sem nenhum dos dois (locação devolvida) o filtro fica vazio e a consulta
+    procura só pelo num_locacao, em todas as partições.
+    ValueError se ?data_retirada= não for uma data válida.
+    """
+    dia = request.args.get("data_retirada")
+    if dia:
+        inicio = datetime.strptime(dia, "%Y-%m-%d")
+        return f" AND {coluna} >= %s AND {coluna} < %s", (inicio, inicio + timedelta(days=1))
+
+    aberto = db.execute_select_one(
+        "SELECT data_retirada FROM AluguelAberto WHERE num_locacao = %s", (num_locacao,))
+    if not aberto:
+        return "", ()
+    return f" AND {coluna} = %s", (aberto["data_retirada"],)
+
 # =========================================================
 # Funções de Cálculo de Multas
 # =========================================================
 
 
-def calcular_multa_atraso(db, num_locacao, data_devolucao):
+def calcular_multa_atraso(db, num_locacao, data_retirada, data_devolucao):
     """Calcula multa por atraso na devolução"""
     try:
         # Buscar data prevista e preço da diária
+        # (data_retirada na chave: a consulta lê só a partição do mês)
         query = """
             SELECT a.data_prevista_devolucao, cat.preco_diaria
             FROM Aluguel a
             JOIN Carro c ON a.placa = c.placa
             JOIN Categoria cat ON c.tipo_categoria = cat.tipo
-            WHERE a.num_locacao = %s
+            WHERE a.num_locacao = %s AND a.data_retirada = %s
         """
-        aluguel = db.execute_select_one(query, (num_locacao,))
+        aluguel = db.execute_select_one(query, (num_locacao, data_retirada))
 
         if not aluguel:
             return 0, 0
@@ -113,12 +146,12 @@ def calcular_multa_danos(valor_danos):
         return 0.00
 
 
-def calcular_multa_km(db, num_locacao, km_registro):
+def calcular_multa_km(db, num_locacao, data_retirada, km_registro):
     """Calcula multa por excesso de quilometragem"""
     try:
         # Buscar km previsto
-        query = "SELECT km_previsto FROM Aluguel WHERE num_locacao = %s"
-        aluguel = db.execute_select_one(query, (num_locacao,))
+        query = "SELECT km_previsto FROM Aluguel WHERE num_locacao = %s AND data_retirada = %s"
+        aluguel = db.execute_select_one(query, (num_locacao, data_retirada))
 
         if not aluguel or not aluguel.get('km_previsto'):
             return 0, 0
@@ -135,7 +168,7 @@ def calcular_multa_km(db, num_locacao, km_registro):
         return 0, 0
 
 
-def calcular_multa_atraso_progressivo(db, num_locacao, data_devolucao):
+def calcular_multa_atraso_progressivo(db, num_locacao, data_retirada, data_devolucao):
     """Calcula multa progressiva por atraso"""
     try:
         query = """
@@ -143,9 +176,9 @@ def calcular_multa_atraso_progressivo(db, num_locacao, data_devolucao):
             FROM Aluguel a
             JOIN Carro c ON a.placa = c.placa
             JOIN Categoria cat ON c.tipo_categoria = cat.tipo
-            WHERE a.num_locacao = %s
+            WHERE a.num_locacao = %s AND a.data_retirada = %s
         """
-        aluguel = db.execute_select_one(query, (num_locacao,))
+        aluguel = db.execute_select_one(query, (num_locacao, data_retirada))
 
         if not aluguel:
             return 0, 0
@@ -185,40 +218,26 @@ def calcular_multa_atraso_progressivo(db, num_locacao, data_devolucao):
 # =========================================================
 
 
-def calcular_desconto_cliente_fiel(db, cpf_cliente):
+def calcular_desconto_cliente_fiel(perfil):
     """Desconto para clientes com 5 ou mais locações"""
-    try:
-        query = "SELECT COUNT(*) as total FROM Aluguel WHERE cpf_cliente = %s"
-        resultado = db.execute_select_one(query, (cpf_cliente,))
-
-        if resultado and resultado['total'] >= 5:
-            return 50.00  # R$ 50,00 fixo
-        return 0.00
-    except Exception as e:
-        print(f"Erro ao calcular desconto fidelidade: {e}")
-        return 0.00
+    if perfil and perfil['total_alugueis'] >= ALUGUEIS_CLIENTE_FIEL:
+        return DESCONTO_CLIENTE_FIEL
+    return 0.00
 
 
-def calcular_desconto_reserva_antecipada(db, num_locacao):
-    """Desconto por reserva antecipada (mais de 7 dias)"""
+def calcular_desconto_reserva_antecipada(aluguel):
+    """Desconto por reserva antecipada (retirada 7 dias ou mais depois da reserva)"""
     try:
-        query = "SELECT data_retirada FROM Aluguel WHERE num_locacao = %s"
-        aluguel = db.execute_select_one(query, (num_locacao,))
-
-        if not aluguel:
+        data_retirada = to_date_obj(aluguel.get('data_retirada'))
+        data_reserva = to_date_obj(aluguel.get('data_reserva'))
+        if not data_retirada or not data_reserva:
             return 0.00
 
-        data_retirada_raw = aluguel.get('data_retirada')
-        data_retirada = to_date_obj(data_retirada_raw)
-        if not data_retirada:
-            return 0.00
+        # mesma antecedência usada na cotação: da reserva até a retirada
+        dias_antecedencia = (data_retirada - data_reserva).days
 
-        # Se a data de retirada for mais de 7 dias após a data atual de criação
-        # (Aqui estamos usando a data atual como proxy para data da reserva)
-        dias_antecedencia = (data_retirada - date.today()).days
-
-        if dias_antecedencia >= 7:
-            return 30.00  # R$ 30,00 fixo
+        if dias_antecedencia >= DIAS_RESERVA_ANTECIPADA:
+            return DESCONTO_RESERVA_ANTECIPADA
         return 0.00
 
     except Exception as e:
@@ -226,99 +245,36 @@ def calcular_desconto_reserva_antecipada(db, num_locacao):
         return 0.00
 
 
-def calcular_desconto_sem_multas(db, cpf_cliente, num_locacao_atual):
+def calcular_desconto_sem_multas(perfil):
     """Desconto por não ter multas nas últimas 5 locações"""
-    try:
-        # Buscar últimas 5 locações (excluindo a atual)
-        query = """
-            SELECT a.num_locacao
-            FROM Aluguel a
-            WHERE a.cpf_cliente = %s AND a.num_locacao != %s
-            ORDER BY a.data_retirada DESC
-            LIMIT 5
-        """
-        locacoes = db.execute_select_all(
-            query, (cpf_cliente, num_locacao_atual))
-
-        if len(locacoes) < 5:
-            return 0.00
-
-        # Verificar se alguma dessas locações teve multa
-        for locacao in locacoes:
-            query_multas = """
-                SELECT 1 FROM Multa m
-                JOIN Pagamento p ON m.num_pagamento = p.num_pagamento
-                JOIN Devolucao d ON d.num_pagamento = p.num_pagamento
-                WHERE d.num_locacao = %s
-            """
-            tem_multa = db.execute_select_one(
-                query_multas, (locacao['num_locacao'],))
-            if tem_multa:
-                return 0.00
-
-        return 40.00  # R$ 40,00 fixo
-
-    except Exception as e:
-        print(f"Erro ao calcular desconto sem multas: {e}")
-        return 0.00
+    # o perfil ainda não conta a devolução atual
+    if perfil and perfil['sequencia_sem_multas'] >= SEQUENCIA_SEM_MULTAS:
+        return DESCONTO_SEM_MULTAS
+    return 0.00
 
 
-def calcular_desconto_todas_categorias(db, cpf_cliente):
+def calcular_desconto_todas_categorias(perfil):
     """Desconto por ter alugado todas as categorias"""
-    try:
-        query = """
-            SELECT COUNT(DISTINCT c.tipo_categoria) as categorias_utilizadas
-            FROM Aluguel a
-            JOIN Carro c ON a.placa = c.placa
-            WHERE a.cpf_cliente = %s
-        """
-        resultado = db.execute_select_one(query, (cpf_cliente,))
-
-        total_categorias_query = "SELECT COUNT(*) as total FROM Categoria"
-        total_categorias = db.execute_select_one(total_categorias_query)
-
-        if (resultado and total_categorias and
-                resultado['categorias_utilizadas'] == total_categorias['total']):
-            return 60.00  # R$ 60,00 fixo
-        return 0.00
-
-    except Exception as e:
-        print(f"Erro ao calcular desconto todas categorias: {e}")
-        return 0.00
+    if perfil and perfil['todas_categorias'] and \
+            perfil['mascara_categorias'] & perfil['todas_categorias'] == perfil['todas_categorias']:
+        return DESCONTO_TODAS_CATEGORIAS
+    return 0.00
 
 
-def calcular_desconto_todos_acessorios(db, cpf_cliente):
+def calcular_desconto_todos_acessorios(perfil):
     """Desconto por ter usado todos os acessórios"""
-    try:
-        query = """
-            SELECT COUNT(DISTINCT aa.tipo_acessorio) as acessorios_utilizados
-            FROM Aluguel a
-            JOIN Aluguel_Acessorio aa ON a.num_locacao = aa.num_locacao
-            WHERE a.cpf_cliente = %s
-        """
-        resultado = db.execute_select_one(query, (cpf_cliente,))
-
-        total_acessorios_query = "SELECT COUNT(*) as total FROM Acessorio"
-        total_acessorios = db.execute_select_one(total_acessorios_query)
-
-        if (resultado and total_acessorios and
-                resultado['acessorios_utilizados'] == total_acessorios['total']):
-            return 45.00  # R$ 45,00 fixo
-        return 0.00
-
-    except Exception as e:
-        print(f"Erro ao calcular desconto todos acessórios: {e}")
-        return 0.00
+    if perfil and perfil['todos_acessorios'] and \
+            perfil['mascara_acessorios'] & perfil['todos_acessorios'] == perfil['todos_acessorios']:
+        return DESCONTO_TODOS_ACESSORIOS
+    return 0.00
 
 
 # =========================================================
 # 4) REALIZAR DEVOLUÇÃO - ATUALIZADA COM MULTAS E DESCONTOS
 # =========================================================
 
-db = DatabaseManager()
-
-
 @aluguel_blueprint.route("/aluguel", methods=["POST"])
+@classe_admissao(CHECKOUT)
 def criar_aluguel():
     data = request.json or {}
     # exigir cpf_cliente mesmo que Aluguel não guarde — vamos inserir em HistoricoAluguel
@@ -340,7 +296,7 @@ def criar_aluguel():
     try:
         # 1) verificar se o carro existe
         carro = db.execute_select_one(
-            "SELECT placa, tipo_categoria FROM Carro WHERE placa = %s", (data["placa"],))
+            "SELECT placa, tipo_categoria, num_manutencao FROM Carro WHERE placa = %s", (data["placa"],))
         if not carro:
             return jsonify({"erro": "Carro inexistente"}), 404
 
@@ -352,44 +308,33 @@ def criar_aluguel():
             if man and (man.get("data_retorno") is None or to_date_obj(man.get("data_retorno")) > datetime.today().date()):
                 return jsonify({"erro": "Carro em manutenção e indisponível."}), 400
 
-        novo_status = "ALUGADO"
-        db.execute_statement(
-            "UPDATE Carro SET status_carro = %s WHERE placa = %s",
-            (novo_status, (data["placa"],))
-        )
-
-        # 3) verificar se já existe aluguel ativo para essa placa (Aluguel sem Devolucao)
-        check_active = """
-            SELECT 1 FROM Aluguel a
-            LEFT JOIN Devolucao d ON d.num_locacao = a.num_locacao
-            WHERE a.placa = %s AND d.num_locacao IS NULL
-            LIMIT 1;
-        """
-        ativo = db.execute_select_one(check_active, (data["placa"],))
+        # 3) verificar se já existe aluguel ativo para essa placa
+        #    (o UNIQUE de AluguelAberto.placa garante o mesmo na inserção)
+        ativo = db.execute_select_one(
+            "SELECT 1 FROM AluguelAberto WHERE placa = %s;", (data["placa"],))
         if ativo:
             return jsonify({"erro": "Carro já está alugado (aluguel sem devolução)."}), 400
 
         # 4) inserir Aluguel
-        # tipo_acessorio na tabela é VARCHAR(50) — se o cliente enviar lista, juntamos por ', '
-        acessorios = data.get("acessorios")
-        if isinstance(acessorios, list):
-            # cortar para caber no campo se preciso
-            tipo_acessorio = ", ".join(acessorios)[:50]
-        else:
-            tipo_acessorio = (acessorios or data.get("tipo_acessorio") or None)
-            if tipo_acessorio and len(tipo_acessorio) > 50:
-                tipo_acessorio = tipo_acessorio[:50]
+        # acessórios: lista ou texto separado por vírgula (vão para Aluguel_Acessorio)
+        acessorios = data.get("acessorios") or data.get("tipo_acessorio") or []
+        if isinstance(acessorios, str):
+            acessorios = acessorios.split(",")
+        acessorios = sorted({a.strip() for a in acessorios if a and a.strip()})
         cpf_cliente = data.get("cpf_cliente")
         query_aluguel = """
             INSERT INTO Aluguel
-            (data_retirada, data_prevista_devolucao, valor_previsto, num_funcionario, placa, cpf_cliente)
-            VALUES (%s, %s, %s,%s,%s,%s)
-            RETURNING num_locacao;
+            (data_retirada, data_prevista_devolucao, valor_previsto, num_funcionario, placa, cpf_cliente,
+             seguro_contratado)
+            VALUES (%s, %s, %s,%s,%s,%s,%s)
+            RETURNING num_locacao, data_retirada;
         """
 
         def parse_currency(value):
             if not value:
                 return 0
+            if isinstance(value, (int, float)):
+                return float(value)
 
             # Remove símbolo de moeda e espaços especiais (inclui \xa0)
             cleaned = (
@@ -404,32 +349,58 @@ def criar_aluguel():
             return float(cleaned)
 
         valor_previsto = parse_currency(data.get("valor_previsto"))
-        loc = db.execute_insert_returning(query_aluguel, (
-            data_retirada,
-            data_prevista,
-            valor_previsto,
-            data["num_funcionario"],
-            data["placa"],
-            cpf_cliente
-        ))
-        num_locacao = loc["num_locacao"]
-
-        # 5) registrar histórico do cliente na tabela HistoricoAluguel
-        cpf = data["cpf_cliente"]
-        db.execute_statement(
-            "INSERT INTO HistoricoAluguel (num_locacao, cpf) VALUES (%s, %s)",
-            (num_locacao, cpf)
-        )
-
-        # Se o seu DatabaseManager expõe conn, comitar explicitamente
-        try:
-            if hasattr(db, "conn") and db.conn:
-                db.conn.commit()
-        except Exception:
-            pass
+        novo_status = "ALUGADO"
+
+        # 5) status do carro, locação, histórico e evento numa única transação
+        with db.transacao():
+            db.execute_statement(
+                "UPDATE Carro SET status_carro = %s WHERE placa = %s",
+                (novo_status, data["placa"])
+            )
+
+            loc = db.execute_insert_returning(query_aluguel, (
+                data_retirada,
+                data_prevista,
+                valor_previsto,
+                data["num_funcionario"],
+                data["placa"],
+                cpf_cliente,
+                bool(data.get("seguro_contratado"))
+            ))
+            num_locacao = loc["num_locacao"]
+            # chave completa da locação (Aluguel é particionada por data_retirada)
+            chave_locacao = (num_locacao, loc["data_retirada"])
+
+            # registrar histórico do cliente na tabela HistoricoAluguel
+            cpf = data["cpf_cliente"]
+            db.execute_statement(
+                "INSERT INTO HistoricoAluguel (num_locacao, data_retirada, cpf) VALUES (%s, %s, %s)",
+                (*chave_locacao, cpf)
+            )
+
+            # acessórios válidos (os desconhecidos são ignorados)
+            if acessorios:
+                db.execute_statement("""
+                    INSERT INTO Aluguel_Acessorio (num_locacao, data_retirada, tipo_acessorio)
+                    SELECT %s, %s, tipo FROM Acessorio WHERE tipo = ANY(%s);
+                """, (*chave_locacao, acessorios))
+
+            perfil_cliente.registrar_aluguel(db, cpf, carro["tipo_categoria"], acessorios)
+
+            registrar_evento(db, "ALUGUEL_CRIADO", data["placa"], {
+                "num_locacao": num_locacao,
+                "placa": data["placa"],
+                "cpf_cliente": cpf,
+                "status_carro": novo_status
+            })
 
         return jsonify({"mensagem": "Locação realizada!", "num_locacao": num_locacao}), 201
 
+    except UniqueViolation as e:
+        # outra requisição alugou o mesmo carro entre a verificação e o INSERT
+        if e.diag.constraint_name == "uq_aluguel_aberto_placa":
+            return jsonify({"erro": "Carro já está alugado (aluguel sem devolução)."}), 400
+        return internal_error(f"Erro ao abrir locação: {str(e)}")
     except Exception as e:
         # tentar rollback se possível
         try:
@@ -441,6 +412,7 @@ def criar_aluguel():
 
 
 @aluguel_blueprint.route("/aluguel/devolver", methods=["POST"])
+@classe_admissao(CHECKOUT)
 def devolver_carro():
     data = request.json or {}
     required = ["num_locacao", "estado_carro", "combustivel_completo"]
@@ -453,13 +425,11 @@ def devolver_carro():
         # 1) Buscar aluguel e verificar se não foi devolvido
         aluguel = db.execute_select_one("""
             SELECT a.*, c.tipo_categoria, cat.preco_diaria, c.placa, a.cpf_cliente
-            FROM Aluguel a
+            FROM AluguelAberto ab
+            JOIN Aluguel a ON a.num_locacao = ab.num_locacao AND a.data_retirada = ab.data_retirada
             JOIN Carro c ON a.placa = c.placa
             JOIN Categoria cat ON c.tipo_categoria = cat.tipo
-            WHERE a.num_locacao = %s 
-            AND NOT EXISTS (
-                SELECT 1 FROM Devolucao d WHERE d.num_locacao = a.num_locacao
-            )
+            WHERE ab.num_locacao = %s
         """, (data["num_locacao"],))
 
         if not aluguel:
@@ -485,13 +455,23 @@ def devolver_carro():
 
         valor_base = float(aluguel.get("preco_diaria") or 0) * dias_locacao
 
+        # seguro (+20% sobre as diárias) e acessórios por dia, como na cotação
+        valor_seguro = valor_base * ADICIONAL_SEGURO if aluguel.get("seguro_contratado") else 0.0
+        acessorios = db.execute_select_one("""
+            SELECT COALESCE(SUM(ac.preco_adicional), 0) AS preco_dia
+            FROM Aluguel_Acessorio aa
+            JOIN Acessorio ac ON ac.tipo = aa.tipo_acessorio
+            WHERE aa.num_locacao = %s AND aa.data_retirada = %s
+        """, (aluguel["num_locacao"], aluguel["data_retirada"]))
+        valor_acessorios = float(acessorios["preco_dia"] if acessorios else 0) * dias_locacao
+
         # 3) CALCULAR MULTAS
         multas = []
         valor_total_multas = 0.0
 
         # Multa por Atraso
         multa_atraso, dias_atraso = calcular_multa_atraso(
-            db, data["num_locacao"], data_devolucao)
+            db, data["num_locacao"], aluguel["data_retirada"], data_devolucao)
         if multa_atraso > 0:
             multas.append({
                 "tipo": "ATRASO",
@@ -528,7 +508,7 @@ def devolver_carro():
         km_registro = data.get("km_registro")
         if km_registro:
             multa_km, km_excedente = calcular_multa_km(
-                db, data["num_locacao"], km_registro)
+                db, data["num_locacao"], aluguel["data_retirada"], km_registro)
             if multa_km > 0:
                 multas.append({
                     "tipo": "EXCESSO_QUILOMETRAGEM",
@@ -542,8 +522,11 @@ def devolver_carro():
         descontos = []
         valor_total_descontos = 0.0
 
+        # regras de fidelidade leem só o perfil do cliente (uma linha)
+        perfil = perfil_cliente.obter_perfil(db, cpf_cliente)
+
         # Desconto Cliente Fiel
-        desc_fiel = calcular_desconto_cliente_fiel(db, cpf_cliente)
+        desc_fiel = calcular_desconto_cliente_fiel(perfil)
         if desc_fiel > 0:
             descontos.append({
                 "tipo": "CLIENTE_FIEL",
@@ -553,8 +536,7 @@ def devolver_carro():
             valor_total_descontos += desc_fiel
 
         # Desconto Reserva Antecipada
-        desc_reserva = calcular_desconto_reserva_antecipada(
-            db, data["num_locacao"])
+        desc_reserva = calcular_desconto_reserva_antecipada(aluguel)
         if desc_reserva > 0:
             descontos.append({
                 "tipo": "RESERVA_ANTECIPADA",
@@ -564,8 +546,7 @@ def devolver_carro():
             valor_total_descontos += desc_reserva
 
         # Desconto Sem Multas
-        desc_sem_multas = calcular_desconto_sem_multas(
-            db, cpf_cliente, data["num_locacao"])
+        desc_sem_multas = calcular_desconto_sem_multas(perfil)
         if desc_sem_multas > 0:
             descontos.append({
                 "tipo": "SEM_MULTAS",
@@ -575,7 +556,7 @@ def devolver_carro():
             valor_total_descontos += desc_sem_multas
 
         # Desconto Todas Categorias
-        desc_categorias = calcular_desconto_todas_categorias(db, cpf_cliente)
+        desc_categorias = calcular_desconto_todas_categorias(perfil)
         if desc_categorias > 0:
             descontos.append({
                 "tipo": "TODAS_CATEGORIAS",
@@ -585,7 +566,7 @@ def devolver_carro():
             valor_total_descontos += desc_categorias
 
         # Desconto Todos Acessórios
-        desc_acessorios = calcular_desconto_todos_acessorios(db, cpf_cliente)
+        desc_acessorios = calcular_desconto_todos_acessorios(perfil)
         if desc_acessorios > 0:
             descontos.append({
                 "tipo": "TODOS_ACESSORIOS",
@@ -595,68 +576,95 @@ def devolver_carro():
             valor_total_descontos += desc_acessorios
 
         # 5) Calcular valor final
-        valor_final = valor_base + valor_total_multas - valor_total_descontos
+        valor_final = valor_base + valor_seguro + valor_acessorios + valor_total_multas - valor_total_descontos
         valor_final = max(valor_final, 0)  # Não permitir valor negativo
 
-        # 6) Criar Pagamento
-        query_pag = "INSERT INTO Pagamento (valor_total, forma_pagamento) VALUES (%s, %s) RETURNING num_pagamento;"
-        forma_pagamento = data.get("forma_pagamento", "Pix")
-        pag = db.execute_insert_returning(
-            query_pag, (valor_final, forma_pagamento))
-        num_pagamento_final = pag["num_pagamento"]
-
-        # 7) Inserir Devolucao com dados adicionais
-        query_dev = """
-            INSERT INTO Devolucao 
-            (num_locacao, num_pagamento, combustivel_completo, estado_carro, data_real_devolucao)
-            VALUES (%s, %s, %s, %s, %s);
-        """
-        db.execute_statement(query_dev, (
-            data["num_locacao"],
-            num_pagamento_final,
-            data["combustivel_completo"],
-            data["estado_carro"],
-            data_devolucao
-        ))
-
-        # 10) Atualizar status do carro baseado no estado
         estado = (data.get("estado_carro") or "").upper()
         novo_status = "DISPONIVEL"
         novo_num_manut = None
 
-        if any(tok in estado for tok in ("BATIDO", "AVARIA", "QUEBRADO", "AMASSADO", "COLISAO", "COLISÃO", "COLIDIDO", "DANIFICADO")) or multa_danos > 0:
-            # Criar Manutencao
-            query_ins_m = """
-                INSERT INTO Manutencao (placa_carro, custo, data_inicio, descricao) 
-                VALUES (%s, %s, %s, %s) 
-                RETURNING num_manutencao;
+        # 6) a 10) gravados numa única transação junto com os eventos
+        with db.transacao():
+            # 6) Criar Pagamento
+            query_pag = "INSERT INTO Pagamento (valor_total, forma_pagamento) VALUES (%s, %s) RETURNING num_pagamento;"
+            forma_pagamento = data.get("forma_pagamento", "Pix")
+            pag = db.execute_insert_returning(
+                query_pag, (valor_final, forma_pagamento))
+            num_pagamento_final = pag["num_pagamento"]
+
+            # 7) Inserir Devolucao com dados adicionais
+            query_dev = """
+                INSERT INTO Devolucao 
+                (num_locacao, data_retirada, num_pagamento, combustivel_completo, estado_carro, data_real_devolucao)
+                VALUES (%s, %s, %s, %s, %s, %s);
             """
-            descricao = f"Manutenção necessária: {estado}" if multa_danos == 0 else f"Manutenção por danos no valor de R$ {multa_danos}"
-            m = db.execute_insert_returning(query_ins_m, (
-                placa,
-                multa_danos,
-                data_devolucao,
-                descricao
+            db.execute_statement(query_dev, (
+                data["num_locacao"],
+                aluguel["data_retirada"],
+                num_pagamento_final,
+                data["combustivel_completo"],
+                data["estado_carro"],
+                data_devolucao
             ))
-            if m:
-                novo_num_manut = m["num_manutencao"]
-                novo_status = "MANUTENCAO"
-
-        # Atualizar carro
-        if novo_num_manut:
-            db.execute_statement(
-                "UPDATE Carro SET status_carro = %s, num_manutencao = %s WHERE placa = %s",
-                (novo_status, novo_num_manut, placa)
-            )
-        else:
-            db.execute_statement(
-                "UPDATE Carro SET status_carro = %s WHERE placa = %s",
-                (novo_status, placa)
-            )
 
-        # Commit final
-        if hasattr(db, "conn") and db.conn:
-            db.conn.commit()
+            # 8) Registrar multas e descontos do pagamento
+            for multa in multas:
+                db.execute_statement(
+                    "INSERT INTO Multa (num_pagamento, tipo_multa, valor) VALUES (%s, %s, %s);",
+                    (num_pagamento_final, multa["tipo"], multa["valor"])
+                )
+            for desconto in descontos:
+                db.execute_statement(
+                    "INSERT INTO Desconto (num_pagamento, tipo_desconto, valor) VALUES (%s, %s, %s);",
+                    (num_pagamento_final, desconto["tipo"], desconto["valor"])
+                )
+
+            # 9) Atualizar o perfil de fidelidade do cliente
+            perfil_cliente.registrar_devolucao(db, cpf_cliente, bool(multas))
+
+            # 10) Atualizar status do carro baseado no estado
+            if any(tok in estado for tok in ("BATIDO", "AVARIA", "QUEBRADO", "AMASSADO", "COLISAO", "COLISÃO", "COLIDIDO", "DANIFICADO")) or multa_danos > 0:
+                # Criar Manutencao
+                query_ins_m = """
+                    INSERT INTO Manutencao (placa_carro, custo, data_inicio, descricao) 
+                    VALUES (%s, %s, %s, %s) 
+                    RETURNING num_manutencao;
+                """
+                descricao = f"Manutenção necessária: {estado}" if multa_danos == 0 else f"Manutenção por danos no valor de R$ {multa_danos}"
+                m = db.execute_insert_returning(query_ins_m, (
+                    placa,
+                    multa_danos,
+                    data_devolucao,
+                    descricao
+                ))
+                if m:
+                    novo_num_manut = m["num_manutencao"]
+                    novo_status = "MANUTENCAO"
+
+            # Atualizar carro
+            if novo_num_manut:
+                db.execute_statement(
+                    "UPDATE Carro SET status_carro = %s, num_manutencao = %s WHERE placa = %s",
+                    (novo_status, novo_num_manut, placa)
+                )
+                registrar_evento(db, "MANUTENCAO_CRIADA", placa, {
+                    "num_manutencao": novo_num_manut,
+                    "placa": placa,
+                    "descricao": descricao
+                })
+            else:
+                db.execute_statement(
+                    "UPDATE Carro SET status_carro = %s WHERE placa = %s",
+                    (novo_status, placa)
+                )
+
+            registrar_evento(db, "ALUGUEL_DEVOLVIDO", placa, {
+                "num_locacao": data["num_locacao"],
+                "placa": placa,
+                "cpf_cliente": cpf_cliente,
+                "num_pagamento": num_pagamento_final,
+                "status_carro": novo_status
+            })
 
         # 11) Preparar resposta detalhada
         response_data = {
@@ -664,6 +672,8 @@ def devolver_carro():
             "num_pagamento": num_pagamento_final,
             "resumo_financeiro": {
                 "valor_base": valor_base,
+                "valor_seguro": valor_seguro,
+                "valor_acessorios": valor_acessorios,
                 "total_multas": valor_total_multas,
                 "total_descontos": valor_total_descontos,
                 "valor_final": valor_final
@@ -704,14 +714,20 @@ def obter_multas_aluguel(num_locacao):
     """Retorna todas as multas aplicadas em um aluguel"""
     db = DatabaseManager()
     try:
+        try:
+            retirada, params_retirada = filtro_retirada(db, num_locacao, "d.data_retirada")
+        except ValueError:
+            return jsonify({"erro": "Data inválida. Use o formato YYYY-MM-DD"}), 400
+
         query = """
-            SELECT m.*, p.valor_total as valor_pagamento
-            FROM Multa m
-            JOIN Pagamento p ON m.num_pagamento = p.num_pagamento
-            JOIN Devolucao d ON d.num_pagamento = p.num_pagamento
+            SELECT m.id_multa, m.num_pagamento, m.tipo_multa, m.valor,
+                   p.valor_total as valor_pagamento
+            FROM {Multa} m
+            JOIN {Pagamento} p ON m.num_pagamento = p.num_pagamento
+            JOIN {Devolucao} d ON d.num_pagamento = p.num_pagamento
             WHERE d.num_locacao = %s
-        """
-        multas = db.execute_select_all(query, (num_locacao,))
+        """ + retirada
+        multas = db.execute_select_all(consulta_historico(query), (num_locacao, *params_retirada))
         return jsonify({"multas": multas}), 200
     except Exception as e:
         return internal_error(str(e))
@@ -738,14 +754,20 @@ def obter_descontos_aluguel(num_locacao):
     """Retorna todos os descontos aplicados em um aluguel"""
     db = DatabaseManager()
     try:
+        try:
+            retirada, params_retirada = filtro_retirada(db, num_locacao, "dev.data_retirada")
+        except ValueError:
+            return jsonify({"erro": "Data inválida. Use o formato YYYY-MM-DD"}), 400
+
         query = """
-            SELECT d.*, p.valor_total as valor_pagamento
-            FROM Desconto d
-            JOIN Pagamento p ON d.num_pagamento = p.num_pagamento
-            JOIN Devolucao dev ON dev.num_pagamento = p.num_pagamento
+            SELECT d.id_desconto, d.num_pagamento, d.tipo_desconto, d.valor, d.flag_ativo,
+                   p.valor_total as valor_pagamento
+            FROM {Desconto} d
+            JOIN {Pagamento} p ON d.num_pagamento = p.num_pagamento
+            JOIN {Devolucao} dev ON dev.num_pagamento = p.num_pagamento
             WHERE dev.num_locacao = %s
-        """
-        descontos = db.execute_select_all(query, (num_locacao,))
+        """ + retirada
+        descontos = db.execute_select_all(consulta_historico(query), (num_locacao, *params_retirada))
         return jsonify({"descontos": descontos}), 200
     except Exception as e:
         return internal_error(str(e))
@@ -756,6 +778,11 @@ def detalhes_aluguel(num_locacao):
     """Retorna detalhes de uma locação (valor_previsto, data_prevista_devolucao, placa, categoria, preco_diaria, cpf_cliente)."""
     db = DatabaseManager()
     try:
+        try:
+            retirada, params_retirada = filtro_retirada(db, num_locacao, "a.data_retirada")
+        except ValueError:
+            return jsonify({"erro": "Data inválida. Use o formato YYYY-MM-DD"}), 400
+
         query = """
             SELECT a.num_locacao,
                    a.placa,
@@ -768,8 +795,8 @@ def detalhes_aluguel(num_locacao):
             JOIN Carro car ON a.placa = car.placa
             JOIN Categoria c ON car.tipo_categoria = c.tipo
             WHERE a.num_locacao = %s
-        """
-        resultado = db.execute_select_one(query, (num_locacao,))
+        """ + retirada
+        resultado = db.execute_select_one(query, (num_locacao, *params_retirada))
 
         if not resultado:
             return jsonify({"erro": "Locação não encontrada"}), 404
@@ -795,16 +822,17 @@ def historico_multas_cliente(cpf):
     db = DatabaseManager()
     try:
         query = """
-            SELECT m.*, a.num_locacao, a.data_retirada, c.nome as nome_carro
-            FROM Multa m
-            JOIN Pagamento p ON m.num_pagamento = p.num_pagamento
-            JOIN Devolucao d ON d.num_pagamento = p.num_pagamento
-            JOIN Aluguel a ON a.num_locacao = d.num_locacao
+            SELECT m.id_multa, m.num_pagamento, m.tipo_multa, m.valor,
+                   a.num_locacao, a.data_retirada, c.nome as nome_carro
+            FROM {Multa} m
+            JOIN {Pagamento} p ON m.num_pagamento = p.num_pagamento
+            JOIN {Devolucao} d ON d.num_pagamento = p.num_pagamento
+            JOIN {Aluguel} a ON a.num_locacao = d.num_locacao AND a.data_retirada = d.data_retirada
             JOIN Carro c ON a.placa = c.placa
             WHERE a.cpf_cliente = %s
             ORDER BY a.data_retirada DESC
         """
-        multas = db.execute_select_all(query, (cpf,))
+        multas = db.execute_select_all(consulta_historico(query), (cpf,))
         return jsonify({"multas": multas}), 200
     except Exception as e:
         return internal_error(str(e))
@@ -818,11 +846,9 @@ def locacoes_abertas():
     db = DatabaseManager()
     try:
         query = """
-            SELECT a.num_locacao, a.placa, a.cpf_cliente
-            FROM Aluguel a
-            LEFT JOIN Devolucao d ON a.num_locacao = d.num_locacao
-            WHERE d.num_locacao IS NULL
-            ORDER BY a.num_locacao ASC
+            SELECT num_locacao, placa, cpf_cliente
+            FROM AluguelAberto
+            ORDER BY num_locacao ASC
         """
 
         locacoes = db.execute_select_all(query)
@@ -838,13 +864,18 @@ def obter_data_prevista(num_locacao):
     """Retorna a data prevista de devolução de uma locação"""
     db = DatabaseManager()
     try:
+        try:
+            retirada, params_retirada = filtro_retirada(db, num_locacao, "data_retirada")
+        except ValueError:
+            return jsonify({"erro": "Data inválida. Use o formato YYYY-MM-DD"}), 400
+
         query = """
             SELECT data_prevista_devolucao
             FROM Aluguel
             WHERE num_locacao = %s
-        """
+        """ + retirada
 
-        resultado = db.execute_select_one(query, (num_locacao,))
+        resultado = db.execute_select_one(query, (num_locacao, *params_retirada))
 
         if not resultado:
             return jsonify({"erro": "Locação não encontrada"}), 404
@@ -855,26 +886,33 @@ def obter_data_prevista(num_locacao):
         return internal_error(str(e))
 
 
+def buscar_payload_pix(db, num_pagamento):
+    """(payload PIX copia e cola, valor_total) do pagamento; (None, None) se não existir"""
+    pagamento = db.execute_select_one(
+        "SELECT valor_total FROM Pagamento WHERE num_pagamento = %s",
+        (num_pagamento,)
+    )
+    if not pagamento:
+        return None, None
+    valor_total = float(pagamento['valor_total'])
+    return payload_pix(valor_total, num_pagamento), valor_total
+
+
 @aluguel_blueprint.route("/pagamento/<int:num_pagamento>/gerar_qrcode", methods=["POST"])
+@classe_admissao(CHECKOUT)
 def gerar_qrcode_pagamento(num_pagamento):
     """
-    Cria um NOVO pagamento com forma_pix, gera QR e retorna dados.
+    Gera o payload PIX (BR Code) do pagamento e retorna a URL do QR Code,
+    renderizado pelo próprio servidor.
     """
     db = DatabaseManager()
     try:
-        pagamento = db.execute_select_one(
-            "SELECT valor_total FROM Pagamento WHERE num_pagamento = %s",
-            (num_pagamento,)
-        )
-        if not pagamento:
+        payload, valor_total = buscar_payload_pix(db, num_pagamento)
+        if not payload:
             return jsonify({"erro": "Pagamento original não encontrado"}), 404
 
-        valor_total = float(pagamento['valor_total'])
-
-        qr_code_url = (
-            f"https://api.qrserver.com/v1/create-qr-code/?size=220x220"
-            f"&data=Pagamento%20Locadora%20num_pagamento={num_pagamento}"
-        )
+        qr_code_url = url_for("aluguel.qrcode_pagamento", num_pagamento=num_pagamento,
+                              formato="png", _external=True)
         if hasattr(db, "conn") and db.conn:
             db.conn.commit()
 
@@ -883,8 +921,35 @@ def gerar_qrcode_pagamento(num_pagamento):
             "num_pagamento": num_pagamento,
             "valor_total": valor_total,
             "forma_pagamento": "PIX",
-            "qr_code_url": qr_code_url
+            "qr_code_url": qr_code_url,
+            "qr_code_svg_url": url_for("aluguel.qrcode_pagamento", num_pagamento=num_pagamento,
+                                       formato="svg", _external=True),
+            "pix_copia_e_cola": payload
         }), 200
 
     except Exception as e:
         return internal_error(f"Erro ao gerar QR Code: {str(e)}")
+
+
+@aluguel_blueprint.route("/pagamento/<int:num_pagamento>/qrcode.<formato>", methods=["GET"])
+def qrcode_pagamento(num_pagamento, formato):
+    """Imagem do QR Code PIX do pagamento (png ou svg), com cache por payload"""
+    if formato not in ("png", "svg"):
+        return jsonify({"erro": "Formato inválido. Use png ou svg."}), 404
+
+    db = DatabaseManager()
+    try:
+        payload, _ = buscar_payload_pix(db, num_pagamento)
+        db.conn.commit()
+        if not payload:
+            return jsonify({"erro": "Pagamento não encontrado"}), 404
+
+        imagem, etag = qrcode_pix(payload, formato)
+        resp = Response(imagem, mimetype="image/png" if formato == "png" else "image/svg+xml")
+        # o valor do pagamento pode mudar: revalida pelo ETag (hash do payload)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp.make_conditional(request)
+
+    except Exception as e:
+        return internal_error(f"Erro ao gerar QR Code: {str(e)}")
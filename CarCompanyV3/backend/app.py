@@ -6,10 +6,31 @@ from aluguel_rota import aluguel_blueprint
 from clientes_rota import clientes_blueprint
 from funcionarios_rota import funcionarios_blueprint
 from relatorio_rota import relatorio_bp
+from eventos_rota import eventos_blueprint
+from views_rota import views_blueprint
+from imagens_rota import imagens_blueprint
+from frota_indice import indice_frota
+from estatisticas import servico_estatisticas
+from json_rapido import ProvedorJSONRapido
+from compressao import Compressao
+from metricas_rota import metricas_blueprint
+from cotacao_rota import cotacao_blueprint
+from database.conector import CABECALHO_LSN, configurar_banco
+from admissao import configurar_admissao
 
 app = Flask(__name__)
-CORS(app)
-CORS(app, resources={r"*": {"origins": "*"}})
+app.json = ProvedorJSONRapido(app)
+# o frontend lê o LSN da última escrita no cabeçalho (read-your-writes)
+CORS(app, resources={r"*": {"origins": "*"}}, expose_headers=[CABECALHO_LSN])
+
+# gzip/br/zstd conforme o Accept-Encoding
+Compressao(app)
+
+# pools de conexões (primário/réplica) liberados ao fim de cada requisição
+configurar_banco(app)
+
+# vagas por classe de tráfego (checkout, catálogo, relatórios, admin); 429 quando lota
+configurar_admissao(app)
 
 # registra as rotas
 app.register_blueprint(carros_blueprint)
@@ -17,6 +38,19 @@ app.register_blueprint(aluguel_blueprint)
 app.register_blueprint(clientes_blueprint)
 app.register_blueprint(funcionarios_blueprint)
 app.register_blueprint(relatorio_bp)
+app.register_blueprint(eventos_blueprint)
+app.register_blueprint(views_blueprint)
+app.register_blueprint(imagens_blueprint)
+app.register_blueprint(metricas_blueprint)
+app.register_blueprint(cotacao_blueprint)
+
+# índice da frota em memória (carga inicial + feed de eventos); os workers
+# dos relatórios (multiprocessing spawn) reimportam este arquivo como
+# __mp_main__ e não precisam dele
+if __name__ != "__mp_main__":
+    indice_frota.iniciar()
+    # estatísticas dos painéis recalculadas em segundo plano
+    servico_estatisticas.iniciar()
 
 
 @app.route("/")
@@ -0,0 +1,106 @@
+"""
+Benchmark da coalescência de requisições (coalescer.py).
+
+Sobe P processos com T threads cada, todos disparando ao mesmo tempo a
+mesma requisição GET (R rodadas) contra uma rota sintética que simula um
+agregado caro (sleep de TEMPO segundos). Compara a rota sem e com
+@coalescer(): quantas vezes a view executou, tempo total e latências.
+
+Uso (na pasta backend):  python benchmarks/bench_coalescer.py [processos] [threads] [rodadas]
+"""
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+PASTA = os.path.join(tempfile.gettempdir(), "bench_coalescer")
+os.environ.setdefault("COALESCER_PASTA", os.path.join(PASTA, "locks"))
+
+from flask import Flask, jsonify
+
+from coalescer import coalescedor, coalescer
+
+TEMPO = 0.2
+ARQUIVO_EXECUCOES = os.path.join(PASTA, "execucoes")
+
+app = Flask(__name__)
+
+
+def agregado():
+    # cada execução deixa uma linha no arquivo (conta entre processos)
+    with open(ARQUIVO_EXECUCOES, "a") as f:
+        f.write(f"{os.getpid()}\n")
+    time.sleep(TEMPO)
+    return jsonify({"total": 42})
+
+
+@app.route("/sem", methods=["GET"])
+def sem_coalescer():
+    return agregado()
+
+
+@app.route("/com", methods=["GET"])
+@coalescer()
+def com_coalescer():
+    return agregado()
+
+
+def processo(rota, threads, rodadas, largada):
+    """Latências (s) de todas as requisições das threads deste processo"""
+    latencias = []
+    barreira = threading.Barrier(threads)
+
+    def cliente():
+        with app.test_client() as c:
+            for rodada in range(rodadas):
+                # todas as threads de todos os processos saem juntas em cada rodada
+                espera = largada + rodada * TEMPO * 3 - time.time()
+                if espera > 0:
+                    time.sleep(espera)
+                barreira.wait()
+                inicio = time.perf_counter()
+                resposta = c.get(rota)
+                latencias.append(time.perf_counter() - inicio)
+                assert resposta.status_code == 200, resposta.status_code
+
+    lista = [threading.Thread(target=cliente) for _ in range(threads)]
+    for t in lista:
+        t.start()
+    for t in lista:
+        t.join()
+    return latencias, coalescedor.metricas()
+
+
+def medir(rota, processos, threads, rodadas):
+    open(ARQUIVO_EXECUCOES, "w").close()
+    largada = time.time() + 2   # tempo para os processos subirem
+    with multiprocessing.get_context("spawn").Pool(processos) as pool:
+        resultados = pool.starmap(processo, [(rota, threads, rodadas, largada)] * processos)
+    with open(ARQUIVO_EXECUCOES) as f:
+        execucoes = sum(1 for _ in f)
+    latencias = sorted(l for lat, _ in resultados for l in lat)
+    compartilhadas = sum(m["compartilhadas_threads"] + m["compartilhadas_processos"] for _, m in resultados)
+    p95 = latencias[int(len(latencias) * 0.95) - 1]
+    print(f"{rota:5}  execuções {execucoes:5}  compartilhadas {compartilhadas:5}  "
+          f"latência p50 {statistics.median(latencias) * 1000:6.0f}ms  p95 {p95 * 1000:6.0f}ms  "
+          f"máx {latencias[-1] * 1000:6.0f}ms")
+
+
+def main():
+    processos = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    rodadas = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    os.makedirs(PASTA, exist_ok=True)
+    print(f"{processos} processos x {threads} threads x {rodadas} rodadas, view de {TEMPO * 1000:.0f}ms "
+          f"(entre processos: {coalescedor.entre_processos})\n")
+    medir("/sem", processos, threads, rodadas)
+    medir("/com", processos, threads, rodadas)
+
+
+if __name__ == "__main__":
+    main()
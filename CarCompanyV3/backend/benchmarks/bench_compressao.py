@@ -0,0 +1,53 @@
+"""
+Benchmark da compressão de respostas: bytes no fio e CPU por rota.
+
+Monta corpos sintéticos com o formato das rotas mais pesadas (/clientes,
+/clientes/<cpf>/historico, /funcionarios/<n>/alugueis e o CSV de
+/relatorios/vendas) e comprime cada um com as codificações disponíveis.
+
+Uso (na pasta backend):  python benchmarks/bench_compressao.py [num_linhas]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_json import COLUNAS, gerar_linhas
+from benchmarks.bench_relatorio import _BancoFalso, gerar_linhas as gerar_linhas_vendas
+from compressao import COMPRESSORES, comprimir_tudo
+from database.conector import LinhasTabela
+from json_rapido import serializar
+from relatorio_rota import gerar_csv
+
+
+def corpos(n):
+    clientes = LinhasTabela(
+        ["cpf", "nome", "endereco", "telefone", "total_alugueis"],
+        [(f"{11111111100 + i}", f"Cliente {i}", f"Rua {i % 300}, {i % 1000} - São Paulo",
+          f"(11) 9{i % 10000:04d}-{i % 7919:04d}", i % 12) for i in range(n)])
+    historico = LinhasTabela(COLUNAS, gerar_linhas(n))
+    return {
+        "/clientes": serializar({"clientes": clientes}).encode(),
+        "/clientes/<cpf>/historico": serializar({"historico": historico}).encode(),
+        "/funcionarios/<n>/alugueis": serializar({"alugueis": historico}).encode(),
+        "/relatorios/vendas (csv)": gerar_csv(_BancoFalso(gerar_linhas_vendas(n)), None, None).encode(),
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    print(f"{n} linhas por rota; codificações: {', '.join(COMPRESSORES)}\n")
+    print(f"{'rota':<30} {'codificação':<12} {'bytes':>12} {'razão':>7} {'CPU':>10}")
+    for rota, corpo in corpos(n).items():
+        print(f"{rota:<30} {'identity':<12} {len(corpo):>12,} {1:>7.1f}")
+        for codificacao in COMPRESSORES:
+            inicio = time.process_time()
+            comprimido = comprimir_tudo(corpo, codificacao)
+            cpu = time.process_time() - inicio
+            print(f"{'':<30} {codificacao:<12} {len(comprimido):>12,} "
+                  f"{len(corpo) / len(comprimido):>7.1f} {cpu * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark de tempo e memória dos modos de fetch do DatabaseManager.
+
+Com o banco disponível mede cada modo em uma consulta de N linhas
+(generate_series); com --sintetico mede só a conversão das linhas já
+recebidas (DictRow -> dict vs tupla/registro/colunas), sem banco.
+
+Uso (na pasta backend):
+    python benchmarks/bench_fetch.py [num_linhas]
+    python benchmarks/bench_fetch.py [num_linhas] --sintetico
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from psycopg2.extras import DictRow
+
+from database.conector import DatabaseManager
+
+QUERY = """
+    SELECT g AS num_locacao,
+           TIMESTAMP '2024-01-01' + g * INTERVAL '1 hour' AS data_retirada,
+           TIMESTAMP '2024-01-04' + g * INTERVAL '1 hour' AS data_prevista_devolucao,
+           540.00::numeric(10,2) AS valor_previsto,
+           'ECO' || lpad((g % 10000)::text, 4, '0') AS placa,
+           'HB20' AS nome_carro,
+           11111111100 + g % 100 AS cpf_cliente
+    FROM generate_series(1, %s) g
+"""
+
+
+def medir(nome, funcao):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcao()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    print(f"{nome:<35} {duracao * 1000:9.1f} ms   pico {pico / 1e6:8.1f} MB")
+
+
+def com_banco(n):
+    db = DatabaseManager()
+    print(f"{n} linhas vindas do banco\n")
+    medir("dict (execute_select_all)", lambda: db.execute_select_all(QUERY, (n,)))
+    for modo in ("tupla", "registro", "colunas", "tabela"):
+        medir(modo, lambda: db.execute_select(QUERY, (n,), modo=modo))
+    medir("iterar_select (lotes de 2000)", lambda: sum(1 for _ in db.iterar_select(QUERY, (n,))))
+
+
+class _CursorFalso:
+    def __init__(self, colunas):
+        self.description = [(c,) for c in colunas]
+        self.index = {c: i for i, c in enumerate(colunas)}
+
+
+def sintetico(n):
+    colunas = ("num_locacao", "data_retirada", "data_prevista_devolucao",
+               "valor_previsto", "placa", "nome_carro", "cpf_cliente")
+    base = datetime(2024, 1, 1)
+    tuplas = [(i, base + timedelta(hours=i), base + timedelta(days=3, hours=i),
+               Decimal("540.00"), f"ECO{i % 10000:04d}", "HB20", str(11111111100 + i % 100))
+              for i in range(n)]
+    cursor = _CursorFalso(colunas)
+
+    def dictrows():
+        linhas = []
+        for t in tuplas:
+            r = DictRow(cursor)
+            r[:] = t
+            linhas.append(r)
+        return linhas
+
+    print(f"{n} linhas já recebidas (só a conversão)\n")
+    medir("DictRow + dict(row)", lambda: [dict(r) for r in dictrows()])
+    medir("tupla", lambda: list(tuplas))
+    medir("registro", lambda: DatabaseManager._formatar(colunas, tuplas, "registro"))
+    medir("colunas", lambda: DatabaseManager._formatar(colunas, tuplas, "colunas"))
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n = int(args[0]) if args else 100_000
+    if "--sintetico" in sys.argv:
+        sintetico(n)
+    else:
+        com_banco(n)
@@ -0,0 +1,84 @@
+"""
+Benchmark da serialização JSON de respostas grandes (100 mil linhas).
+
+Compara o caminho antigo (DictRow -> dict + provedor padrão do Flask)
+com o ProvedorJSONRapido recebendo dicts e recebendo LinhasTabela.
+
+Uso (na pasta backend):  python benchmarks/bench_json.py [num_linhas]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from database.conector import LinhasTabela
+from json_rapido import ProvedorJSONRapido, codificar_objetos, orjson
+
+COLUNAS = ["num_locacao", "data_retirada", "data_prevista_devolucao", "valor_previsto",
+           "placa", "nome_carro", "tipo_categoria", "preco_diaria", "status",
+           "data_real_devolucao", "valor_final"]
+
+
+def gerar_linhas(n):
+    base = datetime(2024, 1, 1, 10, 0)
+    linhas = []
+    for i in range(n):
+        retirada = base + timedelta(hours=i)
+        aberta = i % 10 == 0
+        linhas.append((
+            i + 1,
+            retirada,
+            retirada + timedelta(days=3),
+            Decimal("540.00"),
+            f"ECO{i % 10000:04d}",
+            "HB20",
+            "Economico",
+            Decimal("180.00"),
+            "EM ANDAMENTO" if aberta else "FINALIZADO",
+            None if aberta else retirada + timedelta(days=3),
+            None if aberta else Decimal("540.00"),
+        ))
+    return linhas
+
+
+def medir(nome, funcao, repeticoes=3):
+    melhor = None
+    tamanho = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+        tamanho = len(saida)
+    print(f"{nome:<45} {melhor * 1000:9.1f} ms   {tamanho / 1e6:6.2f} MB")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    linhas = gerar_linhas(n)
+    app = Flask(__name__)
+    padrao = DefaultJSONProvider(app)
+    rapido = ProvedorJSONRapido(app)
+
+    print(f"{n} linhas, orjson {'disponível' if orjson else 'ausente'}\n")
+    medir("padrão Flask (dict por linha + json)",
+          lambda: padrao.dumps({"historico": [dict(zip(COLUNAS, r)) for r in linhas]}))
+    medir("rápido (dict por linha)",
+          lambda: rapido.dumps({"historico": [dict(zip(COLUNAS, r)) for r in linhas]}))
+    medir("rápido (LinhasTabela, objetos)",
+          lambda: rapido.dumps({"historico": LinhasTabela(COLUNAS, linhas)}))
+    # o caminho sem orjson (texto direto das tuplas), para comparar com o acima
+    medir("LinhasTabela, objetos concatenados em Python",
+          lambda: codificar_objetos(LinhasTabela(COLUNAS, linhas)))
+    medir("rápido (LinhasTabela, colunar)",
+          lambda: rapido.dumps({"historico": LinhasTabela(COLUNAS, linhas, colunar=True)}))
+
+
+if __name__ == "__main__":
+    main()
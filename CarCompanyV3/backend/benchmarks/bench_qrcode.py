@@ -0,0 +1,40 @@
+"""
+Benchmark da geração local de QR Codes PIX.
+
+Mede renders por segundo (sem cache, um payload diferente por chamada)
+em PNG e SVG, e o caminho com cache (mesmo pagamento pedido de novo).
+
+Uso (na pasta backend):  python benchmarks/bench_qrcode.py [num_renders]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pix import cache_qrcodes, payload_pix, qrcode_pix
+
+
+def medir(nome, funcao, n):
+    inicio = time.perf_counter()
+    for i in range(n):
+        funcao(i)
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<30} {duracao / n * 1000:7.2f} ms/render   {n / duracao:8.0f} renders/s")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f"{n} renders, um núcleo\n")
+    for formato in ("png", "svg"):
+        # valores diferentes a cada chamada: sempre falta no cache
+        medir(f"{formato} (sem cache)",
+              lambda i: qrcode_pix(payload_pix(100 + i / 100, 10_000 + i), formato), n)
+    payload = payload_pix(540.00, 1)
+    qrcode_pix(payload, "png")
+    medir("png (com cache)", lambda i: qrcode_pix(payload, "png"), n)
+    print(f"\ncache: {cache_qrcodes.acertos} acertos, {cache_qrcodes.faltas} faltas")
+
+
+if __name__ == "__main__":
+    main()
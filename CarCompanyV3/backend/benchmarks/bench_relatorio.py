@@ -0,0 +1,100 @@
+"""
+Benchmark do relatório de vendas: CSV x Parquet x Arrow IPC.
+
+Gera N linhas sintéticas de Aluguel e mede o tempo para produzir cada
+formato, o tamanho do arquivo e o tempo para lê-lo de volta (csv.reader
+para o CSV, pyarrow para os colunares).
+
+Uso (na pasta backend):  python benchmarks/bench_relatorio.py [num_linhas]
+"""
+import csv
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database.conector import DatabaseManager, LinhasTabela
+from relatorio_rota import COLUNAS_VENDAS, TAMANHO_LOTE, gerar_colunar, gerar_csv, pa, pq
+
+
+def gerar_linhas(n):
+    base = datetime(2024, 1, 1, 9, 0)
+    linhas = []
+    for i in range(n):
+        retirada = base + timedelta(minutes=7 * i)
+        linhas.append((
+            i + 1,
+            retirada,
+            retirada + timedelta(days=1 + i % 7),
+            Decimal(f"{120 + (i % 50) * 15}.00"),
+            1 + i % 40,
+            f"ECO{i % 10000:04d}",
+            f"{11111111100 + i % 5000}",
+            i % 3 == 0,
+            i + 1 if i % 10 else None,
+        ))
+    return linhas
+
+
+class _BancoFalso:
+    """Devolve as linhas já prontas, como o DatabaseManager faria"""
+
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    def execute_select(self, sql, params, modo):
+        return LinhasTabela(COLUNAS_VENDAS, self.linhas)
+
+    def lotes(self):
+        for i in range(0, len(self.linhas), TAMANHO_LOTE):
+            yield DatabaseManager._formatar(
+                COLUNAS_VENDAS, self.linhas[i:i + TAMANHO_LOTE], "colunas")
+
+
+def medir(funcao, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, saida
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    banco = _BancoFalso(gerar_linhas(n))
+    print(f"{n} linhas\n")
+    print(f"{'formato':<10} {'gerar':>10} {'tamanho':>10} {'ler':>10}")
+
+    t_gerar, conteudo = medir(lambda: gerar_csv(banco, None, None))
+    t_ler, _ = medir(lambda: list(csv.reader(io.StringIO(conteudo))))
+    tamanho = len(conteudo.encode())
+    print(f"{'csv':<10} {t_gerar * 1000:8.1f}ms {tamanho / 1e6:8.2f}MB {t_ler * 1000:8.1f}ms")
+
+    if pa is None:
+        print("pyarrow ausente: formatos colunares não medidos")
+        return
+
+    leitores = {
+        "parquet": lambda b: pq.read_table(pa.BufferReader(b)),
+        "arrow": lambda b: pa.ipc.open_file(pa.BufferReader(b)).read_all(),
+    }
+    for formato, ler in leitores.items():
+        t_gerar, conteudo = medir(lambda: gerar_colunar(banco.lotes(), COLUNAS_VENDAS, formato))
+        t_ler, _ = medir(lambda: ler(conteudo))
+        print(f"{formato:<10} {t_gerar * 1000:8.1f}ms {len(conteudo) / 1e6:8.2f}MB {t_ler * 1000:8.1f}ms")
+
+    colunas = ["data_retirada", "valor_previsto", "placa"]
+    t_gerar, conteudo = medir(lambda: gerar_colunar(
+        ({c: lote[c] for c in colunas} for lote in banco.lotes()), colunas, "parquet"))
+    print(f"\nparquet só com {', '.join(colunas)}: "
+          f"{t_gerar * 1000:.1f}ms, {len(conteudo) / 1e6:.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
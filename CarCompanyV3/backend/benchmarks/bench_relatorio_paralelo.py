@@ -0,0 +1,98 @@
+"""
+Benchmark do motor paralelo de relatórios (relatorio_paralelo) com 1, 2, 4
+e 8 workers, contra a consulta sequencial do /relatorios/vendas.
+
+Cria uma tabela UNLOGGED temporária (bench_aluguel) com N locações
+sintéticas espalhadas por 3 anos, gera o CSV e o Parquet do período todo
+e apaga a tabela no fim. O ganho depende dos núcleos livres na máquina
+(os workers e as consultas paralelas no Postgres disputam a mesma CPU).
+
+Uso (na pasta backend):  python benchmarks/bench_relatorio_paralelo.py [num_linhas]
+"""
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database.conector import DatabaseManager
+from relatorio_paralelo import MotorRelatorioParalelo, pa
+from relatorio_rota import COLUNAS_VENDAS, gerar_colunar_paralelo, gerar_csv, tipos_arrow
+
+INICIO = date(2024, 1, 1)
+FIM = date(2026, 12, 31)
+WORKERS = (1, 2, 4, 8)
+
+SQL = f"""
+    SELECT {", ".join(COLUNAS_VENDAS)}
+    FROM bench_aluguel
+    WHERE data_retirada >= %s::date AND data_retirada < %s::date + 1
+    ORDER BY data_retirada, num_locacao;
+"""
+
+
+def criar_tabela(db, n):
+    with db.transacao():
+        db.execute_statement("DROP TABLE IF EXISTS bench_aluguel;")
+        db.execute_statement("""
+            CREATE UNLOGGED TABLE bench_aluguel AS
+            SELECT i AS num_locacao,
+                   TIMESTAMP '2024-01-01' + (i * INTERVAL '1 day' * 1096 / %s) AS data_retirada,
+                   TIMESTAMP '2024-01-01' + (i * INTERVAL '1 day' * 1096 / %s) + INTERVAL '3 days' AS data_prevista_devolucao,
+                   (120 + (i %% 50) * 15)::NUMERIC(10,2) AS valor_previsto,
+                   1 + i %% 40 AS num_funcionario,
+                   'ECO' || lpad((i %% 10000)::text, 4, '0') AS placa,
+                   (11111111100 + i %% 5000)::text AS cpf_cliente,
+                   i %% 3 = 0 AS seguro_contratado,
+                   CASE WHEN i %% 10 > 0 THEN i END AS num_pagamento
+            FROM generate_series(1, %s) AS i;
+        """, (n, n, n))
+        db.execute_statement("CREATE INDEX ON bench_aluguel (data_retirada);")
+    db.execute_statement("ANALYZE bench_aluguel;")
+
+
+def medir(funcao, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, saida
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    db = DatabaseManager()
+    criar_tabela(db, n)
+    schema = pa.schema([(c, t) for c, t in tipos_arrow().items()]) if pa else None
+    print(f"{n} linhas, {os.cpu_count()} CPUs\n")
+    print(f"{'execução':<14} {'csv':>10} {'MB/s':>8} {'parquet':>10}")
+
+    try:
+        t_csv, conteudo = medir(lambda: gerar_csv(db, SQL, (INICIO, FIM)).encode())
+        print(f"{'sequencial':<14} {t_csv * 1000:8.0f}ms {len(conteudo) / 1e6 / t_csv:8.1f} {'-':>10}")
+        base = conteudo
+
+        for workers in WORKERS:
+            motor = MotorRelatorioParalelo(workers)
+            # sobe os processos antes de medir (o spawn custa ~centenas de ms)
+            list(motor.gerar(SQL, (), INICIO, INICIO))
+
+            t_csv, pedacos = medir(lambda: b"".join(motor.gerar(SQL, (), INICIO, FIM)))
+            csv_ok = pedacos == base.split(b"\r\n", 1)[1]
+            t_pq = None
+            if pa is not None:
+                t_pq, _ = medir(lambda: gerar_colunar_paralelo(
+                    motor.gerar(SQL, (), INICIO, FIM, "parquet", schema), schema, "parquet"))
+            print(f"{f'{workers} worker(s)':<14} {t_csv * 1000:8.0f}ms {len(pedacos) / 1e6 / t_csv:8.1f} "
+                  f"{(f'{t_pq * 1000:8.0f}ms' if t_pq else '-'):>10}"
+                  f"{'' if csv_ok else '  (CSV diferente do sequencial!)'}")
+            motor._obter_executor().shutdown()
+    finally:
+        db.execute_statement("DROP TABLE IF EXISTS bench_aluguel;")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark da simulação de regras (simulacao_regras.py).
+
+Gera N devoluções sintéticas (clientes com históricos de tamanhos
+variados, atrasos, tanque vazio, outras multas) e mede a simulação
+vetorizada das regras atuais x propostas, resumida por categoria, mês e
+segmento. Antes confere o cálculo contra uma versão linha a linha, como a
+da devolução, numa amostra pequena.
+
+Uso (na pasta backend):  python benchmarks/bench_simulacao.py [num_devolucoes]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from simulacao_regras import REGRAS_ATUAIS, aplicar_regras, mesclar_regras, simular_historico
+
+NUM_CATEGORIAS = 3
+PRECOS = np.array([100.0, 180.0, 280.0])
+PROPOSTA = {"atraso": "progressivo", "tanque": 80, "cliente_fiel": {"minimo_alugueis": 3}}
+
+
+def gerar(n, semente=42):
+    rng = np.random.default_rng(semente)
+    # clientes com 1 a ~40 devoluções, já ordenados por cliente e data
+    cliente = np.sort(rng.integers(0, max(n // 8, 1), n)).astype(np.int32)
+    inicio = np.ones(n, dtype=bool)
+    inicio[1:] = cliente[1:] != cliente[:-1]
+    posicao = np.arange(n) - np.maximum.accumulate(np.where(inicio, np.arange(n), 0))
+    retirada = (posicao * 20 + rng.integers(0, 15, n)).astype(np.int32) + 8000
+    prevista = retirada + rng.integers(1, 10, n).astype(np.int32)
+    atraso = np.where(rng.random(n) < 0.15, rng.integers(1, 12, n), 0)
+    categoria = rng.integers(0, NUM_CATEGORIAS, n).astype(np.int32)
+    return {
+        "cliente": cliente,
+        "categoria": categoria,
+        "num_aluguel": (posicao + 1).astype(np.int32),
+        "dia_retirada": retirada,
+        "dia_prevista": prevista,
+        "dia_devolucao": (prevista - rng.integers(0, 2, n) + atraso).astype(np.int32),
+        "preco": PRECOS[categoria],
+        "combustivel": (rng.random(n) > 0.1).astype(np.int32),
+        "outras_multas": np.where(rng.random(n) < 0.02, 500.0, 0.0),
+        "reserva_antecipada": (rng.random(n) < 0.3).astype(np.int32),
+        "todas_categorias": (rng.random(n) < 0.05).astype(np.int32),
+        "todos_acessorios": (rng.random(n) < 0.02).astype(np.int32),
+        "valor_registrado": np.zeros(n),
+    }
+
+
+def referencia(h, regras):
+    """Mesmas regras aplicadas linha a linha, na ordem das devoluções"""
+    receitas = []
+    sequencia, cliente_anterior = 0, None
+    for i in range(h["cliente"].size):
+        if h["cliente"][i] != cliente_anterior:
+            sequencia, cliente_anterior = 0, h["cliente"][i]
+        preco = h["preco"][i]
+        base = preco * max(int(h["dia_devolucao"][i] - h["dia_retirada"][i]), 1)
+        atraso = max(int(h["dia_devolucao"][i] - h["dia_prevista"][i]), 0)
+        fracao = next(f for ate, f in regras["atraso"]["faixas"] if ate is None or atraso <= ate)
+        multas = atraso * preco * fracao + (0 if h["combustivel"][i] else regras["tanque"]) + h["outras_multas"][i]
+        descontos = 0.0
+        if h["num_aluguel"][i] >= regras["cliente_fiel"]["minimo_alugueis"]:
+            descontos += regras["cliente_fiel"]["valor"]
+        if sequencia >= regras["sem_multas"]["sequencia"]:
+            descontos += regras["sem_multas"]["valor"]
+        for chave in ("reserva_antecipada", "todas_categorias", "todos_acessorios"):
+            descontos += h[chave][i] * regras[chave]["valor"]
+        receitas.append(max(base + multas - descontos, 0))
+        sequencia = 0 if multas > 0 else sequencia + 1
+    return np.array(receitas)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    proposta = mesclar_regras(PROPOSTA)
+
+    amostra = gerar(20_000, semente=7)
+    for regras in (REGRAS_ATUAIS, proposta):
+        assert np.allclose(aplicar_regras(amostra, regras)[0], referencia(amostra, regras)), "diferente da referência"
+
+    h = gerar(n)
+    print(f"{n} devoluções, {int(h['cliente'][-1]) + 1} clientes\n")
+    inicio = time.perf_counter()
+    resumo = simular_historico(h, REGRAS_ATUAIS, proposta, NUM_CATEGORIAS)
+    duracao = time.perf_counter() - inicio
+
+    atual = resumo["segmento"]["receita_atual"].sum()
+    nova = resumo["segmento"]["receita_proposta"].sum()
+    print(f"simulação (atual + proposta): {duracao * 1000:8.0f}ms  ({n / duracao / 1e6:.1f}M devoluções/s)")
+    print(f"receita atual:    {atual:16,.2f}")
+    print(f"receita proposta: {nova:16,.2f}  ({100 * (nova - atual) / atual:+.2f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark do cálculo de utilização da frota (utilizacao.py).
+
+Gera N locações sintéticas (carro, início, fim) num período de 3 anos e
+mede, separadamente, a leitura do COPY binário (a partir de um buffer já
+montado, sem banco) e o cálculo vetorizado por carro, modelo, categoria e
+dia.
+
+Uso (na pasta backend):  python benchmarks/bench_utilizacao.py [num_locacoes] [num_carros]
+"""
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utilizacao import SEGUNDOS_DIA, LeitorCopyIntervalos, calcular_utilizacao
+
+DIAS = 1096
+TAMANHO_BLOCO = 64 * 1024
+
+
+def gerar(n, num_carros, semente=42):
+    rng = np.random.default_rng(semente)
+    carro = rng.integers(0, num_carros, n, dtype=np.int32)
+    inicio = rng.integers(0, DIAS * SEGUNDOS_DIA, n, dtype=np.int32)
+    duracao = rng.integers(SEGUNDOS_DIA // 4, 10 * SEGUNDOS_DIA, n, dtype=np.int32)
+    fim = np.minimum(inicio + duracao, DIAS * SEGUNDOS_DIA).astype(np.int32)
+    return carro, inicio, fim
+
+
+def montar_copy(carro, inicio, fim):
+    """Bytes no formato do COPY binário que o Postgres enviaria"""
+    linhas = np.empty(carro.size, dtype=LeitorCopyIntervalos.DTYPE)
+    linhas["campos"] = 3
+    linhas["t1"] = linhas["t2"] = linhas["t3"] = 4
+    linhas["carro"], linhas["inicio"], linhas["fim"] = carro, inicio, fim
+    return b"PGCOPY\n\xff\r\n\x00" + bytes(8) + linhas.tobytes() + b"\xff\xff"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000_000
+    num_carros = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    frota = [{"placa": f"CAR{i:05d}", "modelo": f"Modelo {i % 40}", "categoria": f"Cat {i % 3}"}
+             for i in range(num_carros)]
+    carro, inicio, fim = gerar(n, num_carros)
+    buffer = montar_copy(carro, inicio, fim)
+    print(f"{n} locações, {num_carros} carros, {DIAS} dias, COPY de {len(buffer) / 1e6:.0f}MB\n")
+
+    t0 = time.perf_counter()
+    leitor = LeitorCopyIntervalos()
+    visao = memoryview(buffer)
+    for i in range(0, len(buffer), TAMANHO_BLOCO):
+        leitor.write(visao[i:i + TAMANHO_BLOCO])
+    lidos = leitor.arrays()
+    t1 = time.perf_counter()
+    assert all(np.array_equal(a, b) for a, b in zip(lidos, (carro, inicio, fim)))
+
+    resultado = calcular_utilizacao(frota, *lidos, date(2024, 1, 1), DIAS)
+    t2 = time.perf_counter()
+
+    print(f"leitura do COPY:   {(t1 - t0) * 1000:8.0f}ms")
+    print(f"cálculo:           {(t2 - t1) * 1000:8.0f}ms")
+    print(f"ocupação da frota: {resultado['ocupacao_frota']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
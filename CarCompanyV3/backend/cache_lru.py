@@ -0,0 +1,76 @@
+"""
+Caches LRU em memória: limitado pelo tamanho total dos valores (bytes) ou
+pelo número de itens, com versão dos dados e validade.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRUBytes:
+    """LRU de bytes (imagens, respostas comprimidas) limitado pelo total guardado"""
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is None:
+                self.faltas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def guardar(self, chave, valor):
+        if len(valor) > self.limite_bytes:
+            return
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._total -= len(antigo)
+            self._itens[chave] = valor
+            self._total += len(valor)
+            while self._total > self.limite_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._total -= len(removido)
+
+
+class CacheLRUVersionado:
+    """
+    LRU de resultados calculados, limitado em número de itens. Cada item
+    guarda a versão dos dados com que foi calculado (ex.: último id da
+    outbox): pedir com outra versão, ou depois de `validade` segundos,
+    conta como falta.
+    """
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self._itens = OrderedDict()   # chave -> (versao, guardado_em, valor)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave, versao, validade=None):
+        with self._lock:
+            item = self._itens.get(chave)
+            if (item is None or item[0] != versao
+                    or (validade is not None and time.monotonic() - item[1] > validade)):
+                self.faltas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[2]
+
+    def guardar(self, chave, versao, valor):
+        with self._lock:
+            self._itens[chave] = (versao, time.monotonic(), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
@@ -1,5 +1,11 @@
 from flask import Blueprint, jsonify, request
-from database.conector import DatabaseManager
+from database.conector import DatabaseManager, somente_leitura
+from database.eventos import registrar_evento
+from frota_indice import indice_frota
+from estatisticas import servico_estatisticas
+from coalescer import coalescer
+from admissao import RELATORIOS, classe_admissao
+from imagens_rota import variantes_imagem
 
 carros_blueprint = Blueprint("carros", __name__)
 
@@ -46,6 +52,8 @@ def listar_carros():
             ORDER BY c.nome;
         """
         carros = db.execute_select_all(query)
+        for carro in carros:
+            carro["imagens"] = variantes_imagem(carro["imagem"])
         return jsonify({"carros": carros}), 200
     except Exception as e:
         print(f"Erro: {e}")
@@ -81,6 +89,7 @@ def obter_carro(placa):
         if not carro:
             return jsonify({"erro": "Carro não encontrado"}), 404
 
+        carro["imagens"] = variantes_imagem(carro["imagem"])
         return jsonify(carro), 200
     except Exception:
         return internal_error()
@@ -92,6 +101,9 @@ def obter_carro(placa):
 
 @carros_blueprint.route("/carros/placas/<nome_modelo>", methods=["GET"])
 def listar_placas_por_modelo(nome_modelo):
+    if indice_frota.pronto():
+        return jsonify({"placas": indice_frota.placas_por_modelo(nome_modelo)}), 200
+
     db = DatabaseManager()
     try:
         query = """
@@ -143,23 +155,23 @@ def criar_carro():
             INSERT INTO Carro (placa, nome, chassi, ano, tipo_categoria, imagem_url, status_carro, quilometragem)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
         """
-        db.execute_statement(
-            query,
-            (
-                data["placa"],
-                data["nome"],
-                data["chassi"],
-                data["ano"],
-                data["tipo_categoria"],
-                data.get("imagem_url", "placeholder.png"),
-                data.get("status_carro", "DISPONIVEL"),
-                data.get("quilometragem", 0)
-            ),
-        )
-
-        # Commit da transação
-        if hasattr(db, "conn") and db.conn:
-            db.conn.commit()
+        with db.transacao():
+            db.execute_statement(
+                query,
+                (
+                    data["placa"],
+                    data["nome"],
+                    data["chassi"],
+                    data["ano"],
+                    data["tipo_categoria"],
+                    data.get("imagem_url", "placeholder.png"),
+                    data.get("status_carro", "DISPONIVEL"),
+                    data.get("quilometragem", 0)
+                ),
+            )
+            registrar_evento(db, "CARRO_CADASTRADO", data["placa"], {
+                "placa": data["placa"]
+            })
 
         return jsonify({"mensagem": "Carro cadastrado com sucesso!"}), 201
     except Exception as e:
@@ -201,22 +213,20 @@ def atualizar_carro(placa):
                 status_carro = COALESCE(%s, status_carro)
             WHERE placa = %s;
         """
-        db.execute_statement(
-            query,
-            (
-                data.get("nome"),
-                data.get("ano"),
-                data.get("quilometragem"),
-                data.get("tipo_categoria"),
-                data.get("imagem_url"),
-                data.get("status_carro"),
-                placa,
-            ),
-        )
-
-        # Commit da transação
-        if hasattr(db, "conn") and db.conn:
-            db.conn.commit()
+        with db.transacao():
+            db.execute_statement(
+                query,
+                (
+                    data.get("nome"),
+                    data.get("ano"),
+                    data.get("quilometragem"),
+                    data.get("tipo_categoria"),
+                    data.get("imagem_url"),
+                    data.get("status_carro"),
+                    placa,
+                ),
+            )
+            registrar_evento(db, "CARRO_ATUALIZADO", placa, {"placa": placa})
 
         return jsonify({"mensagem": "Carro atualizado com sucesso!"}), 200
     except Exception as e:
@@ -251,27 +261,21 @@ def deletar_carro(placa):
             return jsonify({"erro": "Não é possível remover carro alugado"}), 400
 
         # Verificar se existe aluguel ativo para este carro
-        aluguel_ativo = db.execute_select_one("""
-            SELECT 1 FROM Aluguel a 
-            WHERE a.placa = %s 
-            AND NOT EXISTS (
-                SELECT 1 FROM Devolucao d WHERE d.num_locacao = a.num_locacao
-            )
-        """, (placa,))
+        aluguel_ativo = db.execute_select_one(
+            "SELECT 1 FROM AluguelAberto WHERE placa = %s;", (placa,))
 
         if aluguel_ativo:
             return jsonify({"erro": "Carro possui aluguel em andamento"}), 400
 
         query = "DELETE FROM Carro WHERE placa = %s;"
-        success = db.execute_statement(query, (placa,))
-
-        if not success:
+        try:
+            with db.transacao():
+                db.execute_statement(query, (placa,))
+                registrar_evento(db, "CARRO_REMOVIDO", placa, {"placa": placa})
+        except Exception as e:
+            print(f"Erro: {e}")
             return jsonify({"erro": "Não foi possível remover o carro"}), 400
 
-        # Commit da transação
-        if hasattr(db, "conn") and db.conn:
-            db.conn.commit()
-
         return jsonify({"mensagem": "Carro removido com sucesso!"}), 200
     except Exception as e:
         # Rollback em caso de erro
@@ -304,6 +308,9 @@ def listar_categorias():
 
 @carros_blueprint.route("/carros/disponiveis", methods=["GET"])
 def carros_disponiveis():
+    if indice_frota.pronto():
+        return jsonify({"carros": indice_frota.disponiveis()}), 200
+
     db = DatabaseManager()
     try:
         query = """
@@ -337,6 +344,9 @@ def carros_disponiveis():
 
 @carros_blueprint.route("/carros/manutencao", methods=["GET"])
 def carros_em_manutencao():
+    if indice_frota.pronto():
+        return jsonify({"carros_manutencao": indice_frota.em_manutencao()}), 200
+
     db = DatabaseManager()
     try:
         query = """
@@ -390,12 +400,13 @@ def atualizar_status_carro(placa):
         if not carro:
             return jsonify({"erro": "Carro não encontrado"}), 404
 
-        query = "UPDATE Carro SET status_carro = %s WHERE placa = %s;"
-        db.execute_statement(query, (status, placa))
-
-        # Commit da transação
-        if hasattr(db, "conn") and db.conn:
-            db.conn.commit()
+        with db.transacao():
+            query = "UPDATE Carro SET status_carro = %s WHERE placa = %s;"
+            db.execute_statement(query, (status, placa))
+            registrar_evento(db, "CARRO_STATUS_ALTERADO", placa, {
+                "placa": placa,
+                "status_carro": status
+            })
 
         return jsonify({"mensagem": "Status atualizado com sucesso!"}), 200
     except Exception as e:
@@ -441,38 +452,74 @@ def carros_por_categoria(categoria):
 # ============================================================
 
 
+def calcular_estatisticas(db):
+    query = """
+        SELECT 
+            COUNT(*) as total_carros,
+            COUNT(CASE WHEN status_carro = 'DISPONIVEL' THEN 1 END) as disponiveis,
+            COUNT(CASE WHEN status_carro = 'ALUGADO' THEN 1 END) as alugados,
+            COUNT(CASE WHEN status_carro = 'MANUTENCAO' THEN 1 END) as manutencao,
+            AVG(quilometragem) as media_km,
+            MIN(ano) as ano_mais_antigo,
+            MAX(ano) as ano_mais_novo
+        FROM Carro;
+    """
+    estatisticas = db.execute_select_one(query)
+
+    # Estatísticas por categoria
+    query_categorias = """
+        SELECT 
+            tipo_categoria,
+            COUNT(*) as quantidade,
+            AVG(quilometragem) as media_km
+        FROM Carro
+        GROUP BY tipo_categoria
+        ORDER BY quantidade DESC;
+    """
+    categorias_stats = db.execute_select_all(query_categorias)
+
+    return {
+        "estatisticas_gerais": estatisticas,
+        "estatisticas_categorias": categorias_stats
+    }
+
+
+# só é lido enquanto o índice da frota não carregou: sem recálculo periódico
+servico_estatisticas.registrar("carros", calcular_estatisticas, sob_demanda=True)
+
+
 @carros_blueprint.route("/carros/estatisticas", methods=["GET"])
+@classe_admissao(RELATORIOS)
+@coalescer()
+@somente_leitura
 def estatisticas_carros():
-    db = DatabaseManager()
+    if indice_frota.pronto():
+        estatisticas, categorias_stats = indice_frota.estatisticas()
+        return jsonify({
+            "estatisticas_gerais": estatisticas,
+            "estatisticas_categorias": categorias_stats
+        }), 200
+
+    # índice ainda não carregou: agregado pré-calculado do banco
     try:
-        query = """
-            SELECT 
-                COUNT(*) as total_carros,
-                COUNT(CASE WHEN status_carro = 'DISPONIVEL' THEN 1 END) as disponiveis,
-                COUNT(CASE WHEN status_carro = 'ALUGADO' THEN 1 END) as alugados,
-                COUNT(CASE WHEN status_carro = 'MANUTENCAO' THEN 1 END) as manutencao,
-                AVG(quilometragem) as media_km,
-                MIN(ano) as ano_mais_antigo,
-                MAX(ano) as ano_mais_novo
-            FROM Carro;
-        """
-        estatisticas = db.execute_select_one(query)
+        return servico_estatisticas.resposta("carros"), 200
+    except Exception as e:
+        print(f"Erro: {e}")
+        return internal_error()
 
-        # Estatísticas por categoria
-        query_categorias = """
-            SELECT 
-                tipo_categoria,
-                COUNT(*) as quantidade,
-                AVG(quilometragem) as media_km
-            FROM Carro
-            GROUP BY tipo_categoria
-            ORDER BY quantidade DESC;
-        """
-        categorias_stats = db.execute_select_all(query_categorias)
+# ============================================================
+# 12.1 Verificar índice da frota contra o banco
+# ============================================================
 
+
+@carros_blueprint.route("/carros/indice/verificar", methods=["GET"])
+def verificar_indice_frota():
+    try:
+        divergentes = indice_frota.verificar_consistencia()
         return jsonify({
-            "estatisticas_gerais": estatisticas,
-            "estatisticas_categorias": categorias_stats
+            "consistente": not divergentes,
+            "placas_divergentes": divergentes,
+            "versao_indice": indice_frota.versao
         }), 200
     except Exception as e:
         print(f"Erro: {e}")
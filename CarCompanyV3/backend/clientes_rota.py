@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify
-from database.conector import DatabaseManager
+from database.conector import DatabaseManager, somente_leitura, tempo_limite
+from database import perfil_cliente
+from database.arquivamento import consulta_historico
+from estatisticas import servico_estatisticas
+from coalescer import coalescer
+from admissao import RELATORIOS, classe_admissao
 import re
 
 clientes_blueprint = Blueprint("clientes", __name__)
@@ -45,11 +50,12 @@ def listar_clientes():
                 nome, 
                 endereco, 
                 telefone,
-                (SELECT COUNT(*) FROM Aluguel WHERE cpf_cliente = cpf) as total_alugueis
+                (SELECT COUNT(*) FROM {Aluguel} WHERE cpf_cliente = cpf) as total_alugueis
             FROM Cliente
             ORDER BY nome;
         """
-        clientes = db.execute_select_all(query)
+        query = consulta_historico(query)
+        clientes = db.execute_select_tabela(query)
         return jsonify({"clientes": clientes}), 200
     except Exception as e:
         return internal_error(str(e))
@@ -71,11 +77,12 @@ def obter_cliente(cpf):
                 nome, 
                 endereco, 
                 telefone,
-                (SELECT COUNT(*) FROM Aluguel WHERE cpf_cliente = Cliente.cpf) as total_alugueis,
-                (SELECT MAX(data_retirada) FROM Aluguel WHERE cpf_cliente = Cliente.cpf) as ultimo_aluguel
+                (SELECT COUNT(*) FROM {Aluguel} WHERE cpf_cliente = Cliente.cpf) as total_alugueis,
+                (SELECT MAX(data_retirada) FROM {Aluguel} WHERE cpf_cliente = Cliente.cpf) as ultimo_aluguel
             FROM Cliente 
             WHERE cpf = %s;
         """
+        query = consulta_historico(query)
         cliente = db.execute_select_one(query, (cpf_formatado,))
 
         if not cliente:
@@ -101,11 +108,12 @@ def buscar_por_nome(nome):
                 nome, 
                 endereco, 
                 telefone,
-                (SELECT COUNT(*) FROM Aluguel WHERE cpf_cliente = Cliente.cpf) as total_alugueis
+                (SELECT COUNT(*) FROM {Aluguel} WHERE cpf_cliente = Cliente.cpf) as total_alugueis
             FROM Cliente
             WHERE nome ILIKE %s
             ORDER BY nome;
         """
+        query = consulta_historico(query)
         dados = db.execute_select_all(query, (f"%{nome}%",))
         return jsonify({"clientes": dados}), 200
     except Exception as e:
@@ -254,20 +262,15 @@ def deletar_cliente(cpf):
             return jsonify({"erro": "Cliente não encontrado"}), 404
 
         # Verificar se cliente tem aluguéis ativos
-        aluguel_ativo = db.execute_select_one("""
-            SELECT 1 FROM Aluguel 
-            WHERE cpf_cliente = %s 
-            AND NOT EXISTS (
-                SELECT 1 FROM Devolucao WHERE num_locacao = Aluguel.num_locacao
-            )
-        """, (cpf_formatado,))
+        aluguel_ativo = db.execute_select_one(
+            "SELECT 1 FROM AluguelAberto WHERE cpf_cliente = %s LIMIT 1;", (cpf_formatado,))
 
         if aluguel_ativo:
             return jsonify({"erro": "Não é possível remover cliente com aluguel em andamento"}), 400
 
-        # Verificar histórico geral de aluguéis
+        # Verificar histórico geral de aluguéis (inclusive os arquivados)
         historico_alugueis = db.execute_select_one(
-            "SELECT COUNT(*) as total FROM Aluguel WHERE cpf_cliente = %s",
+            "SELECT COUNT(*) as total FROM TodosAlugueis WHERE cpf_cliente = %s",
             (cpf_formatado,)
         )
 
@@ -302,6 +305,9 @@ def deletar_cliente(cpf):
 # 7. Histórico de locações - CORRIGIDO
 # ============================================================
 @clientes_blueprint.route("/clientes/<cpf>/historico", methods=["GET"])
+@classe_admissao(RELATORIOS)
+@coalescer()
+@tempo_limite(10)
 def historico_cliente(cpf):
     cpf_formatado = formatar_cpf(cpf)
     if not cpf_formatado:
@@ -328,26 +334,30 @@ def historico_cliente(cpf):
                 c.tipo_categoria,
                 cat.preco_diaria,
                 CASE 
-                    WHEN EXISTS (SELECT 1 FROM Devolucao d WHERE d.num_locacao = a.num_locacao) 
-                    THEN 'FINALIZADO' 
+                    WHEN ab.num_locacao IS NULL THEN 'FINALIZADO' 
                     ELSE 'EM ANDAMENTO' 
                 END as status,
                 d.data_real_devolucao,
                 p.valor_total as valor_final
-            FROM Aluguel a
+            FROM {Aluguel} a
             JOIN Carro c ON c.placa = a.placa
             JOIN Categoria cat ON c.tipo_categoria = cat.tipo
-            LEFT JOIN Devolucao d ON d.num_locacao = a.num_locacao
-            LEFT JOIN Pagamento p ON p.num_pagamento = d.num_pagamento
+            LEFT JOIN {Devolucao} d ON d.num_locacao = a.num_locacao AND d.data_retirada = a.data_retirada
+            LEFT JOIN {Pagamento} p ON p.num_pagamento = d.num_pagamento
+            LEFT JOIN AluguelAberto ab ON ab.num_locacao = a.num_locacao
             WHERE a.cpf_cliente = %s
             ORDER BY a.data_retirada DESC;
         """
-        dados = db.execute_select_all(query, (cpf_formatado,))
+        query = consulta_historico(query)
+        dados = db.execute_select_tabela(query, (cpf_formatado,))
         
         # Calcular estatísticas
+        i_status = dados.indice("status")
+        i_final = dados.indice("valor_final")
+        i_previsto = dados.indice("valor_previsto")
         total_alugueis = len(dados)
-        alugueis_ativos = len([a for a in dados if a["status"] == "EM ANDAMENTO"])
-        total_gasto = sum([a["valor_final"] or a["valor_previsto"] for a in dados if a["valor_final"] or a["valor_previsto"]])
+        alugueis_ativos = sum(1 for a in dados.linhas if a[i_status] == "EM ANDAMENTO")
+        total_gasto = sum(a[i_final] or a[i_previsto] for a in dados.linhas if a[i_final] or a[i_previsto])
 
         return jsonify({
             "cliente": cliente["nome"],
@@ -370,13 +380,17 @@ def historico_cliente(cpf):
 def clientes_todas_categorias():
     db = DatabaseManager()
     try:
+        # a máscara do cliente contém todos os bits (pode ter a mais, de
+        # categorias removidas): o mesmo teste do desconto na devolução
         query = """
-            SELECT cli.cpf, cli.nome, COUNT(DISTINCT car.tipo_categoria) as categorias_utilizadas
-            FROM Cliente cli
-            JOIN Aluguel al ON al.cpf_cliente = cli.cpf
-            JOIN Carro car ON car.placa = al.placa
-            GROUP BY cli.cpf, cli.nome
-            HAVING COUNT(DISTINCT car.tipo_categoria) = (SELECT COUNT(*) FROM Categoria)
+            WITH todas AS (
+                SELECT bit_or(1::BIGINT << posicao_bit) AS mascara, COUNT(*) AS total
+                FROM Categoria
+            )
+            SELECT cli.cpf, cli.nome, todas.total as categorias_utilizadas
+            FROM todas
+            JOIN PerfilCliente p ON (p.mascara_categorias & todas.mascara) = todas.mascara
+            JOIN Cliente cli ON cli.cpf = p.cpf
             ORDER BY cli.nome;
         """
         dados = db.execute_select_all(query)
@@ -392,12 +406,14 @@ def clientes_todos_acessorios():
     db = DatabaseManager()
     try:
         query = """
-            SELECT cli.cpf, cli.nome, COUNT(DISTINCT aa.tipo_acessorio) as acessorios_utilizados
-            FROM Cliente cli
-            JOIN Aluguel al ON al.cpf_cliente = cli.cpf
-            JOIN Aluguel_Acessorio aa ON aa.num_locacao = al.num_locacao
-            GROUP BY cli.cpf, cli.nome
-            HAVING COUNT(DISTINCT aa.tipo_acessorio) = (SELECT COUNT(*) FROM Acessorio)
+            WITH todos AS (
+                SELECT bit_or(1::BIGINT << posicao_bit) AS mascara, COUNT(*) AS total
+                FROM Acessorio
+            )
+            SELECT cli.cpf, cli.nome, todos.total as acessorios_utilizados
+            FROM todos
+            JOIN PerfilCliente p ON (p.mascara_acessorios & todos.mascara) = todos.mascara
+            JOIN Cliente cli ON cli.cpf = p.cpf
             ORDER BY cli.nome;
         """
         dados = db.execute_select_all(query)
@@ -408,43 +424,52 @@ def clientes_todos_acessorios():
 # ============================================================
 # 10. Estatísticas dos clientes
 # ============================================================
+def calcular_estatisticas(db):
+    query = """
+        SELECT 
+            COUNT(*) as total_clientes,
+            COUNT(CASE WHEN EXISTS (
+                SELECT 1 FROM {Aluguel} WHERE cpf_cliente = Cliente.cpf
+            ) THEN 1 END) as clientes_ativos,
+            AVG((SELECT COUNT(*) FROM {Aluguel} WHERE cpf_cliente = Cliente.cpf)) as media_alugueis_por_cliente,
+            MAX((SELECT COUNT(*) FROM {Aluguel} WHERE cpf_cliente = Cliente.cpf)) as max_alugueis_cliente
+        FROM Cliente;
+    """
+    estatisticas = db.execute_select_one(consulta_historico(query))
+
+    # Top clientes
+    query_top = """
+        SELECT 
+            c.cpf,
+            c.nome,
+            COUNT(a.num_locacao) as total_alugueis,
+            SUM(COALESCE(p.valor_total, a.valor_previsto)) as total_gasto
+        FROM Cliente c
+        LEFT JOIN {Aluguel} a ON a.cpf_cliente = c.cpf
+        LEFT JOIN {Devolucao} d ON d.num_locacao = a.num_locacao AND d.data_retirada = a.data_retirada
+        LEFT JOIN {Pagamento} p ON p.num_pagamento = d.num_pagamento
+        GROUP BY c.cpf, c.nome
+        ORDER BY total_gasto DESC NULLS LAST
+        LIMIT 10;
+    """
+    top_clientes = db.execute_select_all(consulta_historico(query_top))
+
+    return {
+        "estatisticas_gerais": estatisticas,
+        "top_clientes": top_clientes
+    }
+
+
+servico_estatisticas.registrar("clientes", calcular_estatisticas)
+
+
 @clientes_blueprint.route("/clientes/estatisticas", methods=["GET"])
+@classe_admissao(RELATORIOS)
+@coalescer()
+@somente_leitura
 def estatisticas_clientes():
-    db = DatabaseManager()
     try:
-        query = """
-            SELECT 
-                COUNT(*) as total_clientes,
-                COUNT(CASE WHEN EXISTS (
-                    SELECT 1 FROM Aluguel WHERE cpf_cliente = Cliente.cpf
-                ) THEN 1 END) as clientes_ativos,
-                AVG((SELECT COUNT(*) FROM Aluguel WHERE cpf_cliente = Cliente.cpf)) as media_alugueis_por_cliente,
-                MAX((SELECT COUNT(*) FROM Aluguel WHERE cpf_cliente = Cliente.cpf)) as max_alugueis_cliente
-            FROM Cliente;
-        """
-        estatisticas = db.execute_select_one(query)
-        
-        # Top clientes
-        query_top = """
-            SELECT 
-                c.cpf,
-                c.nome,
-                COUNT(a.num_locacao) as total_alugueis,
-                SUM(COALESCE(p.valor_total, a.valor_previsto)) as total_gasto
-            FROM Cliente c
-            LEFT JOIN Aluguel a ON a.cpf_cliente = c.cpf
-            LEFT JOIN Devolucao d ON d.num_locacao = a.num_locacao
-            LEFT JOIN Pagamento p ON p.num_pagamento = d.num_pagamento
-            GROUP BY c.cpf, c.nome
-            ORDER BY total_gasto DESC NULLS LAST
-            LIMIT 10;
-        """
-        top_clientes = db.execute_select_all(query_top)
-        
-        return jsonify({
-            "estatisticas_gerais": estatisticas,
-            "top_clientes": top_clientes
-        }), 200
+        return servico_estatisticas.resposta("clientes"), 200
     except Exception as e:
         return internal_error(str(e))
 
@@ -558,4 +583,46 @@ def upsert_cliente():
                 db.conn.rollback()
         except:
             pass
-        return internal_error(str(e))
\ No newline at end of file
+        return internal_error(str(e))
+
+# ============================================================
+# 13. Perfil de fidelidade do cliente
+# ============================================================
+@clientes_blueprint.route("/clientes/<cpf>/perfil", methods=["GET"])
+def perfil_do_cliente(cpf):
+    cpf_formatado = formatar_cpf(cpf)
+    if not cpf_formatado:
+        return bad_request("CPF inválido")
+
+    db = DatabaseManager()
+    try:
+        perfil = perfil_cliente.obter_perfil(db, cpf_formatado)
+        if not perfil:
+            return jsonify({"erro": "Perfil não encontrado"}), 404
+
+        perfil["todas_categorias_usadas"] = \
+            perfil["mascara_categorias"] & perfil["todas_categorias"] == perfil["todas_categorias"]
+        perfil["todos_acessorios_usados"] = \
+            perfil["mascara_acessorios"] & perfil["todos_acessorios"] == perfil["todos_acessorios"]
+        return jsonify({"perfil": perfil}), 200
+    except Exception as e:
+        return internal_error(str(e))
+
+# ============================================================
+# 14. Reconstruir perfis a partir do histórico
+# ============================================================
+@clientes_blueprint.route("/clientes/perfil/reconstruir", methods=["POST"])
+def reconstruir_perfis():
+    data = request.get_json(silent=True) or {}
+    cpf_formatado = None
+    if data.get("cpf"):
+        cpf_formatado = formatar_cpf(data["cpf"])
+        if not cpf_formatado:
+            return bad_request("CPF inválido")
+
+    db = DatabaseManager()
+    try:
+        total = perfil_cliente.reconstruir_perfis(db, cpf_formatado)
+        return jsonify({"mensagem": "Perfis reconstruídos", "perfis": total}), 200
+    except Exception as e:
+        return internal_error(str(e))
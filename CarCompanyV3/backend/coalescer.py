@@ -0,0 +1,303 @@
+"""
+Coalescência de requisições GET idênticas (single-flight).
+
+Com @coalescer() numa rota, requisições simultâneas iguais (mesma rota,
+argumentos da URL e query string) compartilham uma única execução: a
+primeira (líder) executa a view e as outras esperam e recebem uma cópia
+da mesma resposta, ou a mesma exceção. Nada fica guardado depois que a
+execução termina: não é cache, só junta o que já está em andamento.
+
+Entre threads do mesmo processo a espera é um threading.Event. Entre
+processos (vários workers do servidor), o líder de cada processo disputa
+um lock de arquivo (fcntl.flock) em PASTA_LOCKS; quem não consegue espera
+o lock ser liberado e lê a resposta que o dono gravou ao lado (JSON),
+desde que ela tenha sido concluída depois do início da espera. A pasta
+precisa ser do usuário do servidor e sem acesso para outros (0700); se
+não for, ou sem fcntl (Windows), a coalescência fica só dentro do processo.
+
+O que se compartilha é a resposta da view (status, cabeçalhos e corpo),
+antes dos after_request: cada requisição monta a própria Response e passa
+pela compressão e pelos cookies normalmente. Use só em rotas que
+respondem JSON (não em streaming).
+"""
+import base64
+import glob
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+from functools import wraps
+
+from flask import Response, g, jsonify, make_response, request
+
+from database.conector import CABECALHO_LSN, COOKIE_LSN, MARCAS_ERRO_BANCO
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescência só entre threads
+    fcntl = None
+
+TEMPO_MAXIMO = float(os.environ.get("COALESCER_TEMPO_MAXIMO", 30))
+PASTA_BACKEND = os.path.dirname(os.path.abspath(__file__))
+PASTA_LOCKS = os.environ.get("COALESCER_PASTA", os.path.join(PASTA_BACKEND, "cache_coalescer"))
+ENTRE_PROCESSOS = fcntl is not None and \
+    os.environ.get("COALESCER_ENTRE_PROCESSOS", "1").lower() not in ("0", "false", "nao", "não")
+INTERVALO_ESPERA = 0.01
+# arquivos de lock/resposta sem uso há mais que isso são apagados
+IDADE_MAXIMA_ARQUIVOS = 600
+
+
+class TempoEsgotado(Exception):
+    """A execução compartilhada não terminou dentro do tempo máximo"""
+
+
+class ErroCompartilhado(Exception):
+    """A execução feita por outro processo falhou (só a mensagem atravessa)"""
+
+
+class RespostaCongelada:
+    """Status, cabeçalhos e corpo de uma resposta, para recriar uma por requisição"""
+
+    def __init__(self, response):
+        self.status = response.status_code
+        self.headers = list(response.headers.items())
+        self.corpo = response.get_data()
+        # tempo/pool esgotado no líder: quem esperou também recebe 504/503
+        self.marcas = {m: True for m in MARCAS_ERRO_BANCO if g.get(m)}
+
+    def criar(self):
+        for marca in self.marcas:
+            setattr(g, marca, True)
+        return Response(self.corpo, status=self.status, headers=self.headers)
+
+    def para_json(self):
+        return {"status": self.status, "headers": self.headers, "marcas": list(self.marcas),
+                "corpo": base64.b64encode(self.corpo).decode("ascii")}
+
+    @classmethod
+    def de_json(cls, dados):
+        resposta = cls.__new__(cls)
+        resposta.status = dados["status"]
+        resposta.headers = [tuple(h) for h in dados["headers"]]
+        resposta.corpo = base64.b64decode(dados["corpo"])
+        resposta.marcas = dict.fromkeys(dados["marcas"], True)
+        return resposta
+
+
+class Voo:
+    """Execução em andamento no processo e quem está esperando por ela"""
+
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class Coalescedor:
+    def __init__(self, pasta=PASTA_LOCKS, entre_processos=ENTRE_PROCESSOS):
+        self.pasta = pasta
+        self.entre_processos = entre_processos
+        self._lock = threading.Lock()
+        self._voos = {}
+        self._limpo_em = 0.0
+        self._pasta_verificada = False
+        self.execucoes = 0
+        self.compartilhadas_threads = 0
+        self.compartilhadas_processos = 0
+        self.tempo_esgotado = 0
+        self.erros = 0
+
+    @staticmethod
+    def chave():
+        """Hash da rota, argumentos e query string (e da marca de escrita do cliente)"""
+        partes = (
+            request.method,
+            request.endpoint,
+            sorted((request.view_args or {}).items()),
+            sorted(request.args.items(multi=True)),
+            # quem acabou de escrever lê do primário (read-your-writes): voo próprio
+            request.headers.get(CABECALHO_LSN) or request.cookies.get(COOKIE_LSN),
+        )
+        return hashlib.sha256(repr(partes).encode()).hexdigest()[:32]
+
+    def executar(self, chave, funcao, tempo_maximo=TEMPO_MAXIMO):
+        """Resultado de funcao(), executada uma vez para todas as chamadas simultâneas com a chave"""
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = Voo()
+
+        if not lider:
+            if not voo.pronto.wait(tempo_maximo):
+                self.tempo_esgotado += 1
+                raise TempoEsgotado(f"Execução compartilhada não terminou em {tempo_maximo}s")
+            self.compartilhadas_threads += 1
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+
+        try:
+            if self.entre_processos and self._preparar_pasta():
+                voo.resultado = self._executar_entre_processos(chave, funcao, tempo_maximo)
+            else:
+                voo.resultado = self._executar(funcao)
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._voos[chave]
+            voo.pronto.set()
+        return voo.resultado
+
+    def _executar(self, funcao):
+        self.execucoes += 1
+        try:
+            return funcao()
+        except Exception:
+            self.erros += 1
+            raise
+
+    # --------------------------------------------------------
+    # Entre processos: lock de arquivo + resposta gravada ao lado
+    # --------------------------------------------------------
+
+    def _preparar_pasta(self):
+        """
+        Cria a pasta (0700) e confere que é um diretório do usuário do
+        servidor sem acesso para outros: ninguém mais pode plantar respostas.
+        """
+        if self._pasta_verificada:
+            return True
+        try:
+            os.makedirs(self.pasta, mode=0o700, exist_ok=True)
+            info = os.lstat(self.pasta)
+        except OSError as e:
+            print(f"Coalescência entre processos desligada: {e}")
+            self.entre_processos = False
+            return False
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            print(f"Coalescência entre processos desligada: {self.pasta} precisa ser "
+                  f"um diretório do usuário do servidor com permissão 0700")
+            self.entre_processos = False
+            return False
+        self._pasta_verificada = True
+        return True
+
+    def _executar_entre_processos(self, chave, funcao, tempo_maximo):
+        self._limpar()
+        caminho = os.path.join(self.pasta, chave)
+        inicio = time.time()
+        limite = time.monotonic() + tempo_maximo
+
+        fd = os.open(caminho + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            esperou = False
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    esperou = True
+                    if time.monotonic() >= limite:
+                        self.tempo_esgotado += 1
+                        raise TempoEsgotado(f"Execução compartilhada não terminou em {tempo_maximo}s")
+                    time.sleep(INTERVALO_ESPERA)
+            try:
+                if esperou:
+                    # outro processo executou enquanto esperávamos: usa o resultado dele
+                    gravado = self._ler(caminho + ".res", inicio)
+                    if gravado is not None:
+                        self.compartilhadas_processos += 1
+                        if "erro" in gravado:
+                            for marca in gravado["marcas"]:
+                                setattr(g, marca, True)
+                            raise ErroCompartilhado(gravado["erro"])
+                        return RespostaCongelada.de_json(gravado["resposta"])
+                try:
+                    resposta = self._executar(funcao)
+                except Exception as e:
+                    self._gravar(caminho + ".res", {
+                        "erro": str(e), "marcas": [m for m in MARCAS_ERRO_BANCO if g.get(m)]})
+                    raise
+                self._gravar(caminho + ".res", {"resposta": resposta.para_json()})
+                return resposta
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _gravar(destino, dados):
+        temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"concluido_em": time.time(), **dados}, f)
+        os.replace(temporario, destino)
+
+    @staticmethod
+    def _ler(origem, desde):
+        """Resultado gravado depois de `desde`, ou None"""
+        try:
+            with open(origem, encoding="utf-8") as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return dados if dados.get("concluido_em", 0) >= desde else None
+
+    def _limpar(self):
+        agora = time.time()
+        if agora - self._limpo_em < IDADE_MAXIMA_ARQUIVOS:
+            return
+        self._limpo_em = agora
+        for arquivo in glob.glob(os.path.join(self.pasta, "*")):
+            try:
+                if agora - os.path.getmtime(arquivo) > IDADE_MAXIMA_ARQUIVOS:
+                    os.remove(arquivo)
+            except OSError:
+                pass
+
+    def metricas(self):
+        return {
+            "entre_processos": self.entre_processos,
+            "em_andamento": len(self._voos),
+            "execucoes": self.execucoes,
+            "compartilhadas_threads": self.compartilhadas_threads,
+            "compartilhadas_processos": self.compartilhadas_processos,
+            "tempo_esgotado": self.tempo_esgotado,
+            "erros": self.erros,
+        }
+
+
+coalescedor = Coalescedor()
+
+
+def coalescer(tempo_maximo=TEMPO_MAXIMO):
+    """
+    Decorador de rota GET: requisições iguais simultâneas compartilham uma
+    execução da view. Quem espera mais que `tempo_maximo` recebe 504; quem
+    esperou por uma execução de outro processo que falhou recebe o 500 em
+    JSON das rotas (ou 504/503, se a falha foi tempo ou pool esgotado).
+    """
+    def decorador(view):
+        @wraps(view)
+        def rota(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            try:
+                resposta = coalescedor.executar(
+                    coalescedor.chave(),
+                    lambda: RespostaCongelada(make_response(view(*args, **kwargs))),
+                    tempo_maximo)
+            except TempoEsgotado as e:
+                return jsonify({"erro": "Tempo esgotado aguardando a mesma consulta em andamento.",
+                                "detalhes": str(e)}), 504
+            except ErroCompartilhado as e:
+                # as marcas de banco (se houver) já estão em g: o 500 vira 504/503
+                print(f"DEBUG: {e}")
+                return jsonify({"erro": "Erro interno no servidor"}), 500
+            return resposta.criar()
+        return rota
+    return decorador
@@ -0,0 +1,171 @@
+"""
+Compressão das respostas HTTP (gzip, brotli ou zstd).
+
+Escolhe a codificação pelo Accept-Encoding entre as disponíveis (gzip
+sempre; br e zstd se os pacotes brotli/zstandard estiverem instalados),
+ignora corpos pequenos e tipos já comprimidos, comprime respostas em
+stream bloco a bloco (com flush, para o SSE continuar chegando na hora) e
+guarda as versões comprimidas de respostas com ETag num cache LRU.
+"""
+import zlib
+
+from flask import request
+
+from cache_lru import CacheLRUBytes
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard é opcional
+    zstandard = None
+
+TAMANHO_MINIMO = 1024
+LIMITE_CACHE_BYTES = 32 * 1024 * 1024
+
+# tipos que valem a pena comprimir (imagens, parquet e arrow já vêm comprimidos)
+TIPOS_COMPRIMIVEIS = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+# ============================================================
+# Compressores (mesma interface: comprimir, descarregar, finalizar)
+# ============================================================
+
+
+class _Gzip:
+    def __init__(self, nivel=6):
+        self._obj = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    def comprimir(self, dados):
+        return self._obj.compress(dados)
+
+    def descarregar(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self):
+        return self._obj.flush()
+
+
+class _Brotli:
+    def __init__(self, qualidade=5):
+        # qualidade 11 (padrão) é lenta demais para respostas dinâmicas
+        self._obj = brotli.Compressor(quality=qualidade)
+
+    def comprimir(self, dados):
+        return self._obj.process(dados)
+
+    def descarregar(self):
+        return self._obj.flush()
+
+    def finalizar(self):
+        return self._obj.finish()
+
+
+class _Zstd:
+    def __init__(self, nivel=3):
+        self._obj = zstandard.ZstdCompressor(level=nivel).compressobj()
+
+    def comprimir(self, dados):
+        return self._obj.compress(dados)
+
+    def descarregar(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finalizar(self):
+        return self._obj.flush()
+
+
+# codificação -> compressor, em ordem de preferência do servidor
+COMPRESSORES = {}
+if zstandard is not None:
+    COMPRESSORES["zstd"] = _Zstd
+if brotli is not None:
+    COMPRESSORES["br"] = _Brotli
+COMPRESSORES["gzip"] = _Gzip
+
+
+def comprimir_tudo(dados, codificacao):
+    compressor = COMPRESSORES[codificacao]()
+    return compressor.comprimir(dados) + compressor.finalizar()
+
+
+def comprimir_stream(pedacos, codificacao):
+    compressor = COMPRESSORES[codificacao]()
+    for pedaco in pedacos:
+        if isinstance(pedaco, str):
+            pedaco = pedaco.encode()
+        saida = compressor.comprimir(pedaco) + compressor.descarregar()
+        if saida:
+            yield saida
+    yield compressor.finalizar()
+
+
+def _comprimivel(response):
+    mimetype = response.mimetype or ""
+    return mimetype.startswith(TIPOS_COMPRIMIVEIS)
+
+
+class Compressao:
+    """Middleware (after_request) de compressão das respostas"""
+
+    def __init__(self, app=None, tamanho_minimo=TAMANHO_MINIMO,
+                 limite_cache_bytes=LIMITE_CACHE_BYTES):
+        self.tamanho_minimo = tamanho_minimo
+        self.cache = CacheLRUBytes(limite_cache_bytes)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.comprimir)
+
+    def escolher_codificacao(self):
+        return request.accept_encodings.best_match(list(COMPRESSORES))
+
+    def comprimir(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or request.method == "HEAD"
+                or "Content-Encoding" in response.headers
+                or response.direct_passthrough
+                or not _comprimivel(response)):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        codificacao = self.escolher_codificacao()
+        if codificacao is None:
+            return response
+
+        if response.is_streamed:
+            response.response = comprimir_stream(response.response, codificacao)
+            response.headers.pop("Content-Length", None)
+        else:
+            dados = response.get_data()
+            if len(dados) < self.tamanho_minimo:
+                return response
+            response.set_data(self._comprimir_cacheado(response, dados, codificacao))
+
+        response.headers["Content-Encoding"] = codificacao
+        etag, fraco = response.get_etag()
+        if etag and not fraco:
+            # o corpo mudou de bytes, mas não de significado: vira ETag fraco
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _comprimir_cacheado(self, response, dados, codificacao):
+        etag, _ = response.get_etag()
+        cacheavel = etag and "no-store" not in (response.headers.get("Cache-Control") or "")
+        if not cacheavel:
+            return comprimir_tudo(dados, codificacao)
+
+        chave = (etag, codificacao, response.mimetype)
+        comprimido = self.cache.obter(chave)
+        if comprimido is None:
+            comprimido = comprimir_tudo(dados, codificacao)
+            self.cache.guardar(chave, comprimido)
+        return comprimido
@@ -0,0 +1,75 @@
+"""
+Leitura de COPY ... TO STDOUT WITH (FORMAT binary) direto para arrays NumPy.
+
+Serve para consultas cujas colunas são todas de tamanho fixo e NOT NULL
+(int4, float8...): cada linha do COPY tem então sempre o mesmo tamanho e
+os blocos que chegam do cursor são interpretados com um dtype estruturado
+(np.frombuffer), sem criar tuplas Python. Na consulta, use COALESCE e
+converta numeric/bool/date para ::float8/::int4.
+"""
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: quem usa este módulo responde 501 sem ele
+    np = None
+
+_CABECALHO_COPY = 19   # assinatura (11) + flags (4) + extensão do cabeçalho (4)
+_TRAILER_COPY = b"\xff\xff"
+
+
+def dtype_copy(campos):
+    """
+    dtype de uma linha do COPY binário: nº de campos (int16) e, para cada
+    campo (nome, tipo big-endian como ">i4"/">f8"), tamanho int32 + valor.
+    """
+    estrutura = [("campos", ">i2")]
+    for i, (nome, tipo) in enumerate(campos, start=1):
+        estrutura += [(f"t{i}", ">i4"), (nome, tipo)]
+    return np.dtype(estrutura)
+
+
+class LeitorCopyBinario:
+    """
+    Arquivo "de escrita" para DatabaseManager.copiar: converte as linhas do COPY
+    binário em arrays (na ordem de bytes da máquina) à medida que os blocos
+    chegam.
+    """
+
+    def __init__(self, campos):
+        self.nomes = [nome for nome, _ in campos]
+        self.dtype = dtype_copy(campos)
+        self._pendente = b""
+        self._cabecalho_lido = False
+        self._partes = []
+
+    def write(self, dados):
+        dados = self._pendente + bytes(dados)
+        if not self._cabecalho_lido:
+            if len(dados) < _CABECALHO_COPY:
+                self._pendente = dados
+                return
+            dados = dados[_CABECALHO_COPY:]
+            self._cabecalho_lido = True
+        completas = len(dados) // self.dtype.itemsize
+        fim = completas * self.dtype.itemsize
+        if completas:
+            linhas = np.frombuffer(dados, dtype=self.dtype, count=completas)
+            if (linhas["campos"] != len(self.nomes)).any():
+                raise ValueError("COPY binário com formato inesperado")
+            self._partes.append([linhas[n].astype(linhas[n].dtype.newbyteorder("=")) for n in self.nomes])
+        self._pendente = dados[fim:]
+
+    def colunas(self):
+        """{nome: array} com todas as linhas lidas"""
+        # o que sobra no fim é o trailer do COPY (int16 -1)
+        if self._pendente not in (b"", _TRAILER_COPY):
+            raise ValueError("COPY binário truncado")
+        if not self._partes:
+            return {n: np.empty(0, dtype=self.dtype[n].newbyteorder("=")) for n in self.nomes}
+        return {n: np.concatenate(p) for n, p in zip(self.nomes, zip(*self._partes))}
+
+
+def ler_copy(db, sql, params, campos):
+    """Executa o COPY no DatabaseManager db e devolve as colunas"""
+    leitor = LeitorCopyBinario(campos)
+    db.copiar(db.cursor_tuplas.mogrify(sql, params).decode(), leitor)
+    return leitor.colunas()
@@ -0,0 +1,181 @@
+"""
+Cotação de preços de todos os carros disponíveis para um ou mais períodos.
+
+Uma consulta traz os carros disponíveis com o preço da diária e o bit da
+categoria (posicao_bit), outra os acessórios pedidos; com o perfil do
+cliente (opcional) as regras de desconto viram operações sobre arrays:
+o resultado é uma matriz períodos x carros calculada de uma vez com
+NumPy e ordenada por período. As cotações ficam num cache LRU por
+(períodos, opções), invalidado pela versão dos dados (outbox) e pela data
+(o desconto de reserva antecipada depende de hoje).
+
+As regras são as mesmas cobradas na devolução (aluguel_rota): diária x
+dias (mínimo 1), seguro +20% sobre as diárias, acessórios por dia e os
+descontos fixos de cliente fiel, reserva antecipada (retirada a 7 dias ou
+mais da reserva, que é hoje), sequência sem multas, todas as categorias e
+todos os acessórios. Para os descontos de perfil a locação cotada já
+conta, como acontece na devolução. O total vale para devolução na data
+prevista, sem multas.
+"""
+from datetime import date, datetime
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: sem ele /cotacao responde 501
+    np = None
+
+from cache_lru import CacheLRUVersionado
+from database import perfil_cliente
+from relatorio_jobs import versao_dados
+
+ADICIONAL_SEGURO = 0.20
+
+# descontos fixos (R$) e as condições, usados aqui e na devolução
+DESCONTO_CLIENTE_FIEL = 50.00
+DESCONTO_RESERVA_ANTECIPADA = 30.00
+DESCONTO_SEM_MULTAS = 40.00
+DESCONTO_TODAS_CATEGORIAS = 60.00
+DESCONTO_TODOS_ACESSORIOS = 45.00
+ALUGUEIS_CLIENTE_FIEL = 5
+DIAS_RESERVA_ANTECIPADA = 7
+SEQUENCIA_SEM_MULTAS = 5
+
+TAMANHO_CACHE = 256
+# preços de Categoria/Acessorio não geram evento: revalida de tempos em tempos
+VALIDADE_CACHE = 300
+
+EVENTOS_COTACAO = (
+    "ALUGUEL_CRIADO", "ALUGUEL_DEVOLVIDO", "MANUTENCAO_CRIADA",
+    "CARRO_CADASTRADO", "CARRO_ATUALIZADO", "CARRO_REMOVIDO", "CARRO_STATUS_ALTERADO",
+)
+
+CONSULTA_CARROS = """
+    SELECT c.placa, c.nome, c.tipo_categoria, cat.preco_diaria, cat.posicao_bit
+    FROM Carro c
+    JOIN Categoria cat ON cat.tipo = c.tipo_categoria
+    WHERE c.status_carro = 'DISPONIVEL'
+      AND NOT EXISTS (SELECT 1 FROM AluguelAberto ab WHERE ab.placa = c.placa)
+      AND (%(categorias)s::text[] IS NULL OR c.tipo_categoria = ANY(%(categorias)s::text[]))
+    ORDER BY c.placa;
+"""
+
+CONSULTA_ACESSORIOS = """
+    SELECT tipo, preco_adicional, posicao_bit
+    FROM Acessorio
+    WHERE tipo = ANY(%s);
+"""
+
+
+def calcular_cotacoes(carros, periodos, preco_acessorios, mascara_acessorios, seguro, perfil, hoje):
+    """
+    Matriz (períodos x carros) com valor_base, seguro, acessórios, descontos
+    e total. `carros` é a lista de linhas de CONSULTA_CARROS.
+    """
+    preco = np.array([float(c["preco_diaria"]) for c in carros], dtype=np.float64)
+    bit_categoria = np.left_shift(1, np.array([c["posicao_bit"] for c in carros], dtype=np.int64))
+    dias = np.array([max((fim - ini).days, 1) for ini, fim in periodos], dtype=np.float64)
+    antecedencia = np.array([(ini - hoje).days for ini, _ in periodos])
+
+    valor_base = dias[:, None] * preco[None, :]
+    valor_seguro = valor_base * ADICIONAL_SEGURO if seguro else np.zeros_like(valor_base)
+    valor_acessorios = np.broadcast_to((dias * preco_acessorios)[:, None], valor_base.shape)
+
+    # descontos que dependem só do período ou só do carro, somados por broadcast
+    por_periodo = np.where(antecedencia >= DIAS_RESERVA_ANTECIPADA, DESCONTO_RESERVA_ANTECIPADA, 0.0)
+    por_carro = np.zeros(len(carros))
+    total_alugueis = (perfil["total_alugueis"] if perfil else 0) + 1
+    if total_alugueis >= ALUGUEIS_CLIENTE_FIEL:
+        por_carro += DESCONTO_CLIENTE_FIEL
+    if perfil:
+        if perfil["sequencia_sem_multas"] >= SEQUENCIA_SEM_MULTAS:
+            por_carro += DESCONTO_SEM_MULTAS
+        todas = perfil["todas_categorias"]
+        if todas:
+            completa = ((perfil["mascara_categorias"] | bit_categoria) & todas) == todas
+            por_carro += np.where(completa, DESCONTO_TODAS_CATEGORIAS, 0.0)
+    todos_acessorios = perfil["todos_acessorios"] if perfil else 0
+    mascara_cliente = (perfil["mascara_acessorios"] if perfil else 0) | mascara_acessorios
+    if todos_acessorios and mascara_cliente & todos_acessorios == todos_acessorios:
+        por_carro += DESCONTO_TODOS_ACESSORIOS
+    descontos = por_periodo[:, None] + por_carro[None, :]
+
+    bruto = valor_base + valor_seguro + valor_acessorios
+    descontos = np.minimum(descontos, bruto)
+    return {
+        "dias": dias,
+        "valor_base": valor_base,
+        "valor_seguro": valor_seguro,
+        "valor_acessorios": valor_acessorios,
+        "descontos": descontos,
+        "total": bruto - descontos,
+    }
+
+
+class MotorCotacao:
+    def __init__(self, tamanho_cache=TAMANHO_CACHE):
+        self.cache = CacheLRUVersionado(tamanho_cache)
+
+    def cotar(self, db, periodos, categorias=None, acessorios=(), seguro=False, cpf=None):
+        """
+        Cotações de todos os carros disponíveis para cada período
+        [(retirada, devolução prevista)], ordenadas pelo total. Levanta
+        ValueError para acessório inexistente.
+        """
+        hoje = date.today()
+        categorias = sorted(set(categorias)) if categorias else None
+        acessorios = sorted(set(acessorios or ()))
+        chave = (tuple(periodos), tuple(categorias or ()), tuple(acessorios), bool(seguro), cpf, hoje)
+        versao = versao_dados(db, EVENTOS_COTACAO)
+        resultado = self.cache.obter(chave, versao, VALIDADE_CACHE)
+        if resultado is not None:
+            return resultado
+
+        linhas_acessorios = db.execute_select_all(CONSULTA_ACESSORIOS, (acessorios,)) if acessorios else []
+        desconhecidos = set(acessorios) - {a["tipo"] for a in linhas_acessorios}
+        if desconhecidos:
+            raise ValueError(f"Acessórios inexistentes: {', '.join(sorted(desconhecidos))}")
+        preco_acessorios = sum(float(a["preco_adicional"]) for a in linhas_acessorios)
+        mascara_acessorios = 0
+        for a in linhas_acessorios:
+            mascara_acessorios |= 1 << a["posicao_bit"]
+
+        carros = db.execute_select_all(CONSULTA_CARROS, {"categorias": categorias})
+        perfil = perfil_cliente.obter_perfil(db, cpf) if cpf else None
+
+        resultado = {
+            "seguro": bool(seguro),
+            "acessorios": acessorios,
+            "categorias": categorias,
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "periodos": [],
+        }
+        if carros:
+            valores = calcular_cotacoes(
+                carros, periodos, preco_acessorios, mascara_acessorios, seguro, perfil, hoje)
+            valores = {k: np.round(v, 2) for k, v in valores.items()}
+        for i, (ini, fim) in enumerate(periodos):
+            ordem = np.argsort(valores["total"][i], kind="stable") if carros else ()
+            resultado["periodos"].append({
+                "data_retirada": ini.isoformat(),
+                "data_prevista_devolucao": fim.isoformat(),
+                "dias": max((fim - ini).days, 1),
+                "cotacoes": [
+                    {
+                        "placa": carros[j]["placa"],
+                        "nome": carros[j]["nome"],
+                        "tipo_categoria": carros[j]["tipo_categoria"],
+                        "preco_diaria": float(carros[j]["preco_diaria"]),
+                        "valor_base": float(valores["valor_base"][i, j]),
+                        "valor_seguro": float(valores["valor_seguro"][i, j]),
+                        "valor_acessorios": float(valores["valor_acessorios"][i, j]),
+                        "descontos": float(valores["descontos"][i, j]),
+                        "total": float(valores["total"][i, j]),
+                    }
+                    for j in ordem
+                ],
+            })
+        self.cache.guardar(chave, versao, resultado)
+        return resultado
+
+
+motor_cotacao = MotorCotacao()
@@ -0,0 +1,102 @@
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+import traceback
+
+from database.conector import DatabaseManager
+from cotacao import motor_cotacao, np
+
+cotacao_blueprint = Blueprint("cotacao", __name__)
+
+# limite de períodos num único POST /cotacao
+MAX_PERIODOS = 50
+
+# ============================================================
+# Helpers
+# ============================================================
+
+
+def internal_error(msg="Erro interno no servidor"):
+    print(f"DEBUG: {msg}")
+    return jsonify({"erro": msg}), 500
+
+
+def parse_date(s):
+    # aceita "AAAA-MM-DD" ou datetime ISO; só a data importa na cotação
+    return datetime.fromisoformat(str(s).strip()).date()
+
+
+def parse_lista(valor):
+    if not valor:
+        return []
+    if isinstance(valor, str):
+        valor = valor.split(",")
+    return [v.strip() for v in valor if v and str(v).strip()]
+
+
+def parse_bool(valor):
+    if isinstance(valor, bool):
+        return valor
+    return str(valor or "").strip().lower() in ("1", "true", "sim", "on")
+
+
+def parse_periodo(retirada, devolucao):
+    if not retirada or not devolucao:
+        raise ValueError("Informe 'data_retirada' e 'data_prevista_devolucao'.")
+    try:
+        inicio = parse_date(retirada)
+        fim = parse_date(devolucao)
+    except ValueError:
+        raise ValueError("Datas devem estar no formato AAAA-MM-DD.")
+    if fim < inicio:
+        raise ValueError("Data de devolução não pode ser anterior à retirada.")
+    return inicio, fim
+
+# ============================================================
+# 1. Cotação de todos os carros disponíveis
+#    GET  /cotacao?data_retirada=...&data_prevista_devolucao=...
+#         [&categorias=A,B][&acessorios=X,Y][&seguro=true][&cpf=...]
+#    POST /cotacao {"periodos": [{"data_retirada", "data_prevista_devolucao"}, ...],
+#                   "categorias", "acessorios", "seguro", "cpf"}
+# ============================================================
+
+
+# sem @somente_leitura: a cotação vem logo antes de criar o aluguel e a
+# disponibilidade precisa ser a do primário, não a de uma réplica atrasada
+@cotacao_blueprint.route("/cotacao", methods=["GET", "POST"])
+def cotacao():
+    if np is None:
+        return jsonify({"erro": "Cotação indisponível: instale o pacote numpy."}), 501
+
+    dados = (request.get_json(silent=True) or {}) if request.method == "POST" else request.args
+    try:
+        if request.method == "POST":
+            periodos = dados.get("periodos") or [dados]
+            if not isinstance(periodos, list) or len(periodos) > MAX_PERIODOS:
+                raise ValueError(f"'periodos' deve ser uma lista com até {MAX_PERIODOS} itens.")
+            periodos = [
+                parse_periodo(p.get("data_retirada"), p.get("data_prevista_devolucao"))
+                for p in periodos
+            ]
+        else:
+            periodos = [parse_periodo(dados.get("data_retirada"), dados.get("data_prevista_devolucao"))]
+    except (ValueError, AttributeError) as e:
+        return jsonify({"erro": str(e) if isinstance(e, ValueError) else "Período inválido."}), 400
+
+    cpf = "".join(c for c in str(dados.get("cpf") or "") if c.isdigit()) or None
+
+    try:
+        db = DatabaseManager()
+        resultado = motor_cotacao.cotar(
+            db,
+            periodos,
+            categorias=parse_lista(dados.get("categorias")),
+            acessorios=parse_lista(dados.get("acessorios")),
+            seguro=parse_bool(dados.get("seguro")),
+            cpf=cpf,
+        )
+        return jsonify(resultado), 200
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return internal_error(f"Erro ao calcular a cotação: {e}")
@@ -0,0 +1,93 @@
+"""
+Arquivamento das locações antigas já devolvidas (schema aluguel_arquivo).
+
+arquivar_alugueis (banco.sql) move um lote de locações devolvidas, com
+devolução, pagamento, multas, descontos, acessórios e histórico, para as
+tabelas de arquivo. Aqui os lotes rodam em transações curtas, uma por
+lote, para não segurar locks nem inchar o WAL de uma vez.
+
+O histórico e os relatórios leem as views Todos*/Todas* (tabelas quentes +
+arquivo). Com HISTORICO_INCLUIR_ARQUIVO=0 eles passam a ler só as tabelas
+quentes, mais rápidas, sem as locações arquivadas.
+
+Uso (na pasta backend):
+    python -m database.arquivamento                 # devolvidas há mais de 12 meses
+    python -m database.arquivamento --meses 6 --lote 500
+"""
+import argparse
+import os
+from datetime import datetime
+
+from database.conector import DatabaseManager
+
+MESES_PADRAO = 12
+TAMANHO_LOTE = 1000
+
+INCLUIR_ARQUIVO = os.environ.get("HISTORICO_INCLUIR_ARQUIVO", "1").lower() not in ("0", "false", "nao", "não")
+
+# tabela quente -> view com o arquivo
+VIEWS_HISTORICO = {
+    "Aluguel": "TodosAlugueis",
+    "Aluguel_Acessorio": "TodosAlugueisAcessorios",
+    "Devolucao": "TodasDevolucoes",
+    "Pagamento": "TodosPagamentos",
+    "Multa": "TodasMultas",
+    "Desconto": "TodosDescontos",
+}
+
+
+def tabela_historico(nome):
+    """Nome a usar em consultas de histórico: a view com o arquivo ou a tabela quente"""
+    return VIEWS_HISTORICO[nome] if INCLUIR_ARQUIVO else nome
+
+
+def consulta_historico(sql):
+    """Troca {Aluguel}, {Devolucao}, {Pagamento}... na consulta por tabela_historico()"""
+    return sql.format_map({nome: tabela_historico(nome) for nome in VIEWS_HISTORICO})
+
+
+def _limite(meses):
+    hoje = datetime.now()
+    total = hoje.year * 12 + hoje.month - 1 - meses
+    return hoje.replace(year=total // 12, month=total % 12 + 1, day=1,
+                        hour=0, minute=0, second=0, microsecond=0)
+
+
+def arquivar(db, meses=MESES_PADRAO, tamanho_lote=TAMANHO_LOTE, max_lotes=None):
+    """
+    Arquiva, em lotes, as locações devolvidas com retirada anterior ao
+    início do mês de `meses` atrás. Retorna o total de locações movidas.
+    """
+    antes = _limite(meses)
+    total = lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        with db.transacao():
+            row = db.execute_select_one(
+                "SELECT arquivar_alugueis(%s, %s) AS movidos;", (antes, tamanho_lote))
+        movidos = row["movidos"] if row else 0
+        total += movidos
+        lotes += 1
+        if movidos < tamanho_lote:
+            break
+    return total
+
+
+def resumo_arquivo(db):
+    """Quantidade de linhas quentes e arquivadas de Aluguel"""
+    return db.execute_select_one("""
+        SELECT (SELECT COUNT(*) FROM Aluguel) AS alugueis_ativos,
+               (SELECT COUNT(*) FROM aluguel_arquivo.Aluguel) AS alugueis_arquivados;
+    """)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquiva locações antigas já devolvidas")
+    parser.add_argument("--meses", type=int, default=MESES_PADRAO,
+                        help="idade mínima, em meses, da retirada (padrão: %(default)s)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE,
+                        help="locações por transação (padrão: %(default)s)")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    print(f"Locações arquivadas: {arquivar(db, args.meses, args.lote)}")
+    print(resumo_arquivo(db))
@@ -1,43 +1,761 @@
-from typing import Any, Optional
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Any, Iterator, Optional
+import itertools
+import os
+import select
+import socket
+import threading
+import time
 import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.errors import QueryCanceled
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import DictCursor
+from flask import g, has_app_context, has_request_context, jsonify, request
+
+# Dados de conexão usados por todas as conexões da aplicação
+DB_CONFIG = {
+    "dbname": "carcompany",
+    "user": "postgres",
+    "host": "127.0.0.1",
+    "password": "0205",
+    "port": 5432,
+    "client_encoding": "utf8",
+}
+
+
+# Réplica de leitura (streaming replication): só o que muda em relação ao
+# DB_CONFIG. Sem DB_REPLICA_HOST as rotas somente leitura usam o primário.
+DB_REPLICA_CONFIG = {
+    "host": os.environ["DB_REPLICA_HOST"],
+    "port": int(os.environ.get("DB_REPLICA_PORT", 5432)),
+} if os.environ.get("DB_REPLICA_HOST") else None
+
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", 20))
+# quanto uma requisição espera por uma conexão livre antes de desistir
+POOL_ESPERA_MAX = float(os.environ.get("DB_POOL_ESPERA_MAX", 5))
+# conexões de cada pool que só as requisições de checkout (aluguel,
+# devolução, pagamento) podem usar; ver admissao.py
+POOL_RESERVA = int(os.environ.get("DB_POOL_RESERVA", 4))
+# tempo máximo (s) de cada comando SQL nas requisições; @tempo_limite muda
+# por rota e db.limitar() por consulta. 0 desliga
+TEMPO_LIMITE_PADRAO = float(os.environ.get("DB_TEMPO_LIMITE", 30))
+INTERVALO_VERIFICACAO_DESCONEXAO = 0.5
+# atraso máximo aceito da réplica antes de mandar as leituras para o primário
+REPLICA_LAG_MAX = float(os.environ.get("DB_REPLICA_LAG_MAX", 5))
+INTERVALO_VERIFICACAO_REPLICA = 1.0
+
+PRIMARIO = "primario"
+REPLICA = "replica"
+
+# posição de WAL da última escrita do cliente (read-your-writes)
+CABECALHO_LSN = "X-Carcompany-LSN"
+COOKIE_LSN = "carcompany_lsn"
+
+# Aluguel e Devolucao têm as mesmas partições: junta partição a partição
+OPCOES_SESSAO = "-c search_path=aluguel -c enable_partitionwise_join=on"
+
+
+def config_papel(papel=PRIMARIO):
+    """Parâmetros de conexão do primário ou da réplica"""
+    config = dict(DB_CONFIG, options=OPCOES_SESSAO)
+    if papel == REPLICA:
+        config.update(DB_REPLICA_CONFIG or {})
+    return config
+
+
+def conectar(papel=PRIMARIO):
+    """Abre uma conexão nova (fora do pool) já apontando para o schema aluguel"""
+    return psycopg2.connect(**config_papel(papel))
+
+# ============================================================
+# Pools de conexões (primário e réplica)
+# ============================================================
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão do pool ficou livre dentro do tempo de espera"""
+
+
+class ErroConsulta(Exception):
+    """A consulta falhou no banco (a transação já foi desfeita)"""
+
+
+class PoolConexoes:
+    """
+    ThreadedConnectionPool com espera limitada (o do psycopg2 falha na hora
+    quando esgota) e contadores para /metricas.
+
+    `reserva` conexões ficam só para quem pede reservada=True: as demais
+    requisições disputam as maximo - reserva vagas comuns.
+    """
+
+    def __init__(self, papel, minimo=POOL_MIN, maximo=POOL_MAX, espera_max=POOL_ESPERA_MAX,
+                 reserva=POOL_RESERVA):
+        self.papel = papel
+        self.maximo = maximo
+        self.espera_max = espera_max
+        self.reserva = max(min(reserva, maximo - 1), 0)
+        self._pool = pg_pool.ThreadedConnectionPool(minimo, maximo, **config_papel(papel))
+        self._vagas = threading.BoundedSemaphore(maximo)
+        self._vagas_comuns = threading.BoundedSemaphore(maximo - self.reserva)
+        self._comuns = set()   # id() das conexões que ocupam uma vaga comum
+        self._lock = threading.Lock()
+        self.em_uso = 0
+        self.obtidas = 0
+        self.esperas = 0
+        self.tempo_espera = 0.0
+        self.esgotado = 0
+        self.descartadas = 0
+
+    def _adquirir(self, vaga, prazo):
+        if vaga.acquire(blocking=False):
+            return True
+        with self._lock:
+            self.esperas += 1
+        return vaga.acquire(timeout=max(prazo - time.monotonic(), 0))
+
+    def obter(self, espera_max=None, reservada=False):
+        """
+        Conexão livre; espera no máximo espera_max (limitado ao do pool).
+        Sem reservada=True só usa as vagas comuns (fora da reserva).
+        """
+        espera = self.espera_max if espera_max is None else min(espera_max, self.espera_max)
+        inicio = time.perf_counter()
+        prazo = time.monotonic() + espera
+        vagas = [self._vagas] if reservada else [self._vagas_comuns, self._vagas]
+        obtidas = []
+        for vaga in vagas:
+            if not self._adquirir(vaga, prazo):
+                for v in obtidas:
+                    v.release()
+                with self._lock:
+                    self.esgotado += 1
+                raise PoolEsgotado(f"Pool '{self.papel}' sem conexões livres")
+            obtidas.append(vaga)
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            for v in obtidas:
+                v.release()
+            raise
+        with self._lock:
+            self.em_uso += 1
+            self.obtidas += 1
+            self.tempo_espera += time.perf_counter() - inicio
+            if not reservada:
+                self._comuns.add(id(conn))
+        return conn
+
+    def vagas_comuns_esgotadas(self):
+        return len(self._comuns) >= self.maximo - self.reserva
+
+    def devolver(self, conn):
+        # transação aberta (até um SELECT abre uma) não pode voltar para o pool
+        descartar = bool(conn.closed)
+        if not descartar:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+        with self._lock:
+            comum = id(conn) in self._comuns
+            self._comuns.discard(id(conn))
+        self._pool.putconn(conn, close=descartar)
+        with self._lock:
+            self.em_uso -= 1
+            self.descartadas += descartar
+        self._vagas.release()
+        if comum:
+            self._vagas_comuns.release()
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "maximo": self.maximo,
+                "reserva": self.reserva,
+                "em_uso": self.em_uso,
+                "em_uso_comuns": len(self._comuns),
+                "obtidas": self.obtidas,
+                "esperas": self.esperas,
+                "tempo_espera_medio_ms": round(1000 * self.tempo_espera / self.obtidas, 3) if self.obtidas else 0,
+                "esgotado": self.esgotado,
+                "descartadas": self.descartadas,
+            }
+
+
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+def obter_pool(papel):
+    pool = _pools.get(papel)
+    if pool is None:
+        with _lock_pools:
+            pool = _pools.get(papel)
+            if pool is None:
+                pool = _pools[papel] = PoolConexoes(papel)
+    return pool
+
+
+def pool_existente(papel):
+    """Pool do papel se já foi criado, sem abrir conexões (None se não)"""
+    return _pools.get(papel)
+
+# ============================================================
+# Roteamento leitura/escrita
+# ============================================================
+
+
+def _lsn_para_int(lsn):
+    alto, baixo = lsn.split("/")
+    return (int(alto, 16) << 32) | int(baixo, 16)
+
+
+class MonitorReplica:
+    """
+    Estado da réplica (disponível, atraso e LSN já aplicado), consultado no
+    máximo uma vez por INTERVALO_VERIFICACAO_REPLICA, e contadores de roteamento.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lock_contadores = threading.Lock()
+        self._verificado_em = 0.0
+        self.disponivel = False
+        self.lag = None
+        self.lsn_aplicado = 0
+        self.leituras_replica = 0
+        self.fallback_indisponivel = 0
+        self.fallback_lag = 0
+        self.fallback_lsn = 0
+
+    def _verificar(self):
+        agora = time.monotonic()
+        if agora - self._verificado_em < INTERVALO_VERIFICACAO_REPLICA:
+            return
+        with self._lock:
+            if agora - self._verificado_em < INTERVALO_VERIFICACAO_REPLICA:
+                return
+            self._verificado_em = agora
+            try:
+                pool = obter_pool(REPLICA)
+                conn = pool.obter()
+                try:
+                    with conn.cursor() as cur:
+                        # sem WAL pendente a réplica está em dia, mesmo que a
+                        # última transação aplicada seja antiga
+                        cur.execute("""
+                            SELECT pg_is_in_recovery(),
+                                   pg_last_wal_replay_lsn()::text,
+                                   CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                                   END;
+                        """)
+                        em_recuperacao, lsn, lag = cur.fetchone()
+                finally:
+                    pool.devolver(conn)
+                self.disponivel = bool(em_recuperacao)
+                self.lag = float(lag) if lag is not None else None
+                self.lsn_aplicado = _lsn_para_int(lsn) if lsn else 0
+            except Exception as e:
+                print(f"Réplica indisponível: {e}")
+                self.disponivel = False
+                self.lag = None
+
+    def escolher(self, lsn_minimo=None):
+        """Papel para uma leitura: REPLICA se estiver em dia, senão PRIMARIO"""
+        self._verificar()
+        if not self.disponivel:
+            papel, contador = PRIMARIO, "fallback_indisponivel"
+        elif self.lag is None or self.lag > REPLICA_LAG_MAX:
+            papel, contador = PRIMARIO, "fallback_lag"
+        elif lsn_minimo and self.lsn_aplicado < lsn_minimo:
+            # a réplica ainda não tem a última escrita deste cliente
+            papel, contador = PRIMARIO, "fallback_lsn"
+        else:
+            papel, contador = REPLICA, "leituras_replica"
+        # += não é atômico entre threads
+        with self._lock_contadores:
+            setattr(self, contador, getattr(self, contador) + 1)
+        return papel
+
+    def metricas(self):
+        with self._lock_contadores:
+            contadores = {
+                "leituras_replica": self.leituras_replica,
+                "fallback_indisponivel": self.fallback_indisponivel,
+                "fallback_lag": self.fallback_lag,
+                "fallback_lsn": self.fallback_lsn,
+            }
+        return {
+            "configurada": DB_REPLICA_CONFIG is not None,
+            "disponivel": self.disponivel,
+            "lag_segundos": self.lag,
+            "lag_maximo": REPLICA_LAG_MAX,
+            **contadores,
+        }
+
+
+monitor_replica = MonitorReplica()
+
+
+def somente_leitura(func):
+    """
+    Marca a rota como somente leitura: os DatabaseManager() criados nela
+    usam a réplica (se configurada e em dia) em vez do primário.
+    """
+    @wraps(func)
+    def rota(*args, **kwargs):
+        g.somente_leitura = True
+        return func(*args, **kwargs)
+    return rota
+
+
+def tempo_limite(segundos):
+    """
+    Tempo máximo de cada comando SQL dos DatabaseManager() criados na rota
+    (no lugar de TEMPO_LIMITE_PADRAO). Também limita a espera por conexão.
+    """
+    def decorador(func):
+        @wraps(func)
+        def rota(*args, **kwargs):
+            g.tempo_limite = segundos
+            return func(*args, **kwargs)
+        return rota
+    return decorador
+
+# ============================================================
+# Tempo limite e cancelamento de consultas
+# ============================================================
+
+
+class ClienteDesconectado(Exception):
+    """O cliente da requisição desconectou; as próximas consultas não rodam"""
+
+
+# marcas em g que viram 504/503 (ver configurar_banco); copiadas pelo coalescer
+MARCAS_ERRO_BANCO = ("tempo_esgotado", "pool_esgotado")
+
+
+class MonitorCancelamento:
+    """
+    Cancela no servidor (conn.cancel) o comando em andamento das requisições
+    cujo cliente desconectou e conta os comandos que estouraram o tempo.
+    A desconexão só é percebida em servidores que expõem o socket no
+    environ ("werkzeug.socket", como o app.run); nos outros só vale o
+    statement_timeout.
+    """
+
+    def __init__(self, intervalo=INTERVALO_VERIFICACAO_DESCONEXAO):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._ativos = {}   # DatabaseManager -> socket do cliente
+        self._thread = None
+        self.tempo_esgotado = 0
+        self.desconexoes = 0
+
+    def registrar(self, db):
+        if not has_request_context():
+            return
+        sock = request.environ.get("werkzeug.socket")
+        if sock is None:
+            return
+        with self._lock:
+            self._ativos[db] = sock
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="cancelamento", daemon=True)
+                self._thread.start()
+
+    def remover(self, db):
+        # com o lock: o loop não cancela uma conexão que já voltou ao pool
+        with self._lock:
+            self._ativos.pop(db, None)
+
+    @staticmethod
+    def _desconectado(sock):
+        try:
+            legivel, _, _ = select.select([sock], [], [], 0)
+            # fechado do outro lado: fica legível e recv devolve b""
+            return bool(legivel) and sock.recv(1, socket.MSG_PEEK) == b""
+        except ValueError:   # socket TLS/fechado: não dá para saber
+            return False
+        except OSError:
+            return True
+
+    def _loop(self):
+        while True:
+            time.sleep(self.intervalo)
+            with self._lock:
+                ativos = list(self._ativos.items())
+            for db, sock in ativos:
+                if db.desconectado or not self._desconectado(sock):
+                    continue
+                with self._lock:
+                    if db not in self._ativos or db.conn is None or db.conn.closed:
+                        continue
+                    db.desconectado = True
+                    try:
+                        db.conn.cancel()
+                        self.desconexoes += 1
+                    except psycopg2.Error as e:
+                        print(f"Erro ao cancelar consulta: {e}")
+
+    def metricas(self):
+        return {
+            "tempo_limite_padrao": TEMPO_LIMITE_PADRAO,
+            "tempo_esgotado": self.tempo_esgotado,
+            "canceladas_desconexao": self.desconexoes,
+            "monitorando": len(self._ativos),
+        }
+
+
+monitor_cancelamento = MonitorCancelamento()
+
+
+def _resposta_erro(status, mensagem, retry_after=None):
+    response = jsonify({"erro": mensagem})
+    response.status_code = status
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def resposta_tempo_esgotado(_erro=None):
+    return _resposta_erro(504, "A consulta excedeu o tempo limite e foi cancelada.")
+
+
+def resposta_pool_esgotado(_erro=None):
+    return _resposta_erro(503, "Servidor sobrecarregado: nenhuma conexão livre com o banco.",
+                          retry_after=max(int(POOL_ESPERA_MAX), 1))
+
+
+def _lsn_cliente():
+    valor = request.headers.get(CABECALHO_LSN) or request.cookies.get(COOKIE_LSN)
+    try:
+        return _lsn_para_int(valor) if valor else None
+    except ValueError:
+        return None
+
+
+def papel_da_requisicao():
+    if not has_app_context() or not g.get("somente_leitura") or DB_REPLICA_CONFIG is None:
+        return PRIMARIO
+    return monitor_replica.escolher(_lsn_cliente())
+
+
+def metricas_banco():
+    """Contadores dos pools e do roteamento para a réplica"""
+    return {
+        "pools": {papel: pool.metricas() for papel, pool in list(_pools.items())},
+        "replica": monitor_replica.metricas(),
+        "cancelamento": monitor_cancelamento.metricas(),
+    }
+
+
+def configurar_banco(app):
+    """
+    Liga os DatabaseManager da requisição ao ciclo do Flask: devolve as
+    conexões ao pool no fim da requisição e, se houve escrita, informa ao
+    cliente a posição do WAL (cabeçalho e cookie) para read-your-writes.
+    Consulta cancelada por tempo vira 504 e pool esgotado vira 503.
+    """
+    app.register_error_handler(QueryCanceled, resposta_tempo_esgotado)
+    app.register_error_handler(PoolEsgotado, resposta_pool_esgotado)
+
+    @app.after_request
+    def informar_lsn(response):
+        gerenciadores = [db for db in g.get("_conexoes_db", ())
+                         if db.papel == PRIMARIO and db.escreveu and not db.conn.closed]
+        if gerenciadores and DB_REPLICA_CONFIG is not None:
+            try:
+                with gerenciadores[-1].conn.cursor() as cur:
+                    cur.execute("SELECT pg_current_wal_lsn()::text;")
+                    lsn = cur.fetchone()[0]
+                response.headers[CABECALHO_LSN] = lsn
+                response.set_cookie(COOKIE_LSN, lsn, max_age=300, httponly=True, samesite="Lax")
+            except psycopg2.Error as e:
+                print(f"Erro ao ler LSN: {e}")
+        return response
+
+    @app.after_request
+    def erro_de_banco(response):
+        # as rotas tratam qualquer exceção com um 500 genérico: se foi tempo
+        # ou pool esgotado, o cliente recebe 504/503 e sabe que pode tentar de novo
+        if response.status_code == 500:
+            if g.get("tempo_esgotado"):
+                return resposta_tempo_esgotado()
+            if g.get("pool_esgotado"):
+                return resposta_pool_esgotado()
+        return response
+
+    @app.teardown_appcontext
+    def liberar_conexoes(_erro=None):
+        for db in g.pop("_conexoes_db", ()):
+            db.fechar()
+
+
+class LinhasTabela:
+    """
+    Resultado de consulta em formato tabular: nomes das colunas + linhas (tuplas).
+    Não monta um dict por linha na consulta; na resposta o formato colunar
+    também não (o de objetos, com orjson, monta: ver json_rapido.py).
+    """
+
+    __slots__ = ("colunas", "linhas", "colunar")
+
+    def __init__(self, colunas, linhas, colunar=False):
+        self.colunas = list(colunas)
+        self.linhas = linhas
+        # colunar=True serializa como {"colunas": [...], "linhas": [[...]]}
+        self.colunar = colunar
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def indice(self, coluna):
+        return self.colunas.index(coluna)
+
+    def como_dicts(self):
+        return [dict(zip(self.colunas, linha)) for linha in self.linhas]
+
+
+@lru_cache(maxsize=256)
+def tipo_registro(colunas: tuple):
+    """namedtuple (sem __dict__ por instância) para um conjunto de colunas"""
+    return namedtuple("Registro", colunas, rename=True)
+
+
+# modos aceitos por execute_select / iterar_select
+MODOS_FETCH = ("dict", "tupla", "registro", "colunas", "tabela")
+
+_contador_cursores = itertools.count()
 
 
 class DatabaseManager:
-    """Classe de Gerenciamento do database"""
-
-    def __init__(self) -> None:
-        self.conn = psycopg2.connect(
-            dbname="carcompany",
-            user="postgres",
-            host="127.0.0.1",
-            password="0205",
-            port=5432,
-            client_encoding='utf8'
-        )
+    """
+    Classe de Gerenciamento do database.
+
+    Dentro de uma requisição a conexão vem do pool do papel escolhido
+    (réplica nas rotas @somente_leitura, primário nas demais ou se
+    papel=PRIMARIO) e volta ao pool no fim da requisição. Fora do Flask
+    (scripts, threads de fundo) abre uma conexão própria no primário.
+
+    Cada comando tem o tempo limite da rota (ou tempo_limite, em segundos),
+    aplicado com SET LOCAL statement_timeout na transação; fora do Flask
+    não há limite, a não ser o passado aqui.
+    """
+
+    def __init__(self, papel: Optional[str] = None, tempo_limite: Optional[float] = None) -> None:
+        self._pool = None
+        self.tempo_limite = tempo_limite
+        self._limite_aplicado = None
+        self.desconectado = False
+        if has_app_context():
+            self.papel = papel or papel_da_requisicao()
+            if self.tempo_limite is None:
+                self.tempo_limite = g.get("tempo_limite", TEMPO_LIMITE_PADRAO)
+            self._pool = obter_pool(self.papel)
+            try:
+                # sobrecarregado: falha dentro do tempo da rota em vez de enfileirar;
+                # só o checkout (g.usa_reserva_pool, ver admissao.py) usa a reserva
+                self.conn = self._pool.obter(self.tempo_limite or None,
+                                             reservada=g.get("usa_reserva_pool", False))
+            except PoolEsgotado:
+                g.pool_esgotado = True
+                raise
+            g.setdefault("_conexoes_db", []).append(self)
+            monitor_cancelamento.registrar(self)
+        else:
+            self.papel = papel or PRIMARIO
+            self.conn = conectar(self.papel)
         self.cursor = self.conn.cursor(cursor_factory=DictCursor)
-        self.cursor.execute("SET search_path TO aluguel;")
-        self.conn.commit()
+        # cursor simples (tuplas) para os caminhos que não precisam de DictRow
+        self.cursor_tuplas = self.conn.cursor()
+        self._em_transacao = False
+        self.escreveu = False
+        self.ultimo_erro = None
+
+    def fechar(self):
+        """Devolve a conexão ao pool (ou fecha, se não veio de um pool)"""
+        if self.conn is None:
+            return
+        monitor_cancelamento.remover(self)
+        for cur in (self.cursor, self.cursor_tuplas):
+            if not cur.closed:
+                cur.close()
+        if self._pool is not None:
+            self._pool.devolver(self.conn)
+        else:
+            self.conn.close()
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fechar()
+
+    @contextmanager
+    def transacao(self):
+        """
+        Agrupa vários comandos em uma única transação.
+        Dentro do bloco os métodos execute_* não fazem commit; o commit
+        acontece ao sair do bloco e qualquer erro desfaz tudo.
+        """
+        self._em_transacao = True
+        try:
+            yield self
+            self.conn.commit()
+            self.escreveu = True
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self._em_transacao = False
 
-    def _exec(self, query: str, params: Optional[tuple] = None):
+    @contextmanager
+    def limitar(self, segundos: Optional[float]):
+        """Tempo limite dos comandos dentro do bloco, no lugar do da rota (None desliga)"""
+        anterior, self.tempo_limite = self.tempo_limite, segundos
         try:
-            self.cursor.execute(query, params)
+            yield self
+        finally:
+            self.tempo_limite = anterior
+
+    @contextmanager
+    def _comando(self, cursor):
+        """Envolve um comando: tempo limite da transação e marca de cancelamento"""
+        if self.desconectado:
+            raise ClienteDesconectado("Cliente desconectou; consulta não executada")
+        if self.conn.get_transaction_status() == TRANSACTION_STATUS_IDLE:
+            # SET LOCAL acaba junto com a transação
+            self._limite_aplicado = None
+        if (self.tempo_limite or None) != self._limite_aplicado:
+            valor = f"{int(self.tempo_limite * 1000)}ms" if self.tempo_limite else "0"
+            cursor.execute("SET LOCAL statement_timeout = %s;", (valor,))
+            self._limite_aplicado = self.tempo_limite or None
+        try:
+            yield
+        except QueryCanceled:
+            if not self.desconectado:
+                monitor_cancelamento.tempo_esgotado += 1
+            if has_app_context():
+                g.tempo_esgotado = True
+            raise
+
+    def _exec(self, query: str, params: Optional[tuple] = None, cursor=None):
+        cursor = cursor or self.cursor
+        try:
+            with self._comando(cursor):
+                cursor.execute(query, params)
             return True
+        except (QueryCanceled, ClienteDesconectado):
+            # cancelada: sobe em vez de seguir como se não houvesse linhas
+            if not self._em_transacao:
+                self.conn.rollback()
+            raise
         except Exception as e:
+            if self._em_transacao:
+                # dentro de transacao() o erro sobe para desfazer o bloco todo
+                raise
             print("Erro ao executar:", e)
+            self.ultimo_erro = e
             self.conn.rollback()
             return False
 
+    def _commit(self):
+        if not self._em_transacao:
+            self.conn.commit()
+            self.escreveu = True
+
     def execute_statement(self, query: str, params: Optional[tuple] = None) -> bool:
         if not self._exec(query, params):
             return False
-        self.conn.commit()
+        self._commit()
         return True
 
     def execute_select_all(self, query: str, params: Optional[tuple] = None):
         self._exec(query, params)
         return [dict(row) for row in self.cursor.fetchall()]
 
+    def execute_select_tabela(self, query: str, params: Optional[tuple] = None, colunar: bool = False) -> LinhasTabela:
+        return self.execute_select(query, params, modo="tabela", colunar=colunar)
+
+    def execute_select(self, query: str, params: Optional[tuple] = None, modo: str = "tupla", colunar: bool = False):
+        """
+        SELECT com o formato de linha escolhido:
+          - "tupla": lista de tuplas (sem DictRow nem dict por linha)
+          - "registro": lista de namedtuples (acesso por nome, sem dict)
+          - "colunas": dict coluna -> lista de valores (orientado a coluna)
+          - "tabela": LinhasTabela (nomes das colunas + tuplas)
+          - "dict": mesmo formato de execute_select_all
+        Levanta ErroConsulta se a consulta falhar; comando sem linhas de
+        resultado devolve o formato vazio, sem colunas.
+        """
+        if modo not in MODOS_FETCH:
+            raise ValueError(f"Modo de fetch inválido: {modo}")
+
+        cur = self.cursor_tuplas
+        if not self._exec(query, params, cur):
+            raise ErroConsulta(f"Erro ao executar consulta: {self.ultimo_erro}")
+        if cur.description is None:
+            return self._formatar((), [], modo, colunar)
+        colunas = tuple(c[0] for c in cur.description)
+        linhas = cur.fetchall()
+        return self._formatar(colunas, linhas, modo, colunar)
+
+    def iterar_select(self, query: str, params: Optional[tuple] = None, tamanho_lote: int = 2000) -> Iterator[tuple]:
+        """Gera as linhas (tuplas) de uma consulta sem carregar tudo na memória"""
+        for _, lote in self.iterar_lotes(query, params, tamanho_lote):
+            yield from lote
+
+    def iterar_lotes(self, query: str, params: Optional[tuple] = None, tamanho_lote: int = 2000, modo: str = "tupla"):
+        """
+        Gera (colunas, lote) usando um cursor nomeado (server-side) e fetchmany,
+        de forma que só um lote de linhas fica em memória por vez.
+        """
+        cur = self.conn.cursor(name=f"lote_{next(_contador_cursores)}")
+        cur.itersize = tamanho_lote
+        try:
+            with self._comando(self.cursor_tuplas):
+                cur.execute(query, params)
+            colunas = None
+            while True:
+                with self._comando(self.cursor_tuplas):
+                    lote = cur.fetchmany(tamanho_lote)
+                if colunas is None:
+                    colunas = tuple(c[0] for c in cur.description)
+                if not lote:
+                    break
+                yield colunas, self._formatar(colunas, lote, modo)
+        finally:
+            cur.close()
+
+    @staticmethod
+    def _formatar(colunas, linhas, modo, colunar=False):
+        if modo == "tupla":
+            return linhas
+        if modo == "registro":
+            registro = tipo_registro(colunas)
+            return [registro._make(linha) for linha in linhas]
+        if modo == "colunas":
+            valores = list(zip(*linhas)) if linhas else [()] * len(colunas)
+            return {c: list(v) for c, v in zip(colunas, valores)}
+        if modo == "tabela":
+            return LinhasTabela(colunas, linhas, colunar)
+        if modo == "dict":
+            return [dict(zip(colunas, linha)) for linha in linhas]
+        raise ValueError(f"Modo de fetch inválido: {modo}")
+
+    def copiar(self, sql: str, destino) -> None:
+        """COPY ... TO STDOUT (sql com os parâmetros já aplicados) para o arquivo destino"""
+        with self._comando(self.cursor_tuplas):
+            self.cursor_tuplas.copy_expert(sql, destino)
+
     def execute_select_one(self, query: str, params: Optional[tuple] = None):
         self._exec(query, params)
         row = self.cursor.fetchone()
@@ -45,11 +763,17 @@ class DatabaseManager:
 
     def execute_insert_returning(self, query: str, params: Optional[tuple] = None):
         try:
-            self.cursor.execute(query, params)
+            with self._comando(self.cursor):
+                self.cursor.execute(query, params)
             row = self.cursor.fetchone()
-            self.conn.commit()
+            self._commit()
             return dict(row) if row else None
         except Exception as e:
+            if self._em_transacao:
+                raise
+            if isinstance(e, (QueryCanceled, ClienteDesconectado)):
+                self.conn.rollback()
+                raise
             print("Erro ao executar (RETURNING):", e)
             self.conn.rollback()
             return None
@@ -0,0 +1,161 @@
+"""
+Outbox de eventos e feed de alterações (LISTEN/NOTIFY).
+
+As rotas de escrita gravam um registro em EventoOutbox dentro da mesma
+transação da alteração; o trigger da tabela dispara pg_notify, que só é
+entregue depois do commit. O OuvinteEventos mantém uma conexão em LISTEN
+e repassa cada evento para os assinantes (streams SSE e caches locais).
+"""
+import json
+import queue
+import select
+import threading
+import time
+
+from psycopg2.extras import Json
+
+from database.conector import conectar
+
+CANAL_EVENTOS = "carcompany_eventos"
+
+
+def _json_dumps(dados):
+    return json.dumps(dados, default=str)
+
+
+def registrar_evento(db, tipo, chave=None, dados=None):
+    """Grava um evento na outbox usando a transação corrente do db"""
+    return db.execute_statement(
+        "INSERT INTO EventoOutbox (tipo, chave, payload) VALUES (%s, %s, %s);",
+        (tipo, chave, Json(dados or {}, dumps=_json_dumps))
+    )
+
+
+def eventos_desde(db, id_evento, limite=500):
+    """Lê da outbox os eventos posteriores a id_evento (para replay)"""
+    return db.execute_select_all("""
+        SELECT id_evento, tipo, chave, payload, criado_em
+        FROM EventoOutbox
+        WHERE id_evento > %s
+        ORDER BY id_evento
+        LIMIT %s;
+    """, (id_evento, limite))
+
+
+class OuvinteEventos:
+    """Escuta o canal de eventos e distribui para os assinantes do processo"""
+
+    TAMANHO_FILA = 1000
+
+    def __init__(self, canal=CANAL_EVENTOS):
+        self.canal = canal
+        self._lock = threading.Lock()
+        self._filas = set()
+        self._callbacks = []
+        self._thread = None
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._loop, name="ouvinte-eventos", daemon=True)
+            self._thread.start()
+
+    def assinar(self):
+        """Cria uma fila que recebe todos os eventos a partir de agora"""
+        self.iniciar()
+        fila = queue.Queue(maxsize=self.TAMANHO_FILA)
+        with self._lock:
+            self._filas.add(fila)
+        return fila
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._filas.discard(fila)
+
+    def inscrever(self, callback):
+        """Registra uma função chamada (na thread do ouvinte) a cada evento"""
+        self.iniciar()
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def _avisar_callbacks(self, evento):
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(evento)
+            except Exception as e:
+                print(f"Erro no assinante de eventos: {e}")
+
+    def _distribuir(self, evento):
+        with self._lock:
+            filas = list(self._filas)
+
+        for fila in filas:
+            try:
+                fila.put_nowait(evento)
+            except queue.Full:
+                # assinante lento: encerra o stream, o cliente reconecta
+                # com Last-Event-ID e recupera o restante pela outbox
+                self.cancelar(fila)
+                try:
+                    fila.get_nowait()
+                    fila.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+
+        self._avisar_callbacks(evento)
+
+    def _completar(self, conn, evento):
+        # payload grande demais para o NOTIFY: busca a linha na outbox
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id_evento, tipo, chave, payload, criado_em FROM EventoOutbox WHERE id_evento = %s",
+                (evento["id_evento"],))
+            row = cur.fetchone()
+        if not row:
+            return evento
+        return {
+            "id_evento": row[0], "tipo": row[1], "chave": row[2],
+            "payload": row[3], "criado_em": row[4].isoformat() if row[4] else None
+        }
+
+    def _loop(self):
+        espera = 1
+        while True:
+            conn = None
+            try:
+                conn = conectar()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.canal};")
+                espera = 1
+                # eventos podem ter sido perdidos enquanto estava desconectado:
+                # avisa os caches locais para recarregarem o estado completo
+                self._avisar_callbacks({"id_evento": 0, "tipo": "OUVINTE_CONECTADO", "chave": None})
+
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        evento = json.loads(notify.payload)
+                        if evento.get("truncado"):
+                            evento = self._completar(conn, evento)
+                        self._distribuir(evento)
+            except Exception as e:
+                print(f"Ouvinte de eventos desconectado: {e}")
+                time.sleep(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+ouvinte = OuvinteEventos()
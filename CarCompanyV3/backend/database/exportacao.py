@@ -0,0 +1,50 @@
+"""
+Exportação incremental de locações, devoluções, pagamentos, multas e
+descontos (coluna xid_alteracao, seção 19 do banco.sql).
+
+O cliente guarda a marca devolvida em cada exportação e manda de volta na
+próxima: vêm só as linhas criadas ou alteradas por transações a partir da
+marca, usando o índice em xid_alteracao. Todas as tabelas são lidas no
+mesmo snapshot (REPEATABLE READ) de onde sai a nova marca, então nada é
+perdido entre uma exportação e outra; uma linha pode vir repetida e deve
+ser aplicada pela chave primária (upsert).
+
+As linhas vêm das views Todos*/Todas* (tabelas quentes + aluguel_arquivo),
+independente de HISTORICO_INCLUIR_ARQUIVO: a carga completa traz também as
+locações arquivadas, e uma linha alterada e arquivada antes da exportação
+seguinte não se perde (o arquivamento mantém o xid_alteracao).
+"""
+from database.arquivamento import VIEWS_HISTORICO
+
+# nome na API -> (tabela, chave primária para ordenar)
+TABELAS_EXPORTACAO = {
+    "alugueis": ("Aluguel", "num_locacao, data_retirada"),
+    "devolucoes": ("Devolucao", "num_locacao, data_retirada"),
+    "pagamentos": ("Pagamento", "num_pagamento"),
+    "multas": ("Multa", "id_multa"),
+    "descontos": ("Desconto", "id_desconto"),
+}
+
+
+def exportar_alteracoes(db, desde=None, tabelas=None):
+    """
+    Retorna (marca, {nome: LinhasTabela}) com as linhas alteradas desde a
+    marca (todas, se desde=None). Deve ser a primeira consulta da conexão:
+    abre a própria transação REPEATABLE READ.
+    """
+    tabelas = tabelas or list(TABELAS_EXPORTACAO)
+    resultado = {}
+    with db.transacao():
+        db.execute_statement("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+        marca = db.execute_select_one(
+            "SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS marca;")["marca"]
+        for nome in tabelas:
+            tabela, chave = TABELAS_EXPORTACAO[nome]
+            tabela = VIEWS_HISTORICO[tabela]
+            if desde is None:
+                sql, params = f"SELECT * FROM {tabela} ORDER BY {chave};", None
+            else:
+                sql = f"SELECT * FROM {tabela} WHERE xid_alteracao >= %s::xid8 ORDER BY {chave};"
+                params = (str(desde),)
+            resultado[nome] = db.execute_select(sql, params, modo="tabela", colunar=True)
+    return marca, resultado
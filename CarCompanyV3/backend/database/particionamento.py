@@ -0,0 +1,77 @@
+"""
+Manutenção das partições mensais de Aluguel, Devolucao e HistoricoAluguel.
+
+As três tabelas são particionadas por data_retirada (um mês por partição,
+com os mesmos limites). criar_particoes_aluguel (banco.sql) cria os meses
+que faltam; este módulo a chama para os meses à frente e lista as
+partições existentes. Linhas de meses sem partição caem na partição
+padrão, e aí o mês não pode mais ser criado sem mover essas linhas:
+por isso o comando deve rodar periodicamente (ex.: cron diário).
+
+Uso (na pasta backend):
+    python -m database.particionamento              # mês atual + 3 à frente
+    python -m database.particionamento --meses 12
+    python -m database.particionamento --listar
+"""
+import argparse
+from datetime import date
+
+from database.conector import DatabaseManager
+
+MESES_A_FRENTE = 3
+
+
+def _somar_meses(dia, meses):
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def garantir_particoes(db, meses=MESES_A_FRENTE, inicio=None):
+    """Cria as partições do mês de `inicio` (hoje) até `meses` à frente; retorna quantas criou"""
+    inicio = (inicio or date.today()).replace(day=1)
+    fim = _somar_meses(inicio, meses)
+    with db.transacao():
+        row = db.execute_select_one(
+            "SELECT criar_particoes_aluguel(%s, %s) AS criadas;", (inicio, fim))
+    return row["criadas"] if row else 0
+
+
+def listar_particoes(db):
+    """Partições das tabelas particionadas, com limites e número estimado de linhas"""
+    return db.execute_select_all("""
+        SELECT pai.relname AS tabela,
+               filha.relname AS particao,
+               pg_get_expr(filha.relpartbound, filha.oid) AS limites,
+               filha.reltuples::BIGINT AS linhas_estimadas
+        FROM pg_inherits i
+        JOIN pg_class pai ON pai.oid = i.inhparent
+        JOIN pg_class filha ON filha.oid = i.inhrelid
+        JOIN pg_namespace n ON n.oid = pai.relnamespace
+        WHERE n.nspname = current_schema()
+          AND pai.relname IN ('aluguel', 'devolucao', 'historicoaluguel')
+        ORDER BY pai.relname, filha.relname;
+    """)
+
+
+def linhas_na_particao_padrao(db):
+    """Linhas de Aluguel que caíram na partição padrão (meses sem partição)"""
+    row = db.execute_select_one("SELECT COUNT(*) AS total FROM aluguel_padrao;")
+    return row["total"] if row else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partições mensais de Aluguel")
+    parser.add_argument("--meses", type=int, default=MESES_A_FRENTE,
+                        help="quantos meses à frente garantir (padrão: %(default)s)")
+    parser.add_argument("--listar", action="store_true", help="só lista as partições")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if not args.listar:
+        print(f"Partições criadas: {garantir_particoes(db, args.meses)}")
+    for p in listar_particoes(db):
+        print(f"{p['tabela']:<18} {p['particao']:<28} {p['limites']}")
+
+    padrao = linhas_na_particao_padrao(db)
+    if padrao:
+        print(f"AVISO: {padrao} aluguel(is) na partição padrão (fora dos meses particionados)")
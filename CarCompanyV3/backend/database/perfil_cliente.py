@@ -0,0 +1,58 @@
+"""
+Perfil de fidelidade do cliente (tabela PerfilCliente).
+
+Guarda por CPF o total de aluguéis, as máscaras de bits das categorias e
+acessórios já usados e a sequência atual de devoluções sem multa. É
+atualizado na mesma transação de criar_aluguel/devolver_carro, de forma
+que as regras de desconto leem uma única linha em vez de varrer o
+histórico; reconstruir_perfis recalcula tudo a partir das tabelas.
+"""
+
+
+def registrar_aluguel(db, cpf, tipo_categoria, acessorios=()):
+    """Conta um novo aluguel no perfil (cria o perfil no primeiro aluguel)"""
+    return db.execute_statement("""
+        INSERT INTO PerfilCliente AS p (cpf, total_alugueis, mascara_categorias, mascara_acessorios)
+        VALUES (
+            %s, 1,
+            COALESCE((SELECT 1::BIGINT << posicao_bit FROM Categoria WHERE tipo = %s), 0),
+            (SELECT COALESCE(bit_or(1::BIGINT << posicao_bit), 0) FROM Acessorio WHERE tipo = ANY(%s))
+        )
+        ON CONFLICT (cpf) DO UPDATE SET
+            total_alugueis = p.total_alugueis + 1,
+            mascara_categorias = p.mascara_categorias | EXCLUDED.mascara_categorias,
+            mascara_acessorios = p.mascara_acessorios | EXCLUDED.mascara_acessorios,
+            atualizado_em = CURRENT_TIMESTAMP;
+    """, (cpf, tipo_categoria, list(acessorios)))
+
+
+def registrar_devolucao(db, cpf, teve_multa):
+    """Avança (ou zera, se houve multa) a sequência de devoluções sem multa"""
+    return db.execute_statement("""
+        UPDATE PerfilCliente
+        SET sequencia_sem_multas = CASE WHEN %s THEN 0 ELSE sequencia_sem_multas + 1 END,
+            atualizado_em = CURRENT_TIMESTAMP
+        WHERE cpf = %s;
+    """, (teve_multa, cpf))
+
+
+def obter_perfil(db, cpf):
+    """
+    Perfil do cliente junto com as máscaras completas (todas as categorias e
+    todos os acessórios), numa única consulta. None se o cliente não tem perfil.
+    """
+    return db.execute_select_one("""
+        SELECT p.cpf, p.total_alugueis, p.mascara_categorias, p.mascara_acessorios,
+               p.sequencia_sem_multas, p.atualizado_em,
+               (SELECT COALESCE(bit_or(1::BIGINT << posicao_bit), 0) FROM Categoria) AS todas_categorias,
+               (SELECT COALESCE(bit_or(1::BIGINT << posicao_bit), 0) FROM Acessorio) AS todos_acessorios
+        FROM PerfilCliente p
+        WHERE p.cpf = %s;
+    """, (cpf,))
+
+
+def reconstruir_perfis(db, cpf=None):
+    """Recalcula o perfil de um cliente (ou de todos) a partir do histórico"""
+    with db.transacao():
+        row = db.execute_select_one("SELECT reconstruir_perfil_cliente(%s) AS total;", (cpf,))
+    return row["total"] if row else 0
@@ -0,0 +1,199 @@
+"""
+Estatísticas dos painéis pré-calculadas em memória (stale-while-revalidate).
+
+Cada estatística registrada (nome -> função que recebe um DatabaseManager
+e devolve o payload) é recalculada por uma thread de fundo a cada
+INTERVALO segundos. As rotas respondem sempre da memória, com o momento
+do cálculo (gerado_em e o cabeçalho Age); se o valor já passou do
+intervalo, ele é servido assim mesmo e a thread é acordada para
+recalcular.
+
+Só a thread de fundo recalcula, uma estatística por vez, então
+requisições simultâneas nunca disparam o mesmo agregado em paralelo. A
+primeira requisição antes da primeira carga calcula na hora, e as demais
+que chegarem junto esperam por esse mesmo cálculo (um lock por
+estatística).
+
+Estatísticas registradas com sob_demanda=True (ex.: fallback usado só
+enquanto outra fonte não está pronta) não são recalculadas sozinhas: a
+thread só as atualiza depois que uma requisição leu o valor vencido.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import jsonify
+
+from database.conector import DB_REPLICA_CONFIG, PRIMARIO, DatabaseManager, monitor_replica
+
+INTERVALO = float(os.environ.get("ESTATISTICAS_INTERVALO", 60))
+# depois de uma falha (banco fora), espera antes de tentar de novo
+ESPERA_APOS_FALHA = 10.0
+
+
+class Estatistica:
+    """Payload em memória de uma estatística e seus contadores"""
+
+    def __init__(self, nome, calcular, intervalo, sob_demanda=False):
+        self.nome = nome
+        self.calcular = calcular
+        self.intervalo = intervalo
+        self.sob_demanda = sob_demanda
+        self.pedida = False   # sob demanda: lida vencida desde o último cálculo
+        self.lock = threading.Lock()
+        self.valor = None
+        self.gerado_em = None
+        self.calculado_em = 0.0   # time.monotonic() do último cálculo
+        self.tentar_apos = 0.0
+        self.duracao = None
+        self.erro = None
+        self.atualizacoes = 0
+        self.falhas = 0
+        self.respostas = 0
+        self.respostas_desatualizadas = 0
+
+    def idade(self):
+        return time.monotonic() - self.calculado_em
+
+    def proxima_atualizacao(self):
+        """time.monotonic() a partir do qual a thread deve recalcular"""
+        if self.sob_demanda and not self.pedida:
+            return float("inf")
+        vence = self.calculado_em + self.intervalo if self.valor is not None else 0.0
+        return max(vence, self.tentar_apos)
+
+    def atualizar(self, db):
+        """Recalcula (chamar com o lock); erros sobem para quem chamou"""
+        inicio = time.monotonic()
+        try:
+            valor = self.calcular(db)
+        except Exception as e:
+            self.falhas += 1
+            self.erro = str(e)
+            self.tentar_apos = time.monotonic() + min(self.intervalo, ESPERA_APOS_FALHA)
+            raise
+        self.valor = valor
+        self.gerado_em = datetime.now()
+        self.calculado_em = time.monotonic()
+        self.duracao = self.calculado_em - inicio
+        self.erro = None
+        self.pedida = False
+        self.atualizacoes += 1
+
+
+class ServicoEstatisticas:
+    def __init__(self, intervalo=INTERVALO):
+        self.intervalo = intervalo
+        self._estatisticas = {}
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self._conexoes = {}
+
+    def registrar(self, nome, calcular, intervalo=None, sob_demanda=False):
+        self._estatisticas[nome] = Estatistica(nome, calcular, intervalo or self.intervalo,
+                                               sob_demanda)
+
+    # --------------------------------------------------------
+    # Thread de fundo
+    # --------------------------------------------------------
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="estatisticas", daemon=True)
+            self._thread.start()
+
+    def _banco(self):
+        # agregados só leem: réplica se estiver em dia, como nas rotas @somente_leitura
+        papel = monitor_replica.escolher() if DB_REPLICA_CONFIG is not None else PRIMARIO
+        db = self._conexoes.get(papel)
+        if db is None or db.conn is None or db.conn.closed:
+            db = self._conexoes[papel] = DatabaseManager(papel)
+        return db
+
+    def _recalcular(self, estatistica):
+        # se uma requisição já está calculando (primeira carga), não repete
+        if not estatistica.lock.acquire(blocking=False):
+            return
+        db = None
+        try:
+            db = self._banco()
+            estatistica.atualizar(db)
+        except Exception as e:
+            print(f"Erro ao recalcular estatística {estatistica.nome}: {e}")
+            if db is not None:
+                # conexão pode ter caído: a próxima rodada abre outra
+                self._conexoes.pop(db.papel, None)
+                try:
+                    db.fechar()
+                except Exception:
+                    pass
+                db = None
+        finally:
+            if db is not None and db.conn is not None and not db.conn.closed:
+                db.conn.rollback()
+            estatistica.lock.release()
+
+    def _loop(self):
+        while True:
+            self._acordar.clear()
+            for estatistica in list(self._estatisticas.values()):
+                if estatistica.proxima_atualizacao() <= time.monotonic():
+                    self._recalcular(estatistica)
+            # dorme até a próxima vencer (ou até uma requisição acordar)
+            # (no máximo um intervalo: as sob demanda podem não ter prazo)
+            proxima = min([e.proxima_atualizacao() for e in list(self._estatisticas.values())]
+                          + [time.monotonic() + self.intervalo])
+            self._acordar.wait(max(proxima - time.monotonic(), 0.5))
+
+    # --------------------------------------------------------
+    # Leitura (requisições)
+    # --------------------------------------------------------
+
+    def obter(self, nome):
+        """(payload, gerado_em, idade em segundos); calcula na hora só na primeira vez"""
+        estatistica = self._estatisticas[nome]
+        if estatistica.valor is None:
+            with estatistica.lock:
+                if estatistica.valor is None:
+                    with DatabaseManager() as db:
+                        estatistica.atualizar(db)
+        estatistica.respostas += 1
+        idade = estatistica.idade()
+        if idade >= estatistica.intervalo:
+            estatistica.respostas_desatualizadas += 1
+            estatistica.pedida = True
+            self.iniciar()
+            self._acordar.set()
+        return estatistica.valor, estatistica.gerado_em, idade
+
+    def resposta(self, nome):
+        """Resposta JSON com o payload, gerado_em e o cabeçalho Age"""
+        valor, gerado_em, idade = self.obter(nome)
+        response = jsonify({**valor, "gerado_em": gerado_em.isoformat(timespec="seconds")})
+        response.headers["Age"] = str(int(idade))
+        return response
+
+    def metricas(self):
+        return {
+            "intervalo": self.intervalo,
+            "thread_ativa": bool(self._thread and self._thread.is_alive()),
+            "estatisticas": {
+                e.nome: {
+                    "idade_segundos": round(e.idade(), 1) if e.valor is not None else None,
+                    "duracao_calculo": round(e.duracao, 3) if e.duracao is not None else None,
+                    "atualizacoes": e.atualizacoes,
+                    "falhas": e.falhas,
+                    "ultimo_erro": e.erro,
+                    "respostas": e.respostas,
+                    "respostas_desatualizadas": e.respostas_desatualizadas,
+                }
+                for e in list(self._estatisticas.values())
+            },
+        }
+
+
+servico_estatisticas = ServicoEstatisticas()
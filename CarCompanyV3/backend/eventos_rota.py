@@ -0,0 +1,103 @@
+from flask import Blueprint, Response, request, jsonify
+from database.conector import DatabaseManager
+from database.eventos import ouvinte, eventos_desde
+from admissao import STREAM, classe_admissao
+import json
+import queue
+
+eventos_blueprint = Blueprint("eventos", __name__)
+
+# eventos lidos da outbox por consulta no replay do stream
+LOTE_REPLAY = 500
+
+# ============================================================
+# Helpers
+# ============================================================
+
+
+def internal_error(msg="Erro interno no servidor"):
+    print(f"DEBUG: {msg}")
+    return jsonify({"erro": msg}), 500
+
+
+def formatar_sse(evento):
+    dados = json.dumps(evento, default=str)
+    return f"id: {evento['id_evento']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+
+
+def ler_ultimo_id():
+    valor = request.headers.get("Last-Event-ID") or request.args.get("desde")
+    try:
+        return int(valor) if valor else None
+    except ValueError:
+        return None
+
+# ============================================================
+# 1. Stream de eventos (Server-Sent Events)
+# ============================================================
+
+
+@eventos_blueprint.route("/eventos/stream", methods=["GET"])
+@classe_admissao(STREAM)
+def stream_eventos():
+    ultimo_id = ler_ultimo_id()
+    # assina antes do replay para não perder nada entre a leitura e o stream
+    fila = ouvinte.assinar()
+
+    def gerar():
+        # ids já enviados no replay: o mesmo evento pode chegar de novo pela
+        # fila. Não dá para comparar com o maior id enviado, porque um id
+        # menor (BIGSERIAL) pode ser confirmado depois de um maior.
+        enviados = set()
+        try:
+            yield "retry: 3000\n\n"
+
+            if ultimo_id is not None:
+                # o gerador roda fora do contexto da requisição: conexão própria
+                with DatabaseManager() as db:
+                    desde = ultimo_id
+                    while True:
+                        lote = eventos_desde(db, desde, LOTE_REPLAY)
+                        for evento in lote:
+                            enviados.add(evento["id_evento"])
+                            yield formatar_sse(evento)
+                        if len(lote) < LOTE_REPLAY:
+                            break
+                        desde = lote[-1]["id_evento"]
+
+            while True:
+                try:
+                    evento = fila.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if evento is None:
+                    break
+                if evento["id_evento"] in enviados:
+                    continue
+                yield formatar_sse(evento)
+        finally:
+            ouvinte.cancelar(fila)
+
+    return Response(gerar(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+# ============================================================
+# 2. Eventos desde um id (recuperação sem stream)
+# ============================================================
+
+
+@eventos_blueprint.route("/eventos", methods=["GET"])
+def listar_eventos():
+    desde = request.args.get("desde", 0, type=int)
+    # entre 1 e 5000: o Postgres recusa LIMIT negativo
+    limite = max(1, min(request.args.get("limite", 500, type=int), 5000))
+
+    db = DatabaseManager()
+    try:
+        eventos = eventos_desde(db, desde, limite)
+        return jsonify({"eventos": eventos}), 200
+    except Exception as e:
+        return internal_error(str(e))
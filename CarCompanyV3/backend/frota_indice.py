@@ -0,0 +1,258 @@
+"""
+Índice em memória do estado da frota.
+
+Mantém um registro compacto por carro (com __slots__) indexado por status,
+categoria e modelo. É carregado na subida da aplicação e atualizado pelo
+feed de eventos (LISTEN/NOTIFY), de forma que as consultas de
+disponibilidade e estatísticas não precisem varrer a tabela Carro.
+"""
+import threading
+import time
+
+from database.conector import DatabaseManager
+from database.eventos import ouvinte
+
+QUERY_CARROS = """
+    SELECT
+        c.placa, c.nome, c.tipo_categoria, c.imagem_url, c.status_carro,
+        c.ano, c.quilometragem, cat.preco_diaria, cat.descricao
+    FROM Carro c
+    JOIN Categoria cat ON cat.tipo = c.tipo_categoria
+"""
+
+QUERY_MANUTENCOES = """
+    SELECT placa_carro, num_manutencao, custo, data_inicio, descricao
+    FROM Manutencao
+    WHERE data_retorno IS NULL
+"""
+
+
+class RegistroCarro:
+    """Estado de um carro guardado no índice"""
+
+    __slots__ = ("placa", "nome", "tipo_categoria", "imagem", "status_carro",
+                 "ano", "quilometragem", "preco", "descricao_categoria",
+                 "manutencoes")
+
+    def __init__(self, row):
+        (self.placa, self.nome, self.tipo_categoria, self.imagem,
+         self.status_carro, self.ano, self.quilometragem, self.preco,
+         self.descricao_categoria) = row
+        # manutenções em aberto: tuplas (num_manutencao, custo, data_inicio, descricao)
+        self.manutencoes = ()
+
+
+class IndiceFrota:
+    """Índice da frota por placa, status, categoria e modelo"""
+
+    INTERVALO_NOVA_CARGA = 5  # segundos entre tentativas de carga com o banco fora
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._carros = {}
+        self._por_status = {}
+        self._por_categoria = {}
+        self._por_modelo = {}
+        self._pronto = False
+        self._ultima_tentativa = 0
+        self.versao = 0
+
+    # --------------------------------------------------------
+    # Carga e manutenção do índice
+    # --------------------------------------------------------
+
+    def iniciar(self):
+        """Assina o feed de eventos e faz a primeira carga"""
+        ouvinte.inscrever(self.ao_evento)
+        self.pronto()
+
+    def pronto(self):
+        """Indica se o índice pode responder; tenta carregar se ainda não carregou"""
+        if self._pronto:
+            return True
+        agora = time.monotonic()
+        if agora - self._ultima_tentativa < self.INTERVALO_NOVA_CARGA:
+            return False
+        self._ultima_tentativa = agora
+        try:
+            self.carregar()
+        except Exception as e:
+            print(f"Erro ao carregar índice da frota: {e}")
+        return self._pronto
+
+    def carregar(self, db=None):
+        if db is None:
+            # fora de uma requisição (thread do ouvinte) a conexão é própria: fecha ao terminar
+            with DatabaseManager() as db:
+                return self.carregar(db)
+        carros = {row[0]: RegistroCarro(row) for row in db.execute_select(QUERY_CARROS + ";")}
+        for placa, *manutencao in db.execute_select(QUERY_MANUTENCOES + ";"):
+            if placa in carros:
+                carros[placa].manutencoes += (tuple(manutencao),)
+        db.conn.commit()
+
+        with self._lock:
+            self._carros = {}
+            self._por_status = {}
+            self._por_categoria = {}
+            self._por_modelo = {}
+            for registro in carros.values():
+                self._indexar(registro)
+            self._pronto = True
+            self.versao += 1
+
+    def recarregar_carro(self, placa, db=None):
+        if db is None:
+            with DatabaseManager() as db:
+                return self.recarregar_carro(placa, db)
+        rows = db.execute_select(QUERY_CARROS + " WHERE c.placa = %s;", (placa,))
+        registro = RegistroCarro(rows[0]) if rows else None
+        if registro:
+            manutencoes = db.execute_select(QUERY_MANUTENCOES + " AND placa_carro = %s;", (placa,))
+            registro.manutencoes = tuple(m[1:] for m in manutencoes)
+        db.conn.commit()
+
+        with self._lock:
+            antigo = self._carros.get(placa)
+            if antigo:
+                self._desindexar(antigo)
+            if registro:
+                self._indexar(registro)
+            self.versao += 1
+
+    def ao_evento(self, evento):
+        if evento.get("tipo") == "OUVINTE_CONECTADO":
+            # pode ter perdido eventos enquanto estava desconectado
+            self.carregar()
+        elif self._pronto and evento.get("chave"):
+            self.recarregar_carro(evento["chave"])
+
+    def _indexar(self, registro):
+        self._carros[registro.placa] = registro
+        self._por_status.setdefault(registro.status_carro, set()).add(registro.placa)
+        self._por_categoria.setdefault(registro.tipo_categoria, set()).add(registro.placa)
+        self._por_modelo.setdefault(registro.nome, set()).add(registro.placa)
+
+    def _desindexar(self, registro):
+        del self._carros[registro.placa]
+        self._por_status.get(registro.status_carro, set()).discard(registro.placa)
+        self._por_categoria.get(registro.tipo_categoria, set()).discard(registro.placa)
+        self._por_modelo.get(registro.nome, set()).discard(registro.placa)
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+
+    def carros_com_status(self, status):
+        with self._lock:
+            return [self._carros[p] for p in self._por_status.get(status, ())]
+
+    def carros_da_categoria(self, categoria):
+        with self._lock:
+            return [self._carros[p] for p in self._por_categoria.get(categoria, ())]
+
+    def disponiveis(self):
+        """Um carro disponível por modelo (a maior placa), ordenado por nome"""
+        escolhidos = {}
+        for r in self.carros_com_status("DISPONIVEL"):
+            atual = escolhidos.get(r.nome)
+            if atual is None or r.placa > atual.placa:
+                escolhidos[r.nome] = r
+        return [{
+            "placa": r.placa,
+            "nome": r.nome,
+            "tipo_categoria": r.tipo_categoria,
+            "imagem": r.imagem,
+            "status_carro": r.status_carro,
+            "preco": r.preco,
+            "descricao_categoria": r.descricao_categoria,
+            "ano": r.ano,
+            "quilometragem": r.quilometragem,
+        } for r in sorted(escolhidos.values(), key=lambda r: r.nome)]
+
+    def em_manutencao(self):
+        with self._lock:
+            registros = [r for r in self._carros.values() if r.manutencoes]
+        dados = [{
+            "placa": r.placa,
+            "nome": r.nome,
+            "tipo_categoria": r.tipo_categoria,
+            "imagem": r.imagem,
+            "num_manutencao": num,
+            "custo": custo,
+            "data_inicio": data_inicio,
+            "descricao": descricao,
+            "preco": r.preco,
+        } for r in registros for (num, custo, data_inicio, descricao) in r.manutencoes]
+        dados.sort(key=lambda d: (d["data_inicio"] is not None, d["data_inicio"]), reverse=True)
+        return dados
+
+    def placas_por_modelo(self, termo):
+        """Placas disponíveis cujo modelo contém o termo (como o ILIKE '%termo%')"""
+        termo = termo.lower()
+        with self._lock:
+            modelos = [m for m in self._por_modelo if termo in m.lower()]
+            disponiveis = self._por_status.get("DISPONIVEL", set())
+            return [p for m in modelos for p in self._por_modelo[m] if p in disponiveis]
+
+    def estatisticas(self):
+        with self._lock:
+            registros = list(self._carros.values())
+            categorias = {c: [self._carros[p] for p in placas]
+                          for c, placas in self._por_categoria.items() if placas}
+
+        def media_km(regs):
+            kms = [r.quilometragem for r in regs if r.quilometragem is not None]
+            return sum(kms) / len(kms) if kms else None
+
+        anos = [r.ano for r in registros if r.ano is not None]
+        gerais = {
+            "total_carros": len(registros),
+            "disponiveis": sum(1 for r in registros if r.status_carro == "DISPONIVEL"),
+            "alugados": sum(1 for r in registros if r.status_carro == "ALUGADO"),
+            "manutencao": sum(1 for r in registros if r.status_carro == "MANUTENCAO"),
+            "media_km": media_km(registros),
+            "ano_mais_antigo": min(anos) if anos else None,
+            "ano_mais_novo": max(anos) if anos else None,
+        }
+        por_categoria = [{
+            "tipo_categoria": categoria,
+            "quantidade": len(regs),
+            "media_km": media_km(regs),
+        } for categoria, regs in categorias.items()]
+        por_categoria.sort(key=lambda c: c["quantidade"], reverse=True)
+        return gerais, por_categoria
+
+    # --------------------------------------------------------
+    # Verificação contra o banco
+    # --------------------------------------------------------
+
+    def verificar_consistencia(self, db=None, corrigir=True):
+        """
+        Compara o índice com o estado atual do banco.
+        Retorna a lista de placas divergentes; com corrigir=True recarrega o índice.
+        """
+        if db is None:
+            with DatabaseManager() as db:
+                return self.verificar_consistencia(db, corrigir)
+        banco = {row[0]: row for row in db.execute_select(QUERY_CARROS + ";")}
+        manutencoes = {}
+        for placa, *manutencao in db.execute_select(QUERY_MANUTENCOES + ";"):
+            manutencoes[placa] = manutencoes.get(placa, ()) + (tuple(manutencao),)
+        db.conn.commit()
+
+        with self._lock:
+            memoria = {p: (tuple(getattr(r, s) for s in RegistroCarro.__slots__[:-1]),
+                           tuple(sorted(r.manutencoes)))
+                       for p, r in self._carros.items()}
+
+        divergentes = sorted(
+            p for p in set(banco) | set(memoria)
+            if memoria.get(p) != (banco.get(p), tuple(sorted(manutencoes.get(p, ())))))
+
+        if divergentes and corrigir:
+            self.carregar(db)
+        return divergentes
+
+
+indice_frota = IndiceFrota()
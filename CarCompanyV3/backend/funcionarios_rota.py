@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify
-from database.conector import DatabaseManager
+from database.conector import DatabaseManager, somente_leitura, tempo_limite
+from database.arquivamento import consulta_historico
+from estatisticas import servico_estatisticas
+from coalescer import coalescer
+from admissao import RELATORIOS, classe_admissao
 import re
 from datetime import datetime, date
 from psycopg2 import IntegrityError
@@ -58,6 +62,7 @@ def listar_funcionarios():
                 endereco, 
                 telefone, 
                 qnt_vendas,
+                valor_total_vendas,
                 (CURRENT_DATE - data_inicio) as dias_empresa,
                 CASE 
                     WHEN (CURRENT_DATE - data_inicio) > 365 THEN 'SENIOR'
@@ -108,8 +113,8 @@ def criar_funcionario():
             return bad_request("CPF já cadastrado")
 
         query = """
-            INSERT INTO Funcionario (cpf, nome, data_inicio, endereco, telefone, qnt_vendas)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO Funcionario (cpf, nome, data_inicio, endereco, telefone)
+            VALUES (%s, %s, %s, %s, %s)
             RETURNING num_funcionario;
         """
         res = db.execute_insert_returning(query, (
@@ -117,8 +122,7 @@ def criar_funcionario():
             data["nome"].strip(),
             data_inicio,
             data.get("endereco", "").strip(),
-            data.get("telefone", "").strip(),
-            data.get("qnt_vendas", 0)
+            data.get("telefone", "").strip()
         ))
         
         if not res:
@@ -167,12 +171,12 @@ def obter_funcionario(num_funcionario):
                 telefone, 
                 qnt_vendas,
                 (CURRENT_DATE - data_inicio) as dias_empresa,
-                (SELECT COUNT(*) FROM Aluguel WHERE num_funcionario = %s) as total_alugueis,
-                (SELECT COALESCE(SUM(valor_previsto), 0) FROM Aluguel WHERE num_funcionario = %s) as valor_total_vendas
+                qnt_vendas as total_alugueis,
+                valor_total_vendas
             FROM Funcionario
             WHERE num_funcionario = %s;
         """
-        funcionario = db.execute_select_one(query, (num_funcionario, num_funcionario, num_funcionario))
+        funcionario = db.execute_select_one(query, (num_funcionario,))
         if not funcionario:
             return jsonify({"erro": "Funcionário não encontrado"}), 404
         return jsonify(funcionario), 200
@@ -220,8 +224,7 @@ def atualizar_funcionario(num_funcionario):
                 nome = COALESCE(%s, nome),
                 data_inicio = COALESCE(%s, data_inicio),
                 endereco = COALESCE(%s, endereco),
-                telefone = COALESCE(%s, telefone),
-                qnt_vendas = COALESCE(%s, qnt_vendas)
+                telefone = COALESCE(%s, telefone)
             WHERE num_funcionario = %s;
         """
         success = db.execute_statement(
@@ -232,7 +235,6 @@ def atualizar_funcionario(num_funcionario):
                 data.get("data_inicio"),
                 data.get("endereco"),
                 data.get("telefone"),
-                data.get("qnt_vendas"),
                 num_funcionario,
             ),
         )
@@ -278,9 +280,9 @@ def deletar_funcionario(num_funcionario):
         if not funcionario:
             return jsonify({"erro": "Funcionário não encontrado"}), 404
 
-        # Verificar se funcionário tem aluguéis associados
+        # Verificar se funcionário tem aluguéis associados (inclusive os arquivados)
         alugueis_associados = db.execute_select_one(
-            "SELECT COUNT(*) as total FROM Aluguel WHERE num_funcionario = %s",
+            "SELECT COUNT(*) as total FROM TodosAlugueis WHERE num_funcionario = %s",
             (num_funcionario,)
         )
 
@@ -322,69 +324,86 @@ def deletar_funcionario(num_funcionario):
 # ----------------------
 # 6 — Ranking de Vendas - CORRIGIDO
 # ----------------------
+def calcular_ranking(db):
+    query = """
+        SELECT 
+            num_funcionario, 
+            cpf, 
+            nome, 
+            qnt_vendas,
+            qnt_vendas as total_alugueis,
+            valor_total_vendas,
+            (CURRENT_DATE - data_inicio) as dias_empresa,
+            CASE 
+                WHEN qnt_vendas > 0 THEN ROUND(valor_total_vendas / qnt_vendas, 2)
+                ELSE 0
+            END as ticket_medio
+        FROM Funcionario
+        ORDER BY qnt_vendas DESC, valor_total_vendas DESC;
+    """
+    return {"ranking": db.execute_select_all(query)}
+
+
+servico_estatisticas.registrar("funcionarios_ranking", calcular_ranking)
+
+
 @funcionarios_blueprint.route("/funcionarios/ranking", methods=["GET"])
+@classe_admissao(RELATORIOS)
+@coalescer()
+@somente_leitura
 def ranking_vendas():
-    db = DatabaseManager()
     try:
-        query = """
-            SELECT 
-                num_funcionario, 
-                cpf, 
-                nome, 
-                qnt_vendas,
-                (SELECT COUNT(*) FROM Aluguel WHERE num_funcionario = Funcionario.num_funcionario) as total_alugueis,
-                (SELECT COALESCE(SUM(valor_previsto), 0) FROM Aluguel WHERE num_funcionario = Funcionario.num_funcionario) as valor_total_vendas,
-                (CURRENT_DATE - data_inicio) as dias_empresa,
-                CASE 
-                    WHEN qnt_vendas > 0 THEN 
-                        ROUND((qnt_vendas::decimal / (SELECT COUNT(*) FROM Aluguel WHERE num_funcionario = Funcionario.num_funcionario)) * 100, 2)
-                    ELSE 0
-                END as taxa_conversao
-            FROM Funcionario
-            ORDER BY qnt_vendas DESC, valor_total_vendas DESC;
-        """
-        dados = db.execute_select_all(query)
-        return jsonify({"ranking": dados}), 200
+        return servico_estatisticas.resposta("funcionarios_ranking"), 200
     except Exception as e:
         return internal_error(str(e))
 
 # ----------------------
 # 7 — Estatísticas dos funcionários
 # ----------------------
+def calcular_estatisticas(db):
+    query = """
+        SELECT 
+            COUNT(*) as total_funcionarios,
+            AVG(qnt_vendas) as media_vendas,
+            MAX(qnt_vendas) as max_vendas,
+            MIN(qnt_vendas) as min_vendas,
+            SUM(qnt_vendas) as total_vendas,
+            SUM(valor_total_vendas) as valor_total_vendas,
+            AVG((CURRENT_DATE - data_inicio)) as media_dias_empresa,
+            COUNT(CASE WHEN (CURRENT_DATE - data_inicio) > 365 THEN 1 END) as funcionarios_senior
+        FROM Funcionario;
+    """
+    estatisticas = db.execute_select_one(query)
+
+    # Vendas por mês (últimos 6 meses)
+    query_vendas_mensais = """
+        SELECT 
+            TO_CHAR(data_retirada, 'YYYY-MM') as mes,
+            COUNT(*) as total_alugueis,
+            SUM(valor_previsto) as valor_total
+        FROM {Aluguel} 
+        WHERE data_retirada >= CURRENT_DATE - INTERVAL '6 months'
+        GROUP BY TO_CHAR(data_retirada, 'YYYY-MM')
+        ORDER BY mes DESC;
+    """
+    vendas_mensais = db.execute_select_all(consulta_historico(query_vendas_mensais))
+
+    return {
+        "estatisticas_gerais": estatisticas,
+        "vendas_mensais": vendas_mensais
+    }
+
+
+servico_estatisticas.registrar("funcionarios", calcular_estatisticas)
+
+
 @funcionarios_blueprint.route("/funcionarios/estatisticas", methods=["GET"])
+@classe_admissao(RELATORIOS)
+@coalescer()
+@somente_leitura
 def estatisticas_funcionarios():
-    db = DatabaseManager()
     try:
-        query = """
-            SELECT 
-                COUNT(*) as total_funcionarios,
-                AVG(qnt_vendas) as media_vendas,
-                MAX(qnt_vendas) as max_vendas,
-                MIN(qnt_vendas) as min_vendas,
-                SUM(qnt_vendas) as total_vendas,
-                AVG((CURRENT_DATE - data_inicio)) as media_dias_empresa,
-                COUNT(CASE WHEN (CURRENT_DATE - data_inicio) > 365 THEN 1 END) as funcionarios_senior
-            FROM Funcionario;
-        """
-        estatisticas = db.execute_select_one(query)
-        
-        # Vendas por mês (últimos 6 meses)
-        query_vendas_mensais = """
-            SELECT 
-                TO_CHAR(data_retirada, 'YYYY-MM') as mes,
-                COUNT(*) as total_alugueis,
-                SUM(valor_previsto) as valor_total
-            FROM Aluguel 
-            WHERE data_retirada >= CURRENT_DATE - INTERVAL '6 months'
-            GROUP BY TO_CHAR(data_retirada, 'YYYY-MM')
-            ORDER BY mes DESC;
-        """
-        vendas_mensais = db.execute_select_all(query_vendas_mensais)
-        
-        return jsonify({
-            "estatisticas_gerais": estatisticas,
-            "vendas_mensais": vendas_mensais
-        }), 200
+        return servico_estatisticas.resposta("funcionarios"), 200
     except Exception as e:
         return internal_error(str(e))
 
@@ -406,7 +425,8 @@ def buscar_funcionarios_por_nome(nome):
                 data_inicio, 
                 endereco, 
                 telefone, 
-                qnt_vendas
+                qnt_vendas,
+                valor_total_vendas
             FROM Funcionario
             WHERE nome ILIKE %s
             ORDER BY qnt_vendas DESC, nome;
@@ -417,98 +437,72 @@ def buscar_funcionarios_por_nome(nome):
         return internal_error(str(e))
 
 # ----------------------
-# 9 — Atualizar contador de vendas
+# 9 — Recontar vendas (os contadores são mantidos pelo trigger de Aluguel;
+#     aqui só se recalcula a partir da tabela, para corrigir divergências)
 # ----------------------
+def recontar_vendas(num_funcionario, esperado=None):
+    """Recalcula os contadores; com `esperado`, 400 se qnt_vendas recontado for diferente"""
+    db = DatabaseManager()
+    try:
+        with db.transacao():
+            recontados = db.execute_select_one(
+                "SELECT recontar_vendas_funcionario(%s) AS total;", (num_funcionario,))
+            if not recontados or recontados["total"] == 0:
+                return jsonify({"erro": "Funcionário não encontrado"}), 404
+
+            contadores = db.execute_select_one(
+                "SELECT qnt_vendas, valor_total_vendas FROM Funcionario WHERE num_funcionario = %s",
+                (num_funcionario,)
+            )
+
+        if esperado is not None and esperado != contadores["qnt_vendas"]:
+            return jsonify({
+                "erro": "qnt_vendas é calculado a partir dos aluguéis e não pode ser definido; "
+                        "o valor enviado difere do total recontado",
+                "qnt_vendas_enviado": esperado,
+                "novo_total": contadores["qnt_vendas"]
+            }), 400
+
+        return jsonify({
+            "mensagem": "Vendas recalculadas a partir dos aluguéis",
+            "novo_total": contadores["qnt_vendas"],
+            "valor_total_vendas": contadores["valor_total_vendas"]
+        }), 200
+
+    except Exception as e:
+        return internal_error(str(e))
+
 @funcionarios_blueprint.route("/funcionarios/<int:num_funcionario>/vendas", methods=["PUT"])
 def atualizar_vendas_funcionario(num_funcionario):
-    data = request.json or {}
-    
+    # qnt_vendas é derivado dos aluguéis: sem corpo só reconta; um valor
+    # enviado só é aceito se for igual ao recontado
+    data = request.get_json(silent=True) or {}
     if "qnt_vendas" not in data:
-        return bad_request("Campo 'qnt_vendas' é obrigatório")
-
+        return recontar_vendas(num_funcionario)
     try:
         qnt_vendas = int(data["qnt_vendas"])
-        if qnt_vendas < 0:
-            return bad_request("Quantidade de vendas não pode ser negativa")
     except (ValueError, TypeError):
         return bad_request("Quantidade de vendas deve ser um número inteiro")
-
-    db = DatabaseManager()
-    try:
-        # Verificar se funcionário existe
-        funcionario_existente = db.execute_select_one(
-            "SELECT num_funcionario FROM Funcionario WHERE num_funcionario = %s", 
-            (num_funcionario,)
-        )
-        if not funcionario_existente:
-            return jsonify({"erro": "Funcionário não encontrado"}), 404
-
-        query = "UPDATE Funcionario SET qnt_vendas = %s WHERE num_funcionario = %s;"
-        success = db.execute_statement(query, (qnt_vendas, num_funcionario))
-
-        if not success:
-            return internal_error("Falha ao atualizar vendas")
-
-        # Commit da transação
-        if hasattr(db, "conn") and db.conn:
-            db.conn.commit()
-
-        return jsonify({"mensagem": "Vendas atualizadas com sucesso!"}), 200
-
-    except Exception as e:
-        # Rollback em caso de erro
-        try:
-            if hasattr(db, "conn") and db.conn:
-                db.conn.rollback()
-        except:
-            pass
-        return internal_error(str(e))
+    return recontar_vendas(num_funcionario, esperado=qnt_vendas)
 
 # ----------------------
-# 10 — Incrementar contador de vendas
+# 10 — Incrementar contador de vendas (descontinuado: a venda já é contada
+#      ao criar o aluguel)
 # ----------------------
 @funcionarios_blueprint.route("/funcionarios/<int:num_funcionario>/incrementar-vendas", methods=["POST"])
 def incrementar_vendas_funcionario(num_funcionario):
-    db = DatabaseManager()
-    try:
-        # Verificar se funcionário existe
-        funcionario_existente = db.execute_select_one(
-            "SELECT num_funcionario, qnt_vendas FROM Funcionario WHERE num_funcionario = %s", 
-            (num_funcionario,)
-        )
-        if not funcionario_existente:
-            return jsonify({"erro": "Funcionário não encontrado"}), 404
-
-        query = "UPDATE Funcionario SET qnt_vendas = qnt_vendas + 1 WHERE num_funcionario = %s;"
-        success = db.execute_statement(query, (num_funcionario,))
-
-        if not success:
-            return internal_error("Falha ao incrementar vendas")
-
-        # Commit da transação
-        if hasattr(db, "conn") and db.conn:
-            db.conn.commit()
-
-        novas_vendas = funcionario_existente["qnt_vendas"] + 1
-
-        return jsonify({
-            "mensagem": "Vendas incrementadas com sucesso!",
-            "novo_total": novas_vendas
-        }), 200
-
-    except Exception as e:
-        # Rollback em caso de erro
-        try:
-            if hasattr(db, "conn") and db.conn:
-                db.conn.rollback()
-        except:
-            pass
-        return internal_error(str(e))
+    return jsonify({
+        "erro": "Rota descontinuada: a venda é contada ao criar o aluguel. "
+                f"Para recontar, use PUT /funcionarios/{num_funcionario}/vendas."
+    }), 410
 
 # ----------------------
 # 11 — Histórico de aluguéis por funcionário
 # ----------------------
 @funcionarios_blueprint.route("/funcionarios/<int:num_funcionario>/alugueis", methods=["GET"])
+@classe_admissao(RELATORIOS)
+@coalescer()
+@tempo_limite(10)
 def historico_alugueis_funcionario(num_funcionario):
     db = DatabaseManager()
     try:
@@ -532,29 +526,29 @@ def historico_alugueis_funcionario(num_funcionario):
                 cli.nome as nome_cliente,
                 cli.cpf as cpf_cliente,
                 CASE 
-                    WHEN EXISTS (SELECT 1 FROM Devolucao d WHERE d.num_locacao = a.num_locacao) 
+                    WHEN EXISTS (SELECT 1 FROM {Devolucao} d WHERE d.num_locacao = a.num_locacao AND d.data_retirada = a.data_retirada) 
                     THEN 'FINALIZADO' 
                     ELSE 'EM ANDAMENTO' 
                 END as status
-            FROM Aluguel a
+            FROM {Aluguel} a
             JOIN Carro c ON c.placa = a.placa
             JOIN Cliente cli ON cli.cpf = a.cpf_cliente
             WHERE a.num_funcionario = %s
             ORDER BY a.data_retirada DESC;
         """
-        alugueis = db.execute_select_all(query, (num_funcionario,))
+        alugueis = db.execute_select_tabela(consulta_historico(query), (num_funcionario,))
         
         # Estatísticas do funcionário
-        estatisticas = db.execute_select_one("""
+        estatisticas = db.execute_select_one(consulta_historico("""
             SELECT 
                 COUNT(*) as total_alugueis,
                 SUM(valor_previsto) as valor_total,
                 AVG(valor_previsto) as valor_medio,
                 MIN(data_retirada) as primeiro_aluguel,
                 MAX(data_retirada) as ultimo_aluguel
-            FROM Aluguel 
+            FROM {Aluguel} 
             WHERE num_funcionario = %s
-        """, (num_funcionario,))
+        """), (num_funcionario,))
 
         return jsonify({
             "funcionario": funcionario["nome"],
@@ -569,25 +563,33 @@ def historico_alugueis_funcionario(num_funcionario):
 # ----------------------
 # 12 — Funcionários do mês (top performers)
 # ----------------------
+def calcular_top_mes(db):
+    query = """
+        SELECT 
+            f.num_funcionario,
+            f.nome,
+            COUNT(a.num_locacao) as alugueis_mes,
+            SUM(a.valor_previsto) as valor_mes
+        FROM Funcionario f
+        JOIN Aluguel a ON a.num_funcionario = f.num_funcionario
+        WHERE a.data_retirada >= date_trunc('month', CURRENT_DATE)
+        AND a.data_retirada < date_trunc('month', CURRENT_DATE) + INTERVAL '1 month'
+        GROUP BY f.num_funcionario, f.nome
+        ORDER BY valor_mes DESC
+        LIMIT 5;
+    """
+    return {"top_funcionarios_mes": db.execute_select_all(query)}
+
+
+servico_estatisticas.registrar("funcionarios_top_mes", calcular_top_mes)
+
+
 @funcionarios_blueprint.route("/funcionarios/top-mes", methods=["GET"])
+@classe_admissao(RELATORIOS)
+@coalescer()
+@somente_leitura
 def top_funcionarios_mes():
-    db = DatabaseManager()
     try:
-        query = """
-            SELECT 
-                f.num_funcionario,
-                f.nome,
-                COUNT(a.num_locacao) as alugueis_mes,
-                SUM(a.valor_previsto) as valor_mes
-            FROM Funcionario f
-            JOIN Aluguel a ON a.num_funcionario = f.num_funcionario
-            WHERE EXTRACT(MONTH FROM a.data_retirada) = EXTRACT(MONTH FROM CURRENT_DATE)
-            AND EXTRACT(YEAR FROM a.data_retirada) = EXTRACT(YEAR FROM CURRENT_DATE)
-            GROUP BY f.num_funcionario, f.nome
-            ORDER BY valor_mes DESC
-            LIMIT 5;
-        """
-        top_funcionarios = db.execute_select_all(query)
-        return jsonify({"top_funcionarios_mes": top_funcionarios}), 200
+        return servico_estatisticas.resposta("funcionarios_top_mes"), 200
     except Exception as e:
         return internal_error(str(e))
\ No newline at end of file
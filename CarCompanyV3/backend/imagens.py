@@ -0,0 +1,216 @@
+"""
+Variantes redimensionadas das imagens dos carros.
+
+As imagens originais ficam em frontend/images. Para cada uma são geradas
+variantes de tamanho (miniatura, card, detalhe) em AVIF (se o Pillow tiver
+suporte), WebP e JPEG. Elas ficam num cache em disco endereçado pelo hash
+do arquivo original (cache/<hash>/<variante>.<ext>): se a imagem mudar, o
+hash e a URL mudam, então as variantes podem ser servidas como imutáveis.
+
+Uso (na pasta backend), para pré-gerar as variantes da frota:
+    python imagens.py            # imagens cadastradas na tabela Carro
+    python imagens.py --todas    # todas as imagens da pasta
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, features
+
+PASTA_BACKEND = os.path.dirname(os.path.abspath(__file__))
+PASTA_ORIGEM = os.environ.get(
+    "IMAGENS_ORIGEM", os.path.join(PASTA_BACKEND, "..", "frontend", "images"))
+PASTA_CACHE = os.environ.get(
+    "IMAGENS_CACHE", os.path.join(PASTA_BACKEND, "cache_imagens"))
+
+# variante -> maior dimensão em pixels (nunca amplia a original)
+VARIANTES = {
+    "miniatura": 160,
+    "card": 480,
+    "detalhe": 1200,
+}
+
+# formato -> (extensão, mimetype, opções do Pillow), em ordem de preferência
+FORMATOS = {
+    "avif": ("avif", "image/avif", {"quality": 55}),
+    "webp": ("webp", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+if not features.check("avif"):
+    del FORMATOS["avif"]
+
+EXTENSOES = {ext: formato for formato, (ext, _, _) in FORMATOS.items()}
+
+# muda quando os parâmetros de geração mudam, invalidando o cache antigo
+VERSAO_VARIANTES = "1"
+
+EXTENSOES_ORIGEM = (".png", ".jpg", ".jpeg", ".webp")
+
+# hash das URLs: prefixo do sha256 em hexadecimal (vira nome de pasta no cache)
+TAMANHO_HASH = 20
+PADRAO_HASH = re.compile(f"[0-9a-f]{{{TAMANHO_HASH}}}")
+
+
+class CacheImagens:
+    """Hash das imagens originais e geração preguiçosa das variantes"""
+
+    def __init__(self, origem=PASTA_ORIGEM, cache=PASTA_CACHE):
+        self.origem = os.path.abspath(origem)
+        self.cache = os.path.abspath(cache)
+        self._lock = threading.Lock()
+        self._hashes = {}    # nome -> (mtime_ns, tamanho, hash)
+        self._origens = {}   # hash -> nome
+        self._gerando = {}   # caminho da variante -> Lock
+
+    # --------------------------------------------------------
+    # Imagens originais
+    # --------------------------------------------------------
+
+    def hash_origem(self, nome):
+        """Hash do conteúdo da imagem original (None se não existir)"""
+        if not nome or os.path.basename(nome) != nome:
+            return None
+        caminho = os.path.join(self.origem, nome)
+        try:
+            st = os.stat(caminho)
+        except OSError:
+            return None
+
+        conhecido = self._hashes.get(nome)
+        if conhecido and conhecido[:2] == (st.st_mtime_ns, st.st_size):
+            return conhecido[2]
+
+        h = hashlib.sha256(VERSAO_VARIANTES.encode())
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloco)
+        digest = h.hexdigest()[:TAMANHO_HASH]
+
+        with self._lock:
+            self._hashes[nome] = (st.st_mtime_ns, st.st_size, digest)
+            self._origens[digest] = nome
+        return digest
+
+    def origem_do_hash(self, digest):
+        nome = self._origens.get(digest)
+        if nome is None:
+            # hash de uma imagem ainda não vista neste processo: varre a pasta
+            for nome_arquivo in os.listdir(self.origem):
+                if nome_arquivo.lower().endswith(EXTENSOES_ORIGEM):
+                    self.hash_origem(nome_arquivo)
+            nome = self._origens.get(digest)
+        # confere se a imagem não mudou desde que o hash foi calculado
+        if nome is not None and self.hash_origem(nome) == digest:
+            return nome
+        return None
+
+    # --------------------------------------------------------
+    # Variantes
+    # --------------------------------------------------------
+
+    def caminho_variante(self, digest, variante, formato):
+        return os.path.join(self.cache, digest, f"{variante}.{FORMATOS[formato][0]}")
+
+    def variante(self, digest, variante, formato):
+        """
+        Caminho da variante no cache, gerando-a se ainda não existir.
+        Retorna None se o hash, a variante ou o formato forem desconhecidos.
+        """
+        # o hash vem da URL e entra no caminho: nada de "..", "/" etc.
+        if not PADRAO_HASH.fullmatch(digest) or variante not in VARIANTES or formato not in FORMATOS:
+            return None
+        caminho = self.caminho_variante(digest, variante, formato)
+        if os.path.exists(caminho):
+            return caminho
+
+        nome = self.origem_do_hash(digest)
+        if nome is None:
+            return None
+
+        with self._lock:
+            lock = self._gerando.setdefault(caminho, threading.Lock())
+        with lock:
+            # outra thread pode ter gerado enquanto esperava o lock
+            if not os.path.exists(caminho):
+                self._gerar(os.path.join(self.origem, nome), caminho, variante, formato)
+        with self._lock:
+            self._gerando.pop(caminho, None)
+        return caminho
+
+    def _gerar(self, origem, destino, variante, formato):
+        _, _, opcoes = FORMATOS[formato]
+        tamanho = VARIANTES[variante]
+        with Image.open(origem) as img:
+            img.thumbnail((tamanho, tamanho), Image.LANCZOS)
+            if formato == "jpeg":
+                img = self._sem_transparencia(img)
+            elif img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA")
+
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(temporario, format=formato.upper(), **opcoes)
+        # troca atômica: quem lê nunca vê um arquivo pela metade
+        os.replace(temporario, destino)
+
+    @staticmethod
+    def _sem_transparencia(img):
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            fundo = Image.new("RGB", img.size, (255, 255, 255))
+            fundo.paste(img, mask=img.getchannel("A"))
+            return fundo
+        return img.convert("RGB")
+
+    def gerar_todas(self, nome):
+        """Gera todas as variantes de uma imagem (usado na pré-geração)"""
+        digest = self.hash_origem(nome)
+        if digest is None:
+            return None
+        for variante in VARIANTES:
+            for formato in FORMATOS:
+                self.variante(digest, variante, formato)
+        return digest
+
+
+cache_imagens = CacheImagens()
+
+
+def urls_variantes(nome, montar_url):
+    """
+    Monta {variante: {formato: url}} para a imagem original `nome`.
+    montar_url(hash, variante, extensao) devolve a URL de uma variante.
+    """
+    digest = cache_imagens.hash_origem(nome)
+    if digest is None:
+        return None
+    return {
+        variante: {formato: montar_url(digest, variante, ext)
+                   for formato, (ext, _, _) in FORMATOS.items()}
+        for variante in VARIANTES
+    }
+
+
+def imagens_da_frota():
+    from database.conector import DatabaseManager
+
+    db = DatabaseManager()
+    rows = db.execute_select(
+        "SELECT DISTINCT imagem_url FROM Carro WHERE imagem_url IS NOT NULL;")
+    return [r[0] for r in rows]
+
+
+if __name__ == "__main__":
+    if "--todas" in sys.argv:
+        nomes = [n for n in os.listdir(cache_imagens.origem)
+                 if n.lower().endswith(EXTENSOES_ORIGEM)]
+    else:
+        nomes = imagens_da_frota()
+
+    # o Pillow libera o GIL na codificação, então threads aproveitam os núcleos
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for nome, digest in zip(nomes, executor.map(cache_imagens.gerar_todas, nomes)):
+            print(f"{nome:<40} {digest or 'não encontrada'}")
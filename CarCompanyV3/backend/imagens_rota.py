@@ -0,0 +1,55 @@
+from flask import Blueprint, jsonify, send_file, url_for
+from imagens import cache_imagens, urls_variantes, EXTENSOES, FORMATOS
+
+imagens_blueprint = Blueprint("imagens", __name__)
+
+# um ano: as URLs mudam junto com o conteúdo (hash da original)
+MAX_AGE_VARIANTES = 365 * 24 * 3600
+
+# ============================================================
+# Helpers
+# ============================================================
+
+
+def internal_error(msg="Erro interno no servidor"):
+    print(f"DEBUG: {msg}")
+    return jsonify({"erro": msg}), 500
+
+
+def url_variante(digest, variante, extensao):
+    return url_for("imagens.servir_variante", digest=digest,
+                   variante=variante, extensao=extensao, _external=True)
+
+
+def variantes_imagem(nome):
+    """URLs das variantes da imagem de um carro (usado pelas rotas de carros)"""
+    return urls_variantes(nome, url_variante)
+
+# ============================================================
+# 1. Variante de imagem (gerada no primeiro acesso)
+# ============================================================
+
+
+@imagens_blueprint.route("/imagens/<digest>/<variante>.<extensao>", methods=["GET"])
+def servir_variante(digest, variante, extensao):
+    formato = EXTENSOES.get(extensao)
+    if formato is None:
+        return jsonify({"erro": "Formato de imagem não suportado"}), 404
+
+    try:
+        caminho = cache_imagens.variante(digest, variante, formato)
+    except Exception as e:
+        return internal_error(str(e))
+
+    if caminho is None:
+        return jsonify({"erro": "Imagem não encontrada"}), 404
+
+    resp = send_file(
+        caminho,
+        mimetype=FORMATOS[formato][1],
+        etag=f"{digest}-{variante}-{formato}",
+        max_age=MAX_AGE_VARIANTES,
+        conditional=True,
+    )
+    resp.cache_control.immutable = True
+    return resp
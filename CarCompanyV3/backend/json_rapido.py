@@ -0,0 +1,164 @@
+"""
+Provedor JSON da aplicação.
+
+Usa o orjson quando está instalado (e o json da biblioteca padrão como
+reserva) e trata Decimal, date e datetime direto no encoder.
+
+LinhasTabela (colunas + tuplas) no formato colunar sai sem nenhum dict
+por linha. No formato de objetos, sem orjson, o texto é montado direto
+das tuplas; com orjson os dicts por linha são montados mesmo assim, porque
+o orjson serializando dicts é mais rápido que qualquer concatenação em
+Python (ver benchmarks/bench_json.py).
+
+Formato na resposta, diferente do provedor padrão do Flask: Decimal sai
+como número (e não string) e date/datetime em ISO 8601 ("2024-01-31",
+"2024-01-31T10:00:00") em vez de data HTTP ("Wed, 31 Jan 2024 ...").
+O frontend converte valores com Number()/parseFloat e datas com new Date(),
+que aceitam os dois formatos.
+
+NaN e infinito (float ou Decimal) saem como null nos dois caminhos, como
+o orjson já faz: NaN/Infinity não são JSON válido.
+"""
+import json
+import math
+from datetime import date, datetime, time
+from decimal import Decimal
+from json.encoder import encode_basestring
+
+from flask.json.provider import DefaultJSONProvider
+
+from database.conector import LinhasTabela
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional
+    orjson = None
+
+
+def _padrao(o):
+    """Tipos que o encoder não conhece nativamente"""
+    if isinstance(o, Decimal):
+        return float(o) if o.is_finite() else None
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, LinhasTabela):
+        return o.como_dicts()
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Objeto do tipo {type(o).__name__} não é serializável em JSON")
+
+
+def _sem_nao_finitos(obj):
+    """Cópia de obj com NaN/infinito trocados por None (dicts, listas, tuplas e sets)"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _sem_nao_finitos(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return [_sem_nao_finitos(v) for v in obj]
+    return obj
+
+
+def _dumps_json(obj, **kwargs):
+    """json.dumps sem NaN/Infinity: só refaz a cópia quando eles aparecem"""
+    try:
+        return json.dumps(obj, default=_padrao, ensure_ascii=False, allow_nan=False, **kwargs)
+    except ValueError:
+        return json.dumps(_sem_nao_finitos(obj), default=_padrao, ensure_ascii=False,
+                          allow_nan=False, **kwargs)
+
+
+def _dumps_base(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_padrao, option=orjson.OPT_NON_STR_KEYS).decode()
+    return _dumps_json(obj, separators=(",", ":"))
+
+
+def _decimal(v):
+    return str(v) if v.is_finite() else "null"
+
+
+def _float(v):
+    return repr(v) if v == v and v not in (float("inf"), float("-inf")) else "null"
+
+
+def _data(v):
+    return '"' + v.isoformat() + '"'
+
+
+# codificação por tipo exato (bool antes de int não importa: a busca é por type())
+_CODIFICADORES = {
+    str: encode_basestring,
+    int: int.__repr__,
+    bool: lambda v: "true" if v else "false",
+    type(None): lambda v: "null",
+    float: _float,
+    Decimal: _decimal,
+    datetime: _data,
+    date: _data,
+    time: _data,
+}
+
+
+def codificar_valor(v):
+    codificador = _CODIFICADORES.get(type(v))
+    if codificador is not None:
+        return codificador(v)
+    return _dumps_base(v)
+
+
+def codificar_tabela(tabela):
+    """Serializa LinhasTabela (lista de objetos ou, se colunar, colunas + linhas)"""
+    if tabela.colunar:
+        return _dumps_base({"colunas": tabela.colunas, "linhas": tabela.linhas})
+    if orjson is not None:
+        # no orjson montar os dicts ainda sai mais barato que concatenar em Python
+        colunas = tabela.colunas
+        return _dumps_base([dict(zip(colunas, linha)) for linha in tabela.linhas])
+    return codificar_objetos(tabela)
+
+
+def codificar_objetos(tabela):
+    """Lista de objetos JSON montada direto das tuplas, sem dict por linha"""
+    chaves = [encode_basestring(c) + ":" for c in tabela.colunas]
+    obter = _CODIFICADORES.get
+    partes = []
+    for linha in tabela.linhas:
+        campos = []
+        for chave, v in zip(chaves, linha):
+            codificador = obter(type(v))
+            campos.append(chave + (codificador(v) if codificador else _dumps_base(v)))
+        partes.append("{" + ",".join(campos) + "}")
+    return "[" + ",".join(partes) + "]"
+
+
+def serializar(obj):
+    """
+    Serializa obj; LinhasTabela é tratada no topo ou como valor de um dict
+    do topo (o formato usado pelas rotas: {"clientes": tabela, ...}).
+    """
+    if isinstance(obj, LinhasTabela):
+        return codificar_tabela(obj)
+    if isinstance(obj, dict) and any(isinstance(v, LinhasTabela) for v in obj.values()):
+        return "{" + ",".join(
+            encode_basestring(str(k)) + ":" + serializar(v) for k, v in obj.items()
+        ) + "}"
+    return _dumps_base(obj)
+
+
+class ProvedorJSONRapido(DefaultJSONProvider):
+    """Provedor JSON do Flask baseado em orjson/LinhasTabela"""
+
+    # mantém a ordem das colunas das consultas e evita o modo indentado do debug
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get("indent"):
+            return _dumps_json(obj, **kwargs)
+        return serializar(obj)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
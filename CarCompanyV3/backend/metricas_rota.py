@@ -0,0 +1,36 @@
+from flask import Blueprint, jsonify
+from database.conector import metricas_banco
+from relatorio_jobs import fila_relatorios
+from estatisticas import servico_estatisticas
+from coalescer import coalescedor
+from admissao import controle_admissao
+
+metricas_blueprint = Blueprint("metricas", __name__)
+
+# ============================================================
+# Helpers
+# ============================================================
+
+
+def internal_error(msg="Erro interno no servidor"):
+    print(f"DEBUG: {msg}")
+    return jsonify({"erro": msg}), 500
+
+# ============================================================
+# 1. Métricas dos pools de conexões, do roteamento de leituras, da
+#    fila de relatórios, das estatísticas pré-calculadas, da
+#    coalescência de requisições e do controle de admissão
+# ============================================================
+
+
+@metricas_blueprint.route("/metricas", methods=["GET"])
+def metricas():
+    try:
+        metricas = metricas_banco()
+        metricas["relatorios"] = fila_relatorios.metricas()
+        metricas["estatisticas"] = servico_estatisticas.metricas()
+        metricas["coalescencia"] = coalescedor.metricas()
+        metricas["admissao"] = controle_admissao.metricas()
+        return jsonify(metricas), 200
+    except Exception as e:
+        return internal_error(str(e))
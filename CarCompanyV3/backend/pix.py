@@ -0,0 +1,142 @@
+"""
+PIX: payload BR Code (EMV) e QR Code gerado no próprio servidor.
+
+O payload segue o padrão EMV-MPM do Banco Central (campos ID + tamanho +
+valor, terminando com o CRC16-CCITT). O QR é codificado com o segno e
+desenhado como PNG (Pillow) ou SVG; as imagens ficam num cache LRU
+limitado em bytes (cache_lru), indexado pelo hash do payload.
+"""
+import hashlib
+import io
+import os
+import unicodedata
+
+import segno
+from PIL import Image
+
+from cache_lru import CacheLRUBytes
+
+# dados do recebedor (configuráveis por variável de ambiente)
+PIX_CHAVE = os.environ.get("PIX_CHAVE", "financeiro@carcompany.com.br")
+PIX_NOME = os.environ.get("PIX_NOME", "CARCOMPANY LOCADORA")
+PIX_CIDADE = os.environ.get("PIX_CIDADE", "SAO PAULO")
+
+ESCALA_QR = 5
+BORDA_QR = 4
+# máscara fixa: escolher a "melhor" das 8 custa ~4x o tempo de codificação
+# e qualquer máscara é válida para os leitores
+MASCARA_QR = 0
+LIMITE_CACHE_BYTES = 8 * 1024 * 1024
+
+# ============================================================
+# Payload BR Code
+# ============================================================
+
+
+def _crc16_tabela():
+    tabela = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        tabela.append(crc & 0xFFFF)
+    return tabela
+
+
+_CRC16 = _crc16_tabela()
+
+
+def crc16(dados):
+    """CRC16-CCITT (polinômio 0x1021, valor inicial 0xFFFF)"""
+    crc = 0xFFFF
+    for b in dados:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16[(crc >> 8) ^ b]
+    return crc
+
+
+def _campo(id_campo, valor):
+    return f"{id_campo}{len(valor):02d}{valor}"
+
+
+def _texto(valor, limite):
+    """Remove acentos e caracteres fora do ASCII, como exigem os leitores"""
+    ascii_ = unicodedata.normalize("NFKD", valor).encode("ascii", "ignore").decode()
+    return ascii_.upper()[:limite]
+
+
+def _txid(txid):
+    txid = "".join(c for c in str(txid) if c.isalnum())[:25]
+    return txid or "***"
+
+
+def payload_pix(valor, txid, chave=PIX_CHAVE, nome=PIX_NOME, cidade=PIX_CIDADE):
+    """Payload "copia e cola" de uma cobrança PIX estática com valor e txid"""
+    conta = _campo("00", "br.gov.bcb.pix") + _campo("01", chave)
+    payload = (
+        _campo("00", "01")
+        + _campo("26", conta)
+        + _campo("52", "0000")
+        + _campo("53", "986")
+        + _campo("54", f"{valor:.2f}")
+        + _campo("58", "BR")
+        + _campo("59", _texto(nome, 25))
+        + _campo("60", _texto(cidade, 15))
+        + _campo("62", _campo("05", _txid(txid)))
+        + "6304"
+    )
+    return payload + f"{crc16(payload.encode()):04X}"
+
+# ============================================================
+# Renderização
+# ============================================================
+
+
+_BRANCO_PRETO = bytes.maketrans(b"\x00\x01", b"\xff\x00")
+
+
+def renderizar_png(qr, escala=ESCALA_QR, borda=BORDA_QR):
+    # desenha a matriz em 1 pixel por módulo e amplia no Pillow (em C)
+    matriz = qr.matrix
+    n = len(matriz)
+    modulos = Image.frombytes(
+        "L", (n, n), b"".join(bytes(linha) for linha in matriz).translate(_BRANCO_PRETO))
+    lado = (n + 2 * borda) * escala
+    img = Image.new("1", (lado, lado), 1)
+    img.paste(modulos.convert("1").resize((n * escala, n * escala), Image.NEAREST),
+              (borda * escala, borda * escala))
+    saida = io.BytesIO()
+    img.save(saida, "PNG")
+    return saida.getvalue()
+
+
+def renderizar_svg(qr, escala=ESCALA_QR, borda=BORDA_QR):
+    saida = io.BytesIO()
+    qr.save(saida, kind="svg", scale=escala, border=borda, xmldecl=False)
+    return saida.getvalue()
+
+
+RENDERIZADORES = {
+    "png": renderizar_png,
+    "svg": renderizar_svg,
+}
+
+
+cache_qrcodes = CacheLRUBytes(LIMITE_CACHE_BYTES)
+
+
+def qrcode_pix(payload, formato="png"):
+    """
+    Retorna (imagem, etag) do QR Code do payload, usando o cache LRU.
+    Levanta ValueError para formato desconhecido.
+    """
+    renderizar = RENDERIZADORES.get(formato)
+    if renderizar is None:
+        raise ValueError(f"Formato de QR Code inválido: {formato}")
+
+    etag = hashlib.sha256(f"{formato}:{payload}".encode()).hexdigest()[:32]
+    imagem = cache_qrcodes.obter(etag)
+    if imagem is None:
+        qr = segno.make(payload, error="m", micro=False, mask=MASCARA_QR)
+        imagem = renderizar(qr)
+        cache_qrcodes.guardar(etag, imagem)
+    return imagem, etag
@@ -0,0 +1,237 @@
+"""
+Fila de relatórios assíncronos com os arquivos gerados em cache no disco.
+
+POST /relatorios/jobs enfileira o relatório e responde na hora com o id do
+job; um pool de processos (spawn) executa a consulta e grava o arquivo em
+PASTA_RELATORIOS. O id é determinístico: hash de (tipo, período, formato)
+mais a versão dos dados, que é o último id_evento da outbox entre os tipos
+de evento que alteram aquele relatório. Pedidos iguais caem no mesmo job
+(ou no arquivo já gerado) até chegar um evento novo; aí o id muda, o
+relatório é refeito e o arquivo da versão anterior é apagado.
+
+Como o id vem só dos parâmetros e da versão, qualquer processo do servidor
+encontra o arquivo pronto, mesmo que não tenha sido ele quem o gerou. O
+andamento também fica no disco: ao enfileirar, o processo cria (de forma
+exclusiva) a marca <id>.pendente, que o worker troca para "executando" e
+apaga no fim; uma falha vira <id>.erro com a mensagem. Assim os outros
+processos enxergam o job e não enfileiram o mesmo relatório de novo. Uma
+marca mais velha que PRAZO_PENDENTE (processo que morreu no meio) é
+ignorada e o job pode ser refeito.
+
+Cada comando SQL do job tem no máximo TEMPO_LIMITE segundos
+(RELATORIOS_TEMPO_LIMITE, padrão 600), como o tempo limite das rotas.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from database import conector
+
+PASTA_BACKEND = os.path.dirname(os.path.abspath(__file__))
+PASTA_RELATORIOS = os.environ.get(
+    "RELATORIOS_CACHE", os.path.join(PASTA_BACKEND, "cache_relatorios"))
+WORKERS = int(os.environ.get("RELATORIOS_WORKERS", 2))
+TEMPO_LIMITE = float(os.environ.get("RELATORIOS_TEMPO_LIMITE", 600))
+PRAZO_PENDENTE = float(os.environ.get("RELATORIOS_PRAZO_PENDENTE", 3600))
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+
+
+def versao_dados(db, tipos_evento):
+    """Último id_evento da outbox entre os tipos que alteram o relatório"""
+    row = db.execute_select_one(
+        "SELECT COALESCE(MAX(id_evento), 0) AS versao FROM EventoOutbox WHERE tipo = ANY(%s);",
+        (list(tipos_evento),))
+    return row["versao"] if row else 0
+
+
+def _iniciar_worker(config_banco):
+    # o processo novo (spawn) não herda ajustes feitos em DB_CONFIG em tempo de execução
+    conector.DB_CONFIG.update(config_banco)
+
+
+def _gravar(caminho, conteudo):
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def _executar(gerar, args, destino, marca, arquivo_erro):
+    """Roda no worker: gera o relatório e grava de forma atômica"""
+    _gravar(marca, EXECUTANDO.encode())
+    try:
+        conteudo = gerar(*args)
+        _gravar(destino, conteudo)
+    except Exception as e:
+        _gravar(arquivo_erro, str(e).encode("utf-8"))
+        raise
+    finally:
+        _remover(marca)
+    return len(conteudo)
+
+
+class FilaRelatorios:
+    """Pool de processos + registro dos jobs em andamento neste processo"""
+
+    def __init__(self, pasta=PASTA_RELATORIOS, workers=WORKERS, prazo_pendente=PRAZO_PENDENTE):
+        self.pasta = os.path.abspath(pasta)
+        self.workers = workers
+        self.prazo_pendente = prazo_pendente
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = {}   # id -> (Future, extensao)
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None:
+                os.makedirs(self.pasta, exist_ok=True)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_iniciar_worker,
+                    initargs=(dict(conector.DB_CONFIG),),
+                )
+            return self._executor
+
+    @staticmethod
+    def _prefixo(tipo, parametros):
+        chave = "|".join(str(p) for p in (tipo, *parametros))
+        return f"{tipo}-{hashlib.sha256(chave.encode()).hexdigest()[:16]}-"
+
+    def caminho(self, id_job, extensao):
+        return os.path.join(self.pasta, f"{id_job}.{extensao}")
+
+    def _ler_marca(self, id_job):
+        """PENDENTE/EXECUTANDO se outro job (de qualquer processo) está com a marca; senão None"""
+        marca = self.caminho(id_job, "pendente")
+        try:
+            idade = time.time() - os.path.getmtime(marca)
+            with open(marca, encoding="utf-8") as f:
+                estado = f.read().strip()
+        except OSError:
+            return None
+        if idade > self.prazo_pendente:
+            return None
+        return EXECUTANDO if estado == EXECUTANDO else PENDENTE
+
+    def _criar_marca(self, id_job):
+        """Cria a marca do job; False se outro processo já está com ele"""
+        os.makedirs(self.pasta, exist_ok=True)
+        marca = self.caminho(id_job, "pendente")
+        for _ in range(2):
+            try:
+                fd = os.open(marca, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._ler_marca(id_job) is not None:
+                    return False
+                # marca abandonada (processo morreu no meio): assume o job
+                _remover(marca)
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(PENDENTE)
+            return True
+        return False
+
+    def enfileirar(self, tipo, parametros, versao, extensao, gerar, args):
+        """
+        Enfileira gerar(*args) (função de módulo, para ser importável pelo
+        worker) e retorna o id do job. Se o mesmo job já existe ou já tem
+        arquivo, só retorna o id.
+        """
+        prefixo = self._prefixo(tipo, parametros)
+        id_job = f"{prefixo}{versao}"
+        destino = self.caminho(id_job, extensao)
+        with self._lock:
+            andamento = self._jobs.get(id_job)
+            if andamento is not None and not andamento[0].done():
+                return id_job
+        if os.path.exists(destino) or not self._criar_marca(id_job):
+            return id_job
+
+        marca = self.caminho(id_job, "pendente")
+        arquivo_erro = self.caminho(id_job, "erro")
+        # o pedido novo refaz um job que falhou
+        _remover(arquivo_erro)
+        tarefa = (_executar, gerar, args, destino, marca, arquivo_erro)
+        try:
+            try:
+                futuro = self._obter_executor().submit(*tarefa)
+            except BrokenProcessPool:
+                # um worker morreu (ex.: falta de memória): recria o pool uma vez
+                with self._lock:
+                    self._executor = None
+                futuro = self._obter_executor().submit(*tarefa)
+        except Exception:
+            _remover(marca)
+            raise
+        with self._lock:
+            self._jobs[id_job] = (futuro, extensao)
+        futuro.add_done_callback(lambda f: self._finalizar(id_job, prefixo, f))
+        return id_job
+
+    def _finalizar(self, id_job, prefixo, futuro):
+        if futuro.cancelled() or futuro.exception() is not None:
+            return
+        with self._lock:
+            for outro in [j for j in self._jobs if j.startswith(prefixo) and j != id_job]:
+                if self._jobs[outro][0].done():
+                    del self._jobs[outro]
+        # versões anteriores do mesmo relatório ficaram obsoletas
+        for nome in os.listdir(self.pasta):
+            # marcas de outras versões são do job que está com elas (ou vencem sozinhas)
+            if (nome.startswith(prefixo) and not nome.startswith(f"{id_job}.")
+                    and not nome.endswith((".tmp", ".pendente"))):
+                try:
+                    os.remove(os.path.join(self.pasta, nome))
+                except OSError:
+                    pass
+
+    def status(self, id_job, extensoes):
+        """(status, detalhe) do job; detalhe é o caminho do arquivo ou a mensagem de erro"""
+        with self._lock:
+            andamento = self._jobs.get(id_job)
+        if andamento is not None and not andamento[0].done():
+            return (EXECUTANDO if andamento[0].running() else PENDENTE), None
+
+        # terminado ou de outro processo: estado pelos arquivos, que valem para
+        # todos (um job que falhou aqui pode ter sido refeito por outro processo)
+        for extensao in extensoes:
+            destino = self.caminho(id_job, extensao)
+            if os.path.exists(destino):
+                return CONCLUIDO, destino
+        estado = self._ler_marca(id_job)
+        if estado is not None:
+            return estado, None
+        try:
+            with open(self.caminho(id_job, "erro"), encoding="utf-8") as f:
+                return ERRO, f.read()
+        except OSError:
+            return None, None
+
+    def metricas(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "workers": self.workers,
+            "em_andamento": sum(1 for f, _ in jobs if not f.done()),
+            "concluidos": sum(1 for f, _ in jobs if f.done() and not f.cancelled() and f.exception() is None),
+            "com_erro": sum(1 for f, _ in jobs if f.done() and not f.cancelled() and f.exception() is not None),
+        }
+
+
+fila_relatorios = FilaRelatorios()
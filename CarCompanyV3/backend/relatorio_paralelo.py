@@ -0,0 +1,162 @@
+"""
+Geração paralela de relatórios por faixas de datas.
+
+O período [data_min, data_max] é dividido em sub-períodos contíguos; cada
+um vira uma tarefa num pool de processos (spawn), que consulta o banco
+numa conexão própria do worker (aberta uma vez e reaproveitada) e já
+devolve o pedaço codificado: CSV sem cabeçalho ou Arrow IPC. O processo
+da requisição só concatena os pedaços na ordem dos períodos, então o
+resultado é idêntico ao da consulta sequencial ordenada por data.
+
+Em processos (e não threads) porque a codificação do CSV em Python é
+presa ao GIL; a consulta de cada faixa também roda em paralelo no banco.
+"""
+import csv
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from database import conector
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow é opcional: sem ele só o CSV fica disponível
+    pa = None
+
+WORKERS = int(os.environ.get("RELATORIO_PARALELO_WORKERS", os.cpu_count() or 1))
+# faixas por worker: faixas menores equilibram melhor meses com volumes diferentes
+FAIXAS_POR_WORKER = 4
+# abaixo disso a consulta sequencial é mais barata que distribuir
+DIAS_MINIMOS = 62
+
+# ============================================================
+# Divisão do período e codificação (rodam também nos workers)
+# ============================================================
+
+
+def dividir_periodo(inicio, fim, partes):
+    """Divide [inicio, fim] (datas, inclusive) em até `partes` faixas contíguas de dias"""
+    dias = (fim - inicio).days + 1
+    partes = max(1, min(partes, dias))
+    faixas = []
+    for i in range(partes):
+        de = inicio + timedelta(days=dias * i // partes)
+        ate = inicio + timedelta(days=dias * (i + 1) // partes - 1)
+        faixas.append((de, ate))
+    return faixas
+
+
+def codificar_csv(linhas, cabecalho=None):
+    """CSV de tuplas (datas em ISO, None como vazio), com cabeçalho opcional"""
+    saida = io.StringIO()
+    writer = csv.writer(saida)
+    if cabecalho:
+        writer.writerow(cabecalho)
+    for linha in linhas:
+        writer.writerow([
+            "" if v is None else (v.isoformat() if hasattr(v, "isoformat") else str(v))
+            for v in linha
+        ])
+    return saida.getvalue()
+
+
+_conexoes_worker = {}
+
+
+def iniciar_worker(config_banco, config_replica):
+    # o processo novo (spawn) não herda ajustes feitos nas configs em tempo de execução
+    conector.DB_CONFIG.update(config_banco)
+    conector.DB_REPLICA_CONFIG = config_replica
+
+
+def banco_worker(papel, tempo_limite=None):
+    """
+    Conexão do worker para o papel. Fora do Flask não há tempo limite da
+    rota: quem enfileira a tarefa passa o dela em `tempo_limite` (segundos).
+    """
+    db = _conexoes_worker.get(papel)
+    if db is None or db.conn is None or db.conn.closed:
+        db = _conexoes_worker[papel] = conector.DatabaseManager(papel)
+    db.tempo_limite = tempo_limite
+    return db
+
+
+def _executar_faixa(papel, sql, params, formato, schema, tempo_limite):
+    """Roda no worker: consulta uma faixa e devolve o pedaço codificado"""
+    db = banco_worker(papel, tempo_limite)
+    try:
+        tabela = db.execute_select(sql, params, modo="tabela")
+    finally:
+        db.conn.rollback()
+    if formato == "csv":
+        return codificar_csv(tabela.linhas).encode("utf-8")
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        # faixa vazia: só o schema, sem lote
+        if tabela.linhas:
+            colunas = dict(zip(tabela.colunas, zip(*tabela.linhas)))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(list(colunas[c.name]), type=c.type) for c in schema],
+                schema=schema))
+    return sink.getvalue().to_pybytes()
+
+# ============================================================
+# Motor (processo da requisição)
+# ============================================================
+
+
+class MotorRelatorioParalelo:
+    """Pool de processos que gera um relatório faixa a faixa, em paralelo"""
+
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _obter_executor(self, recriar=False):
+        with self._lock:
+            if self._executor is None or recriar:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=iniciar_worker,
+                    initargs=(dict(conector.DB_CONFIG), conector.DB_REPLICA_CONFIG),
+                )
+            return self._executor
+
+    def vale_a_pena(self, inicio, fim):
+        return self.workers > 1 and (fim - inicio).days + 1 >= DIAS_MINIMOS
+
+    def gerar(self, sql, params, inicio, fim, formato="csv", schema=None, papel=conector.PRIMARIO,
+              tempo_limite=None):
+        """
+        Gera os pedaços (bytes) do relatório na ordem das faixas. `sql` deve
+        ter como os dois primeiros parâmetros o início e o fim do período
+        (datas, inclusive); `params` traz os demais. Para formatos colunares
+        cada pedaço é um stream Arrow IPC com `schema`. `tempo_limite` é o
+        limite de cada comando nos workers (o da rota; None = sem limite).
+        """
+        tarefas = [
+            (papel, sql, (de.isoformat(), ate.isoformat(), *params), formato, schema, tempo_limite)
+            for de, ate in dividir_periodo(inicio, fim, self.workers * FAIXAS_POR_WORKER)
+        ]
+        try:
+            futuros = [self._obter_executor().submit(_executar_faixa, *t) for t in tarefas]
+        except BrokenProcessPool:
+            # um worker morreu (ex.: falta de memória): recria o pool uma vez
+            futuros = [self._obter_executor(recriar=True).submit(_executar_faixa, *t) for t in tarefas]
+        try:
+            for futuro in futuros:
+                yield futuro.result()
+        finally:
+            # cliente desconectou ou deu erro: não gasta o pool com o resto
+            for futuro in futuros:
+                futuro.cancel()
+
+
+motor_relatorio = MotorRelatorioParalelo()
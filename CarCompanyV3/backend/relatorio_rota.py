@@ -1,20 +1,226 @@
 # relatorio_rota.py
-from flask import Blueprint, request, Response, jsonify, current_app
+from flask import Blueprint, request, Response, jsonify, current_app, send_file, url_for
 from datetime import datetime
-import csv
-import io
 import traceback
 
-from database.conector import DatabaseManager  # usa seu conector existente
+from database.conector import DatabaseManager, papel_da_requisicao, somente_leitura, tempo_limite  # usa seu conector existente
+from database.arquivamento import INCLUIR_ARQUIVO, consulta_historico, tabela_historico
+from database.exportacao import TABELAS_EXPORTACAO, exportar_alteracoes
+from relatorio_jobs import CONCLUIDO, ERRO, TEMPO_LIMITE as TEMPO_LIMITE_JOBS, fila_relatorios, versao_dados
+from relatorio_paralelo import codificar_csv, motor_relatorio
+from utilizacao import motor_utilizacao, np
+from simulacao_regras import ATRASO_PREDEFINIDO, REGRAS_ATUAIS, motor_simulacao
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional: sem ele só o CSV fica disponível
+    pa = None
+    pq = None
 
 relatorio_bp = Blueprint("relatorios", __name__)
 
+# Colunas de Aluguel que podem ser pedidas no relatório, na ordem padrão
+COLUNAS_VENDAS = (
+    "num_locacao", "data_retirada", "data_prevista_devolucao", "valor_previsto",
+    "num_funcionario", "placa", "cpf_cliente", "seguro_contratado", "num_pagamento",
+)
+
+
+def _filtro_texto(valor):
+    if not isinstance(valor, str):
+        raise ValueError("texto")
+    return valor
+
+
+def _filtro_inteiro(valor):
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError("número inteiro")
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError("número inteiro") from None
+
+
+def _filtro_booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str) and valor.lower() in ("true", "false"):
+        return valor.lower() == "true"
+    raise ValueError("true ou false")
+
+
+# Filtros de igualdade aceitos no payload -> conversão para o tipo da coluna
+FILTROS_VENDAS = {
+    "placa": _filtro_texto,
+    "cpf_cliente": _filtro_texto,
+    "num_funcionario": _filtro_inteiro,
+    "seguro_contratado": _filtro_booleano,
+}
+
+# formato -> (content-type, extensão do arquivo)
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow"),
+}
+
+TAMANHO_LOTE = 50000
+# relatórios síncronos varrem períodos longos: mais que o padrão das rotas
+TEMPO_LIMITE_RELATORIOS = 120
+
+# Relatórios assíncronos (POST /relatorios/jobs): tipo -> consulta por
+# período (data_min, data_max) e eventos da outbox que alteram o resultado
+CONSULTAS_JOBS = {
+    "vendas": ("""
+        SELECT num_locacao, data_retirada, data_prevista_devolucao, valor_previsto,
+               num_funcionario, placa, cpf_cliente, seguro_contratado, num_pagamento
+        FROM {Aluguel}
+        WHERE data_retirada >= %s::date AND data_retirada < %s::date + 1
+        ORDER BY data_retirada, num_locacao;
+    """, ("ALUGUEL_CRIADO", "ALUGUEL_DEVOLVIDO")),
+    "multas": ("""
+        SELECT m.id_multa, d.num_locacao, d.data_real_devolucao, m.tipo_multa,
+               m.valor, m.num_pagamento
+        FROM {Multa} m
+        JOIN {Devolucao} d ON d.num_pagamento = m.num_pagamento
+        WHERE d.data_real_devolucao >= %s::date AND d.data_real_devolucao < %s::date + 1
+        ORDER BY d.data_real_devolucao, m.id_multa;
+    """, ("ALUGUEL_DEVOLVIDO",)),
+    "manutencoes": ("""
+        SELECT num_manutencao, placa_carro, cpf_mecanico, custo, data_inicio,
+               data_retorno, descricao
+        FROM Manutencao
+        WHERE data_inicio BETWEEN %s AND %s
+        ORDER BY data_inicio, num_manutencao;
+    """, ("MANUTENCAO_CRIADA",)),
+}
+
 
 def parse_date(s):
     return datetime.strptime(s, "%Y-%m-%d").date()
 
 
+def tipos_arrow():
+    """Tipos Arrow das colunas de Aluguel (iguais aos do banco.sql)"""
+    return {
+        "num_locacao": pa.int32(),
+        "data_retirada": pa.timestamp("us"),
+        "data_prevista_devolucao": pa.timestamp("us"),
+        "valor_previsto": pa.decimal128(10, 2),
+        "num_funcionario": pa.int32(),
+        "placa": pa.string(),
+        "cpf_cliente": pa.string(),
+        "seguro_contratado": pa.bool_(),
+        "num_pagamento": pa.int32(),
+    }
+
+
+def montar_consulta_vendas(payload):
+    """
+    Monta (sql, params, colunas) a partir do payload, com projeção de colunas
+    e filtros. Levanta ValueError se "colunas" não for uma lista de colunas
+    existentes e sem repetição, ou se um filtro não for do tipo da coluna.
+    """
+    colunas = payload.get("colunas") or list(COLUNAS_VENDAS)
+    if not isinstance(colunas, list):
+        raise ValueError("'colunas' deve ser uma lista de nomes de colunas.")
+    if len(set(map(str, colunas))) != len(colunas):
+        raise ValueError("'colunas' não pode ter colunas repetidas.")
+    invalidas = [c for c in colunas if c not in COLUNAS_VENDAS]
+    if invalidas:
+        raise ValueError(f"Colunas inválidas: {', '.join(map(str, invalidas))}")
+
+    # intervalo direto na coluna (sem ::date) para o planner descartar as
+    # partições mensais fora do período
+    condicoes = ["data_retirada >= %s::date", "data_retirada < %s::date + 1"]
+    params = [payload["data_min"], payload["data_max"]]
+    for filtro, converter in FILTROS_VENDAS.items():
+        if payload.get(filtro) not in (None, ""):
+            try:
+                valor = converter(payload[filtro])
+            except ValueError as e:
+                raise ValueError(f"Filtro '{filtro}' inválido: esperado {e}.") from None
+            condicoes.append(f"{filtro} = %s")
+            params.append(valor)
+
+    sql = f"""
+        SELECT {", ".join(colunas)}
+        FROM {tabela_historico("Aluguel")}
+        WHERE {" AND ".join(condicoes)}
+        ORDER BY data_retirada, num_locacao;
+    """
+    return sql, tuple(params), list(colunas)
+
+
+def gerar_csv(db, sql, params):
+    # colunas + tuplas direto do cursor, sem dict intermediário por linha
+    tabela = db.execute_select(sql, params, modo="tabela")
+    return codificar_csv(tabela.linhas, tabela.colunas)
+
+
+def escritor_colunar(sink, schema, formato):
+    if formato == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    return pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+
+def gerar_colunar(lotes, colunas, formato, tipos=None):
+    """
+    Gera Parquet ou Arrow IPC (comprimidos com zstd) a partir de lotes no
+    modo "colunas" ({coluna: [valores]}), um RecordBatch por lote. Sem
+    `tipos`, usa os de Aluguel (tipos_arrow).
+    """
+    tipos = tipos or tipos_arrow()
+    schema = pa.schema([(c, tipos[c]) for c in colunas])
+    sink = pa.BufferOutputStream()
+    with escritor_colunar(sink, schema, formato) as writer:
+        for lote in lotes:
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(lote[c], type=tipos[c]) for c in colunas], schema=schema))
+    return sink.getvalue().to_pybytes()
+
+
+def gerar_colunar_paralelo(pedacos, schema, formato):
+    """
+    Junta os pedaços Arrow IPC do motor paralelo num único Parquet/Arrow.
+    Os lotes das faixas são unidos antes de escrever (em grupos de até
+    TAMANHO_LOTE linhas), e não um row group por faixa.
+    """
+    lotes = [lote for pedaco in pedacos for lote in pa.ipc.open_stream(pedaco) if lote.num_rows]
+    tabela = pa.Table.from_batches(lotes, schema=schema).combine_chunks()
+    sink = pa.BufferOutputStream()
+    with escritor_colunar(sink, schema, formato) as writer:
+        if formato == "parquet":
+            writer.write_table(tabela, row_group_size=TAMANHO_LOTE)
+        else:
+            writer.write_table(tabela, max_chunksize=TAMANHO_LOTE)
+    return sink.getvalue().to_pybytes()
+
+
+def relatorio_paralelo(sql, params, colunas, dt_min, dt_max, formato, papel, tempo_limite=None):
+    """
+    Períodos longos: as faixas de datas rodam em paralelo no motor e os
+    pedaços são juntados na ordem antes de responder, para que a falha de
+    qualquer faixa vire erro e não um arquivo cortado com status 200.
+    params[0:2] são data_min e data_max (ver montar_consulta_vendas);
+    tempo_limite é o limite por comando aplicado nos workers.
+    """
+    if formato == "csv":
+        pedacos = motor_relatorio.gerar(sql, params[2:], dt_min, dt_max, "csv",
+                                        papel=papel, tempo_limite=tempo_limite)
+        return codificar_csv((), colunas).encode("utf-8") + b"".join(pedacos)
+
+    tipos = tipos_arrow()
+    schema = pa.schema([(c, tipos[c]) for c in colunas])
+    pedacos = motor_relatorio.gerar(sql, params[2:], dt_min, dt_max, formato, schema, papel,
+                                    tempo_limite)
+    return gerar_colunar_paralelo(pedacos, schema, formato)
+
+
 @relatorio_bp.route("/relatorios/vendas", methods=["POST", "OPTIONS"])
+@somente_leitura
+@tempo_limite(TEMPO_LIMITE_RELATORIOS)
 def gerar_relatorio_vendas():
     # Preflight CORS
     if request.method == "OPTIONS":
@@ -28,84 +234,275 @@ def gerar_relatorio_vendas():
         payload = request.get_json(silent=True) or {}
         data_min = payload.get("data_min")
         data_max = payload.get("data_max")
+        formato = str(payload.get("formato") or "csv").lower()
 
         current_app.logger.info(
-            f"Gerar relatório: {data_min} - {data_max} (method=POST)")
+            f"Gerar relatório: {data_min} - {data_max} ({formato}, method=POST)")
 
         if not data_min or not data_max:
             return jsonify({"erro": "Campos 'data_min' e 'data_max' são obrigatórios."}), 400
 
+        if formato not in FORMATOS:
+            return jsonify({"erro": f"Formato inválido. Use: {', '.join(FORMATOS)}."}), 400
+
+        if formato != "csv" and pa is None:
+            return jsonify({"erro": "Formato colunar indisponível: instale o pacote pyarrow."}), 501
+
         # valida e transforma para garantir ordem correta
-        dt_min = parse_date(data_min)
-        dt_max = parse_date(data_max)
+        try:
+            dt_min = parse_date(data_min)
+            dt_max = parse_date(data_max)
+        except (TypeError, ValueError):
+            return jsonify({"erro": "Datas devem estar no formato AAAA-MM-DD."}), 400
 
         if dt_min > dt_max:
             return jsonify({"erro": "data_min não pode ser maior que data_max."}), 400
 
         # Query — utiliza placeholders %s e passa params
-        sql = """
-            SELECT *
-            FROM aluguel
-            WHERE data_retirada::date >= %s
-              AND data_retirada::date <= %s
-            ORDER BY data_retirada;
-        """
-        params = (data_min, data_max)
-
-        # Usa seu DatabaseManager (que já abre conn e cursor no __init__)
-        db = DatabaseManager()
         try:
-            rows_dicts = db.execute_select_all(
-                sql, params)  # retorna lista de dicts
+            sql, params, colunas = montar_consulta_vendas(payload)
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
+
+        try:
+            if motor_relatorio.vale_a_pena(dt_min, dt_max):
+                # os workers têm as próprias conexões: nenhuma do pool da requisição
+                conteudo = relatorio_paralelo(sql, params, colunas, dt_min, dt_max, formato,
+                                              papel_da_requisicao(), TEMPO_LIMITE_RELATORIOS)
+            elif formato == "csv":
+                conteudo = gerar_csv(DatabaseManager(), sql, params)
+            else:
+                # lotes do cursor do servidor viram RecordBatches sem passar por linhas
+                db = DatabaseManager()
+                lotes = (lote for _, lote in
+                         db.iterar_lotes(sql, params, TAMANHO_LOTE, modo="colunas"))
+                conteudo = gerar_colunar(lotes, colunas, formato)
         except Exception as e:
-            current_app.logger.exception("Erro ao executar select_all: %s", e)
+            current_app.logger.exception("Erro ao executar select: %s", e)
             return jsonify({"erro": "Erro ao consultar banco de dados.", "detalhes": str(e)}), 500
 
-        # Normaliza resultados: extrair colunas (ordem) e transformar rows em tuplas
-        columns = []
-        rows = []
-        if rows_dicts:
-            # manter a ordem das chaves conforme o primeiro dict
-            first = rows_dicts[0]
-            # psycopg2 DictCursor mantém as chaves na ordem das colunas da query
-            columns = list(first.keys())
-            for d in rows_dicts:
-                rows.append(tuple(d.get(col) for col in columns))
-
-        # Gera CSV em memória
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        if columns:
-            writer.writerow(columns)
-        else:
-            # se não houver linhas, escrever cabeçalho vazio (ou nada)
-            writer.writerow([])
-
-        for r in rows:
-            cleaned = []
-            for v in r:
-                if v is None:
-                    cleaned.append("")
-                else:
-                    if hasattr(v, "isoformat"):
-                        cleaned.append(v.isoformat())
-                    else:
-                        cleaned.append(str(v))
-            writer.writerow(cleaned)
-
-        csv_content = output.getvalue()
-        output.close()
-
-        filename = f"vendas_{data_min.replace('-', '')}_{data_max.replace('-', '')}.csv"
+        content_type, extensao = FORMATOS[formato]
+        filename = f"vendas_{data_min.replace('-', '')}_{data_max.replace('-', '')}.{extensao}"
         headers = {
-            "Content-Type": "text/csv; charset=utf-8",
+            "Content-Type": content_type,
             "Content-Disposition": f"attachment; filename*=UTF-8''{filename}",
             "Access-Control-Allow-Origin": "*"
         }
 
-        return Response(csv_content, headers=headers)
+        return Response(conteudo, headers=headers)
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"erro": "Erro interno ao gerar relatório.", "detalhes": str(e)}), 500
+
+# ============================================================
+# Relatórios assíncronos (fila de jobs)
+# ============================================================
+
+
+def gerar_arquivo_relatorio(tipo, data_min, data_max, formato, tempo_limite=TEMPO_LIMITE_JOBS):
+    """
+    Executado no worker da fila: gera o relatório inteiro e retorna os bytes.
+    Fora do Flask não há tempo limite da rota: cada comando usa tempo_limite.
+    """
+    sql = consulta_historico(CONSULTAS_JOBS[tipo][0])
+    params = (data_min, data_max)
+    db = DatabaseManager(tempo_limite=tempo_limite)
+    try:
+        if formato == "csv":
+            return gerar_csv(db, sql, params).encode("utf-8")
+
+        tabela = db.execute_select(sql, params, modo="colunas")
+        colunas = list(tabela)
+        # sem tipos fixos para multas e manutenções: o Arrow infere pelos valores
+        tipos = tipos_arrow() if tipo == "vendas" else {
+            c: pa.array(v).type for c, v in tabela.items()}
+        return gerar_colunar([tabela], colunas, formato, tipos)
+    finally:
+        db.fechar()
+
+
+def descrever_job(id_job):
+    status, detalhe = fila_relatorios.status(id_job, [ext for _, ext in FORMATOS.values()])
+    if status is None:
+        return None
+    resposta = {"id": id_job, "status": status}
+    if status == CONCLUIDO:
+        resposta["download"] = url_for("relatorios.baixar_job", id_job=id_job)
+    elif status == ERRO:
+        resposta["erro"] = detalhe
+    return resposta
+
+
+@relatorio_bp.route("/relatorios/jobs", methods=["POST"])
+def criar_job_relatorio():
+    payload = request.get_json(silent=True) or {}
+    tipo = str(payload.get("tipo") or "vendas").lower()
+    formato = str(payload.get("formato") or "csv").lower()
+    data_min = payload.get("data_min")
+    data_max = payload.get("data_max")
+
+    if tipo not in CONSULTAS_JOBS:
+        return jsonify({"erro": f"Tipo inválido. Use: {', '.join(CONSULTAS_JOBS)}."}), 400
+    if formato not in FORMATOS:
+        return jsonify({"erro": f"Formato inválido. Use: {', '.join(FORMATOS)}."}), 400
+    if formato != "csv" and pa is None:
+        return jsonify({"erro": "Formato colunar indisponível: instale o pacote pyarrow."}), 501
+    if not data_min or not data_max:
+        return jsonify({"erro": "Campos 'data_min' e 'data_max' são obrigatórios."}), 400
+    try:
+        dt_min = parse_date(data_min)
+        dt_max = parse_date(data_max)
+    except (TypeError, ValueError):
+        return jsonify({"erro": "Datas devem estar no formato AAAA-MM-DD."}), 400
+    if dt_min > dt_max:
+        return jsonify({"erro": "data_min não pode ser maior que data_max."}), 400
+
+    try:
+        db = DatabaseManager()
+        versao = versao_dados(db, CONSULTAS_JOBS[tipo][1])
+        # incluir ou não o arquivo muda o resultado, então entra na chave
+        parametros = (dt_min, dt_max, formato, INCLUIR_ARQUIVO)
+        id_job = fila_relatorios.enfileirar(
+            tipo, parametros, versao, FORMATOS[formato][1],
+            gerar_arquivo_relatorio,
+            (tipo, dt_min.isoformat(), dt_max.isoformat(), formato, TEMPO_LIMITE_JOBS))
+
+        resposta = descrever_job(id_job)
+        resposta["status_url"] = url_for("relatorios.status_job", id_job=id_job)
+        return jsonify(resposta), (200 if resposta["status"] == CONCLUIDO else 202)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"erro": "Erro interno ao enfileirar relatório.", "detalhes": str(e)}), 500
+
+
+@relatorio_bp.route("/relatorios/jobs/<id_job>", methods=["GET"])
+def status_job(id_job):
+    resposta = descrever_job(id_job)
+    if resposta is None:
+        return jsonify({"erro": "Job não encontrado ou expirado."}), 404
+    return jsonify(resposta), 200
+
+
+@relatorio_bp.route("/relatorios/jobs/<id_job>/arquivo", methods=["GET"])
+def baixar_job(id_job):
+    status, caminho = fila_relatorios.status(id_job, [ext for _, ext in FORMATOS.values()])
+    if status is None:
+        return jsonify({"erro": "Job não encontrado ou expirado."}), 404
+    if status != CONCLUIDO:
+        return jsonify({"erro": "Relatório ainda não está pronto.", "status": status}), 409
+
+    extensao = caminho.rsplit(".", 1)[1]
+    content_type = next(ct for ct, ext in FORMATOS.values() if ext == extensao)
+    # o id muda quando os dados mudam: o arquivo de um id nunca muda
+    response = send_file(caminho, mimetype=content_type.split(";")[0], as_attachment=True,
+                         download_name=f"{id_job.split('-')[0]}.{extensao}",
+                         etag=id_job, max_age=86400)
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
+# ============================================================
+# Exportação incremental (marca d'água)
+# ============================================================
+
+
+@relatorio_bp.route("/relatorios/incremental", methods=["GET"])
+@somente_leitura
+@tempo_limite(TEMPO_LIMITE_RELATORIOS)
+def exportacao_incremental():
+    """
+    Linhas de Aluguel, Devolucao, Pagamento, Multa e Desconto criadas ou
+    alteradas desde ?desde=<marca> (sem marca: tudo) e a marca para a
+    próxima chamada. ?tabelas=alugueis,pagamentos limita as tabelas.
+    """
+    desde = request.args.get("desde")
+    if desde not in (None, ""):
+        if not desde.isdigit():
+            return jsonify({"erro": "Parâmetro 'desde' deve ser a marca retornada pela exportação anterior."}), 400
+    else:
+        desde = None
+
+    tabelas = [t for t in (request.args.get("tabelas") or "").split(",") if t] or None
+    invalidas = [t for t in tabelas or () if t not in TABELAS_EXPORTACAO]
+    if invalidas:
+        return jsonify({"erro": f"Tabelas inválidas: {', '.join(invalidas)}. Use: {', '.join(TABELAS_EXPORTACAO)}."}), 400
+
+    try:
+        db = DatabaseManager()
+        marca, alteracoes = exportar_alteracoes(db, desde, tabelas)
+        return jsonify({"desde": desde, "marca": marca, **alteracoes}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"erro": "Erro interno na exportação incremental.", "detalhes": str(e)}), 500
+
+# ============================================================
+# Utilização da frota
+# ============================================================
+
+
+@relatorio_bp.route("/relatorios/utilizacao", methods=["GET"])
+@somente_leitura
+@tempo_limite(TEMPO_LIMITE_RELATORIOS)
+def utilizacao_frota():
+    """Ocupação por carro, modelo, categoria e dia entre ?data_min e ?data_max"""
+    if np is None:
+        return jsonify({"erro": "Relatório de utilização indisponível: instale o pacote numpy."}), 501
+
+    data_min = request.args.get("data_min")
+    data_max = request.args.get("data_max")
+    if not data_min or not data_max:
+        return jsonify({"erro": "Parâmetros 'data_min' e 'data_max' são obrigatórios."}), 400
+    try:
+        dt_min = parse_date(data_min)
+        dt_max = parse_date(data_max)
+    except ValueError:
+        return jsonify({"erro": "Datas devem estar no formato AAAA-MM-DD."}), 400
+    if dt_min > dt_max:
+        return jsonify({"erro": "data_min não pode ser maior que data_max."}), 400
+
+    try:
+        db = DatabaseManager()
+        return jsonify(motor_utilizacao.utilizacao(db, dt_min, dt_max)), 200
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"erro": "Erro interno ao calcular a utilização.", "detalhes": str(e)}), 500
+
+
+# ============================================================
+# Simulação de regras de multa/desconto sobre o histórico
+#    GET  /relatorios/simulacao  -> regras atuais (ponto de partida)
+#    POST /relatorios/simulacao {"regras": {"atraso": "progressivo", "tanque": 80,
+#                                           "cliente_fiel": {"minimo_alugueis": 3}}}
+# ============================================================
+
+
+@relatorio_bp.route("/relatorios/simulacao", methods=["GET"])
+def regras_simulacao():
+    return jsonify({"regras_atuais": REGRAS_ATUAIS, "atraso_predefinido": ATRASO_PREDEFINIDO}), 200
+
+
+@relatorio_bp.route("/relatorios/simulacao", methods=["POST"])
+@somente_leitura
+@tempo_limite(TEMPO_LIMITE_RELATORIOS)
+def simular_regras():
+    """Receita atual x com as regras propostas, por categoria, mês e segmento de cliente"""
+    if np is None:
+        return jsonify({"erro": "Simulação indisponível: instale o pacote numpy."}), 501
+
+    payload = request.get_json(silent=True) or {}
+    regras = payload.get("regras") or {}
+    if not isinstance(regras, dict):
+        return jsonify({"erro": "'regras' deve ser um objeto."}), 400
+
+    try:
+        # mesmo papel (primário/réplica) para esta conexão e para os workers
+        papel = papel_da_requisicao()
+        db = DatabaseManager(papel)
+        return jsonify(motor_simulacao.simular(db, regras, papel=papel)), 200
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"erro": "Erro interno ao simular as regras.", "detalhes": str(e)}), 500
@@ -0,0 +1,412 @@
+"""
+Simulação de mudanças nas regras de multa e desconto sobre o histórico de
+devoluções.
+
+Todas as devoluções (com arquivo) são lidas por COPY binário em colunas
+NumPy: datas de retirada, prevista e real, diária da categoria, tanque,
+multas que não dependem de regra (danos, km) e quais descontos sem limite
+configurável foram dados. As regras atuais (as da devolução em
+aluguel_rota) e as propostas são aplicadas de forma vetorizada sobre
+todas as locações, e a receita de cada uma é somada por categoria, mês da
+devolução e segmento de cliente (bincount).
+
+Multas e descontos dependem da ordem das locações de cada cliente (a
+sequência sem multas depende das multas simuladas das devoluções
+anteriores), por isso o histórico é dividido por cliente, e não por data:
+com muitas devoluções, cada parte (hash do CPF) é lida e simulada num
+processo (spawn) e o processo da requisição só soma os resumos.
+
+A receita "atual" é recalculada com as regras atuais e as diárias atuais
+das categorias (o histórico não guarda a diária da época); a registrada é
+o valor dos pagamentos. O delta compara atual x proposta.
+"""
+import copy
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import reduce
+
+from copy_binario import ler_copy, np
+from cotacao import (
+    ALUGUEIS_CLIENTE_FIEL, DESCONTO_CLIENTE_FIEL, DESCONTO_RESERVA_ANTECIPADA,
+    DESCONTO_SEM_MULTAS, DESCONTO_TODAS_CATEGORIAS, DESCONTO_TODOS_ACESSORIOS,
+    SEQUENCIA_SEM_MULTAS,
+)
+from database import conector
+from database.arquivamento import consulta_historico
+from relatorio_paralelo import banco_worker, iniciar_worker
+
+WORKERS = int(os.environ.get("SIMULACAO_WORKERS", os.cpu_count() or 1))
+# abaixo disso ler e simular no próprio processo é mais barato que distribuir
+DEVOLUCOES_MINIMAS = 200_000
+
+# faixas de atraso: [até N dias (None = sem limite), fração da diária por dia]
+ATRASO_PREDEFINIDO = {
+    "linear": [[None, 0.5]],                               # calcular_multa_atraso
+    "progressivo": [[3, 0.5], [7, 1.0], [None, 1.5]],      # calcular_multa_atraso_progressivo
+}
+
+REGRAS_ATUAIS = {
+    "atraso": {"faixas": ATRASO_PREDEFINIDO["linear"]},
+    "tanque": 100.00,
+    "cliente_fiel": {"valor": DESCONTO_CLIENTE_FIEL, "minimo_alugueis": ALUGUEIS_CLIENTE_FIEL},
+    "sem_multas": {"valor": DESCONTO_SEM_MULTAS, "sequencia": SEQUENCIA_SEM_MULTAS},
+    "reserva_antecipada": {"valor": DESCONTO_RESERVA_ANTECIPADA},
+    "todas_categorias": {"valor": DESCONTO_TODAS_CATEGORIAS},
+    "todos_acessorios": {"valor": DESCONTO_TODOS_ACESSORIOS},
+}
+
+# segmento pelo nº da locação do cliente: 1ª, 2ª a 4ª, 5ª em diante
+SEGMENTOS = ("primeira_locacao", "recorrente", "fiel")
+LIMITES_SEGMENTO = (1, ALUGUEIS_CLIENTE_FIEL - 1)
+
+# datas vêm como dias desde 2000-01-01; meses como meses desde 2000-01
+EPOCA = "2000-01-01"
+
+CAMPOS_HISTORICO = [
+    ("cliente", ">i4"),
+    ("categoria", ">i4"),
+    ("num_aluguel", ">i4"),
+    ("dia_retirada", ">i4"),
+    ("dia_prevista", ">i4"),
+    ("dia_devolucao", ">i4"),
+    ("preco", ">f8"),
+    ("combustivel", ">i4"),
+    ("outras_multas", ">f8"),
+    ("reserva_antecipada", ">i4"),
+    ("todas_categorias", ">i4"),
+    ("todos_acessorios", ">i4"),
+    ("valor_registrado", ">f8"),
+]
+
+# uma linha por devolução, ordenadas por cliente e data da devolução; só
+# os clientes da parte (hash do CPF) pedida
+CONSULTA_HISTORICO = """
+    COPY (
+        WITH alugueis AS (
+            SELECT a.num_locacao, a.data_retirada, a.data_prevista_devolucao, a.placa, a.cpf_cliente,
+                   row_number() OVER (PARTITION BY a.cpf_cliente ORDER BY a.data_retirada, a.num_locacao) AS num_aluguel
+            FROM {Aluguel} a
+            WHERE (hashtext(a.cpf_cliente) & 2147483647) %% %(partes)s = %(parte)s
+        ),
+        multas AS (
+            SELECT num_pagamento, SUM(valor) AS outras
+            FROM {Multa}
+            WHERE tipo_multa NOT IN ('ATRASO', 'TANQUE_NAO_CHEIO')
+            GROUP BY num_pagamento
+        ),
+        descontos AS (
+            SELECT num_pagamento,
+                   bool_or(tipo_desconto = 'RESERVA_ANTECIPADA') AS reserva,
+                   bool_or(tipo_desconto = 'TODAS_CATEGORIAS') AS categorias,
+                   bool_or(tipo_desconto = 'TODOS_ACESSORIOS') AS acessorios
+            FROM {Desconto}
+            WHERE flag_ativo
+            GROUP BY num_pagamento
+        )
+        SELECT dense_rank() OVER (ORDER BY al.cpf_cliente)::int4,
+               cat.indice,
+               al.num_aluguel::int4,
+               (al.data_retirada::date - DATE '2000-01-01')::int4,
+               (al.data_prevista_devolucao::date - DATE '2000-01-01')::int4,
+               (COALESCE(d.data_real_devolucao, al.data_prevista_devolucao)::date - DATE '2000-01-01')::int4,
+               cat.preco_diaria::float8,
+               d.combustivel_completo::int4,
+               COALESCE(m.outras, 0)::float8,
+               COALESCE(ds.reserva, FALSE)::int4,
+               COALESCE(ds.categorias, FALSE)::int4,
+               COALESCE(ds.acessorios, FALSE)::int4,
+               p.valor_total::float8
+        FROM alugueis al
+        JOIN {Devolucao} d ON d.num_locacao = al.num_locacao AND d.data_retirada = al.data_retirada
+        JOIN {Pagamento} p ON p.num_pagamento = d.num_pagamento
+        JOIN Carro c ON c.placa = al.placa
+        JOIN (SELECT tipo, preco_diaria, (row_number() OVER (ORDER BY tipo) - 1)::int4 AS indice
+              FROM Categoria) cat ON cat.tipo = c.tipo_categoria
+        LEFT JOIN multas m ON m.num_pagamento = d.num_pagamento
+        LEFT JOIN descontos ds ON ds.num_pagamento = d.num_pagamento
+        ORDER BY al.cpf_cliente, d.data_real_devolucao, al.num_locacao
+    ) TO STDOUT WITH (FORMAT binary)
+"""
+
+# ============================================================
+# Regras
+# ============================================================
+
+
+def _numero(valor, campo):
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor < 0:
+        raise ValueError(f"'{campo}' deve ser um número não negativo.")
+    return valor
+
+
+def _faixas_atraso(faixas):
+    if isinstance(faixas, str):
+        if faixas not in ATRASO_PREDEFINIDO:
+            raise ValueError(f"Regra de atraso desconhecida: {faixas}. Use {', '.join(ATRASO_PREDEFINIDO)} ou 'faixas'.")
+        return copy.deepcopy(ATRASO_PREDEFINIDO[faixas])
+    if isinstance(faixas, dict):
+        faixas = faixas.get("faixas")
+    if not isinstance(faixas, list) or not faixas:
+        raise ValueError("'atraso.faixas' deve ser uma lista de [até_dias, fração da diária].")
+    resultado = []
+    anterior = 0
+    for i, faixa in enumerate(faixas):
+        if not isinstance(faixa, (list, tuple)) or len(faixa) != 2:
+            raise ValueError("Cada faixa de atraso deve ser [até_dias, fração da diária].")
+        ate, fracao = faixa
+        ultima = i == len(faixas) - 1
+        if ultima != (ate is None) or (ate is not None and (not isinstance(ate, int) or ate <= anterior)):
+            raise ValueError("Faixas de atraso: limites inteiros crescentes e a última com até_dias = null.")
+        resultado.append([ate, _numero(fracao, "atraso.faixas")])
+        anterior = ate
+    return resultado
+
+
+def mesclar_regras(propostas):
+    """Regras atuais com as alterações propostas por cima (ValueError se inválidas)"""
+    regras = copy.deepcopy(REGRAS_ATUAIS)
+    for chave, valor in (propostas or {}).items():
+        if chave not in regras:
+            raise ValueError(f"Regra desconhecida: {chave}.")
+        if chave == "atraso":
+            regras[chave] = {"faixas": _faixas_atraso(valor)}
+        elif chave == "tanque":
+            regras[chave] = _numero(valor, chave)
+        else:
+            if not isinstance(valor, dict):
+                raise ValueError(f"'{chave}' deve ser um objeto com {', '.join(regras[chave])}.")
+            for campo, numero in valor.items():
+                if campo not in regras[chave]:
+                    raise ValueError(f"Campo desconhecido em '{chave}': {campo}.")
+                regras[chave][campo] = _numero(numero, f"{chave}.{campo}")
+    return regras
+
+# ============================================================
+# Simulação vetorizada (roda também nos workers)
+# ============================================================
+
+
+def sequencia_sem_multas(cliente, teve_multa):
+    """
+    Devoluções seguidas sem multa do cliente antes de cada devolução
+    (linhas ordenadas por cliente e data), como sequencia_sem_multas do
+    perfil no momento da devolução.
+    """
+    n = cliente.size
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    indice = np.arange(n, dtype=np.int64)
+    inicio = np.ones(n, dtype=bool)
+    inicio[1:] = cliente[1:] != cliente[:-1]
+    primeira = np.maximum.accumulate(np.where(inicio, indice, 0))
+    # última devolução com multa antes desta (de qualquer cliente; o
+    # máximo com o início do cliente descarta as dos clientes anteriores)
+    ultima_multa = np.empty(n, dtype=np.int64)
+    ultima_multa[0] = -1
+    ultima_multa[1:] = np.maximum.accumulate(np.where(teve_multa, indice, -1))[:-1]
+    return indice - np.maximum(ultima_multa, primeira - 1) - 1
+
+
+def aplicar_regras(h, regras):
+    """(receita, multas, descontos) de cada devolução sob um conjunto de regras"""
+    preco = h["preco"]
+    dias_locacao = np.maximum(h["dia_devolucao"] - h["dia_retirada"], 1)
+    valor_base = preco * dias_locacao
+
+    faixas = regras["atraso"]["faixas"]
+    limites = np.array([ate for ate, _ in faixas[:-1]], dtype=np.int64)
+    fracoes = np.array([fracao for _, fracao in faixas], dtype=np.float64)
+    dias_atraso = np.maximum(h["dia_devolucao"] - h["dia_prevista"], 0)
+    multa_atraso = dias_atraso * preco * fracoes[np.searchsorted(limites, dias_atraso)]
+    multa_tanque = np.where(h["combustivel"] == 0, float(regras["tanque"]), 0.0)
+    multas = multa_atraso + multa_tanque + h["outras_multas"]
+
+    fiel = regras["cliente_fiel"]
+    sem_multas = regras["sem_multas"]
+    sequencia = sequencia_sem_multas(h["cliente"], multas > 0)
+    descontos = (
+        np.where(h["num_aluguel"] >= fiel["minimo_alugueis"], float(fiel["valor"]), 0.0)
+        + np.where(sequencia >= sem_multas["sequencia"], float(sem_multas["valor"]), 0.0)
+        + h["reserva_antecipada"] * float(regras["reserva_antecipada"]["valor"])
+        + h["todas_categorias"] * float(regras["todas_categorias"]["valor"])
+        + h["todos_acessorios"] * float(regras["todos_acessorios"]["valor"])
+    )
+    receita = np.maximum(valor_base + multas - descontos, 0.0)
+    return receita, multas, descontos
+
+
+def mes_da_devolucao(dias):
+    """Meses desde 2000-01 para datas em dias desde 2000-01-01"""
+    epoca = np.datetime64(EPOCA, "D")
+    return ((epoca + dias).astype("datetime64[M]") - epoca.astype("datetime64[M]")).astype(np.int64)
+
+
+def resumir(h, valores, num_categorias):
+    """Contagem e soma de cada série de `valores` por categoria, mês e segmento"""
+    mes = mes_da_devolucao(h["dia_devolucao"])
+    grupos = {
+        "categoria": (h["categoria"], num_categorias),
+        "mes": (mes, int(mes.max()) + 1 if mes.size else 0),
+        "segmento": (np.searchsorted(LIMITES_SEGMENTO, h["num_aluguel"]), len(SEGMENTOS)),
+    }
+    resumo = {}
+    for dimensao, (grupo, tamanho) in grupos.items():
+        resumo[dimensao] = {"locacoes": np.bincount(grupo, minlength=tamanho).astype(np.float64)}
+        for nome, serie in valores.items():
+            resumo[dimensao][nome] = np.bincount(grupo, weights=serie, minlength=tamanho)
+    return resumo
+
+
+def somar_resumos(a, b):
+    soma = {}
+    for dimensao in a:
+        soma[dimensao] = {}
+        for nome, x in a[dimensao].items():
+            y = b[dimensao][nome]
+            tamanho = max(x.size, y.size)
+            soma[dimensao][nome] = np.pad(x, (0, tamanho - x.size)) + np.pad(y, (0, tamanho - y.size))
+    return soma
+
+
+def simular_historico(h, regras_atuais, regras_propostas, num_categorias):
+    receita_atual, multas_atual, descontos_atual = aplicar_regras(h, regras_atuais)
+    receita_proposta, multas_proposta, descontos_proposta = aplicar_regras(h, regras_propostas)
+    return resumir(h, {
+        "receita_registrada": h["valor_registrado"],
+        "receita_atual": receita_atual,
+        "receita_proposta": receita_proposta,
+        "multas_atual": multas_atual,
+        "multas_proposta": multas_proposta,
+        "descontos_atual": descontos_atual,
+        "descontos_proposta": descontos_proposta,
+    }, num_categorias)
+
+
+def carregar_historico(db, parte=0, partes=1):
+    return ler_copy(db, consulta_historico(CONSULTA_HISTORICO),
+                    {"parte": parte, "partes": partes}, CAMPOS_HISTORICO)
+
+
+def simular_parte(papel, tempo_limite, parte, partes, regras_atuais, regras_propostas, num_categorias):
+    """Roda no worker: lê os clientes de uma parte e devolve o resumo"""
+    db = banco_worker(papel, tempo_limite)
+    try:
+        h = carregar_historico(db, parte, partes)
+    finally:
+        db.conn.rollback()
+    return simular_historico(h, regras_atuais, regras_propostas, num_categorias)
+
+# ============================================================
+# Resultado
+# ============================================================
+
+
+def _linha(resumo, indice):
+    def valor(nome):
+        return round(float(resumo[nome][indice]), 2)
+
+    atual, proposta = valor("receita_atual"), valor("receita_proposta")
+    return {
+        "locacoes": int(resumo["locacoes"][indice]),
+        "receita_registrada": valor("receita_registrada"),
+        "receita_atual": atual,
+        "receita_proposta": proposta,
+        "delta": round(proposta - atual, 2),
+        "delta_percentual": round(100 * (proposta - atual) / atual, 2) if atual else None,
+        "multas_atual": valor("multas_atual"),
+        "multas_proposta": valor("multas_proposta"),
+        "descontos_atual": valor("descontos_atual"),
+        "descontos_proposta": valor("descontos_proposta"),
+    }
+
+
+def formatar_resultado(resumo, categorias, regras_propostas):
+    por_segmento = resumo["segmento"]
+    total = {nome: np.array([serie.sum()]) for nome, serie in por_segmento.items()}
+    return {
+        "regras_atuais": REGRAS_ATUAIS,
+        "regras_propostas": regras_propostas,
+        "total": _linha(total, 0),
+        "por_categoria": [
+            {"categoria": nome, **_linha(resumo["categoria"], i)}
+            for i, nome in enumerate(categorias) if resumo["categoria"]["locacoes"][i]
+        ],
+        "por_mes": [
+            {"mes": f"{2000 + i // 12}-{i % 12 + 1:02d}", **_linha(resumo["mes"], i)}
+            for i in range(resumo["mes"]["locacoes"].size) if resumo["mes"]["locacoes"][i]
+        ],
+        "por_segmento": [
+            {"segmento": nome, **_linha(por_segmento, i)} for i, nome in enumerate(SEGMENTOS)
+        ],
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+    }
+
+# ============================================================
+# Motor (processo da requisição)
+# ============================================================
+
+
+class MotorSimulacao:
+    """Simula as regras propostas sobre o histórico, em partes por cliente"""
+
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _obter_executor(self, recriar=False):
+        with self._lock:
+            if self._executor is None or recriar:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=iniciar_worker,
+                    initargs=(dict(conector.DB_CONFIG), conector.DB_REPLICA_CONFIG),
+                )
+            return self._executor
+
+    def _simular_em_paralelo(self, tarefas):
+        try:
+            futuros = [self._obter_executor().submit(simular_parte, *t) for t in tarefas]
+        except BrokenProcessPool:
+            # um worker morreu (ex.: falta de memória): recria o pool uma vez
+            futuros = [self._obter_executor(recriar=True).submit(simular_parte, *t) for t in tarefas]
+        try:
+            return [futuro.result() for futuro in futuros]
+        finally:
+            for futuro in futuros:
+                futuro.cancel()
+
+    def simular(self, db, regras=None, papel=conector.PRIMARIO, workers=None):
+        """
+        Receita das devoluções com as regras atuais e com `regras` (alterações
+        sobre as atuais), por categoria, mês e segmento. ValueError se as
+        regras forem inválidas.
+        """
+        propostas = mesclar_regras(regras)
+        categorias = [r["tipo"] for r in db.execute_select_all("SELECT tipo FROM Categoria ORDER BY tipo;")]
+        workers = self.workers if workers is None else workers
+        total = db.execute_select_one(
+            consulta_historico("SELECT COUNT(*) AS total FROM {Devolucao};"))["total"]
+
+        if workers > 1 and total >= DEVOLUCOES_MINIMAS:
+            partes = workers
+            # os workers usam o mesmo tempo limite por comando que a conexão da rota
+            resumos = self._simular_em_paralelo([
+                (papel, db.tempo_limite, parte, partes, REGRAS_ATUAIS, propostas, len(categorias))
+                for parte in range(partes)
+            ])
+        else:
+            partes = 1
+            resumos = [simular_historico(carregar_historico(db), REGRAS_ATUAIS, propostas, len(categorias))]
+
+        resultado = formatar_resultado(reduce(somar_resumos, resumos), categorias, propostas)
+        resultado["partes"] = partes
+        return resultado
+
+
+motor_simulacao = MotorSimulacao()
@@ -0,0 +1,85 @@
+import threading
+
+from flask import Flask, Response
+
+from admissao import CATALOGO, STREAM, ClasseAdmissao, classe_admissao, configurar_admissao, controle_admissao
+from eventos_rota import eventos_blueprint
+
+
+def criar_app():
+    app = Flask(__name__)
+    configurar_admissao(app)
+
+    @app.route("/ok")
+    def ok():
+        return "ok"
+
+    @app.route("/falha")
+    def falha():
+        raise RuntimeError("falhou")
+
+    @app.route("/stream")
+    @classe_admissao(STREAM)
+    def stream():
+        return Response(iter(["a", "b"]))
+
+    app.register_blueprint(eventos_blueprint)
+    return app
+
+
+def test_classe_recusa_com_fila_cheia():
+    classe = ClasseAdmissao("teste", 1, 0, espera=0)
+    assert classe.entrar()
+    assert not classe.entrar()
+    assert classe.recusadas_fila == 1
+    classe.sair()
+    assert classe.entrar()
+
+
+def test_classe_espera_vaga_liberada():
+    classe = ClasseAdmissao("teste", 1, 1, espera=2.0)
+    assert classe.entrar()
+    threading.Timer(0.05, classe.sair).start()
+    assert classe.entrar()
+    assert classe.esperaram == 1
+
+
+def test_stream_de_eventos_nao_usa_vagas_do_catalogo():
+    app = criar_app()
+    classe = controle_admissao.classificar(app.view_functions["eventos.stream_eventos"], "eventos")
+    assert classe.nome == STREAM
+
+
+def test_vaga_liberada_no_fim_da_requisicao():
+    app = criar_app()
+    catalogo = controle_admissao.classes[CATALOGO]
+    antes = catalogo.ativas
+    with app.test_client() as client:
+        assert client.get("/ok").status_code == 200
+    assert catalogo.ativas == antes
+
+
+def test_vaga_liberada_quando_a_rota_falha():
+    app = criar_app()
+    catalogo = controle_admissao.classes[CATALOGO]
+    antes = catalogo.ativas
+    with app.test_client() as client:
+        response = client.get("/falha")
+        assert response.status_code == 500
+        # a página de erro do Flask vem em stream: a vaga sai quando o servidor fecha a resposta
+        response.close()
+    assert catalogo.ativas == antes
+
+
+def test_stream_segura_a_vaga_ate_fechar():
+    app = criar_app()
+    stream = controle_admissao.classes[STREAM]
+    catalogo = controle_admissao.classes[CATALOGO]
+    antes, antes_catalogo = stream.ativas, catalogo.ativas
+    with app.test_client() as client:
+        response = client.get("/stream", buffered=False)
+        assert stream.ativas == antes + 1
+        assert catalogo.ativas == antes_catalogo
+        assert response.get_data(as_text=True) == "ab"
+        response.close()
+    assert stream.ativas == antes
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from aluguel_rota import filtro_retirada
+
+
+class BancoFalso:
+    """Responde a consulta em AluguelAberto com as locações abertas dadas"""
+
+    def __init__(self, abertas):
+        self.abertas = abertas
+        self.consultas = []
+
+    def execute_select_one(self, query, params=None):
+        self.consultas.append((query, params))
+        retirada = self.abertas.get(params[0])
+        return {"data_retirada": retirada} if retirada else None
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_locacao_aberta_filtra_pela_retirada(app):
+    retirada = datetime(2024, 3, 10, 9, 30)
+    with app.test_request_context("/aluguel/7/detalhes"):
+        sql, params = filtro_retirada(BancoFalso({7: retirada}), 7, "a.data_retirada")
+    assert sql == " AND a.data_retirada = %s"
+    assert params == (retirada,)
+
+
+def test_data_informada_filtra_pelo_dia_sem_consultar_o_banco(app):
+    db = BancoFalso({})
+    with app.test_request_context("/aluguel/7/multas?data_retirada=2024-03-10"):
+        sql, params = filtro_retirada(db, 7, "d.data_retirada")
+    assert sql == " AND d.data_retirada >= %s AND d.data_retirada < %s"
+    assert params == (datetime(2024, 3, 10), datetime(2024, 3, 11))
+    assert db.consultas == []
+
+
+def test_locacao_devolvida_sem_data_nao_filtra(app):
+    # devolvida e sem ?data_retirada=: busca só pelo num_locacao, como antes
+    with app.test_request_context("/aluguel/7/multas"):
+        assert filtro_retirada(BancoFalso({}), 7, "d.data_retirada") == ("", ())
+
+
+def test_data_invalida(app):
+    with app.test_request_context("/aluguel/7/multas?data_retirada=2024-13-01"):
+        with pytest.raises(ValueError):
+            filtro_retirada(BancoFalso({}), 7, "d.data_retirada")
@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+import coalescer as modulo
+from coalescer import Coalescedor, ErroCompartilhado, RespostaCongelada, coalescer
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def em_threads(n, alvo):
+    resultados = [None] * n
+    erros = [None] * n
+
+    def rodar(i):
+        try:
+            resultados[i] = alvo()
+        except Exception as e:
+            erros[i] = e
+
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return resultados, erros
+
+
+def test_chamadas_simultaneas_executam_uma_vez():
+    coalescedor = Coalescedor(entre_processos=False)
+    execucoes = []
+    comecou = threading.Event()
+    liberar = threading.Event()
+
+    def lenta():
+        execucoes.append(1)
+        comecou.set()
+        liberar.wait(5)
+        return "resultado"
+
+    def chamar():
+        return coalescedor.executar("chave", lenta)
+
+    lider = threading.Thread(target=chamar)
+    lider.start()
+    comecou.wait(5)
+    threading.Timer(0.1, liberar.set).start()
+    resultados, erros = em_threads(4, chamar)
+    lider.join(5)
+
+    assert execucoes == [1]
+    assert resultados == ["resultado"] * 4
+    assert erros == [None] * 4
+    assert coalescedor.compartilhadas_threads == 4
+    # terminada a execução nada fica guardado: a próxima chamada executa de novo
+    coalescedor.executar("chave", lenta)
+    assert len(execucoes) == 2
+
+
+def test_erro_do_lider_chega_a_quem_espera():
+    coalescedor = Coalescedor(entre_processos=False)
+    comecou = threading.Event()
+
+    def falha():
+        comecou.set()
+        time.sleep(0.1)
+        raise RuntimeError("falhou")
+
+    lider = threading.Thread(target=lambda: pytest.raises(RuntimeError, coalescedor.executar, "c", falha))
+    lider.start()
+    comecou.wait(5)
+    with pytest.raises(RuntimeError, match="falhou"):
+        coalescedor.executar("c", falha)
+    lider.join(5)
+
+
+def test_resposta_passa_de_um_processo_para_outro_pelo_lock_de_arquivo(app, tmp_path):
+    # dois Coalescedor na mesma pasta fazem o papel de dois processos
+    pasta = str(tmp_path / "locks")
+    dono, outro = Coalescedor(pasta, entre_processos=True), Coalescedor(pasta, entre_processos=True)
+    comecou = threading.Event()
+
+    def lenta():
+        comecou.set()
+        time.sleep(0.2)
+        return RespostaCongelada(jsonify({"total": 3}))
+
+    def executar_dono():
+        with app.test_request_context("/"):
+            return dono.executar("chave", lenta)
+
+    t = threading.Thread(target=executar_dono)
+    t.start()
+    comecou.wait(5)
+    with app.test_request_context("/"):
+        resposta = outro.executar("chave", lambda: pytest.fail("executou de novo"))
+        assert resposta.criar().get_json() == {"total": 3}
+    t.join(5)
+    assert dono.execucoes == 1 and outro.execucoes == 0
+    assert outro.compartilhadas_processos == 1
+
+
+def test_erro_de_outro_processo_vira_erro_compartilhado(app, tmp_path):
+    pasta = str(tmp_path / "locks")
+    dono, outro = Coalescedor(pasta, entre_processos=True), Coalescedor(pasta, entre_processos=True)
+    comecou = threading.Event()
+
+    def falha():
+        comecou.set()
+        time.sleep(0.2)
+        raise RuntimeError("banco fora")
+
+    def executar_dono():
+        with app.test_request_context("/"):
+            with pytest.raises(RuntimeError):
+                dono.executar("chave", falha)
+
+    t = threading.Thread(target=executar_dono)
+    t.start()
+    comecou.wait(5)
+    with app.test_request_context("/"):
+        with pytest.raises(ErroCompartilhado, match="banco fora"):
+            outro.executar("chave", lambda: pytest.fail("executou de novo"))
+    t.join(5)
+
+
+def test_rota_responde_json_quando_a_execucao_compartilhada_falha(app, monkeypatch):
+    def executar(*_args, **_kwargs):
+        raise ErroCompartilhado("banco fora")
+
+    monkeypatch.setattr(modulo.coalescedor, "executar", executar)
+
+    @app.route("/estatisticas")
+    @coalescer()
+    def estatisticas():
+        return jsonify({"total": 1})
+
+    response = app.test_client().get("/estatisticas")
+    assert response.status_code == 500
+    assert response.get_json() == {"erro": "Erro interno no servidor"}
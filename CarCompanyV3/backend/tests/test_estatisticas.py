@@ -0,0 +1,99 @@
+import math
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import estatisticas
+from estatisticas import ServicoEstatisticas
+
+
+class BancoFalso:
+    papel = "primario"
+
+    def __init__(self, *_args, **_kwargs):
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+@pytest.fixture
+def servico(monkeypatch):
+    monkeypatch.setattr(estatisticas, "DatabaseManager", BancoFalso)
+    servico = ServicoEstatisticas(intervalo=60)
+    # sem thread de fundo: os testes chamam _recalcular quando precisam
+    monkeypatch.setattr(servico, "iniciar", lambda: None)
+    monkeypatch.setattr(servico, "_banco", lambda: BancoFalso())
+    return servico
+
+
+def contador(execucoes, espera=0.0):
+    def calcular(_db):
+        execucoes.append(1)
+        time.sleep(espera)
+        return {"total": len(execucoes)}
+    return calcular
+
+
+def envelhecer(servico, nome, segundos):
+    servico._estatisticas[nome].calculado_em -= segundos
+
+
+def test_primeira_leitura_calcula_uma_vez_para_todos(servico):
+    execucoes = []
+    servico.registrar("carros", contador(execucoes, espera=0.1))
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(servico.obter("carros")[0]))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert execucoes == [1]
+    assert resultados == [{"total": 1}] * 5
+
+
+def test_valor_vencido_e_servido_e_recalculado_em_segundo_plano(servico):
+    execucoes = []
+    servico.registrar("clientes", contador(execucoes))
+    servico.obter("clientes")
+    envelhecer(servico, "clientes", 120)
+
+    valor, _, idade = servico.obter("clientes")
+    assert valor == {"total": 1} and idade >= 60
+    assert servico._acordar.is_set()
+
+    servico._recalcular(servico._estatisticas["clientes"])
+    assert servico.obter("clientes")[0] == {"total": 2}
+
+
+def test_sob_demanda_so_recalcula_depois_de_lida_vencida(servico):
+    execucoes = []
+    servico.registrar("carros", contador(execucoes), sob_demanda=True)
+    estatistica = servico._estatisticas["carros"]
+    # nunca lida: a thread de fundo não calcula
+    assert math.isinf(estatistica.proxima_atualizacao())
+
+    servico.obter("carros")
+    envelhecer(servico, "carros", 120)
+    assert math.isinf(estatistica.proxima_atualizacao())
+
+    servico.obter("carros")
+    assert estatistica.proxima_atualizacao() <= time.monotonic()
+    servico._recalcular(estatistica)
+    assert math.isinf(estatistica.proxima_atualizacao())
+    assert execucoes == [1, 1]
+
+
+def test_resposta_informa_idade(servico):
+    servico.registrar("funcionarios", lambda _db: {"total": 7})
+    with Flask(__name__).test_request_context("/"):
+        response = servico.resposta("funcionarios")
+    assert response.get_json()["total"] == 7
+    assert "gerado_em" in response.get_json()
+    assert response.headers["Age"] == "0"
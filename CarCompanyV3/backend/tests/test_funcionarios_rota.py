@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+import funcionarios_rota
+from funcionarios_rota import funcionarios_blueprint
+
+
+class BancoFalso:
+    """Recontagem que sempre chega a 5 vendas"""
+
+    def __init__(self, *_args, **_kwargs):
+        pass
+
+    @contextmanager
+    def transacao(self):
+        yield self
+
+    def execute_select_one(self, query, params=None):
+        if "recontar_vendas_funcionario" in query:
+            return {"total": 1}
+        return {"qnt_vendas": 5, "valor_total_vendas": 900}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(funcionarios_rota, "DatabaseManager", BancoFalso)
+    app = Flask(__name__)
+    app.register_blueprint(funcionarios_blueprint)
+    return app.test_client()
+
+
+def test_incrementar_vendas_descontinuado(client):
+    response = client.post("/funcionarios/3/incrementar-vendas")
+    assert response.status_code == 410
+    assert "PUT /funcionarios/3/vendas" in response.get_json()["erro"]
+
+
+def test_put_vendas_sem_valor_reconta(client):
+    response = client.put("/funcionarios/3/vendas", json={})
+    assert response.status_code == 200
+    assert response.get_json()["novo_total"] == 5
+
+
+def test_put_vendas_com_valor_igual_ao_recontado(client):
+    assert client.put("/funcionarios/3/vendas", json={"qnt_vendas": 5}).status_code == 200
+
+
+def test_put_vendas_com_valor_diferente_e_recusado(client):
+    response = client.put("/funcionarios/3/vendas", json={"qnt_vendas": 9})
+    assert response.status_code == 400
+    assert response.get_json()["novo_total"] == 5
+
+
+def test_put_vendas_com_valor_invalido(client):
+    assert client.put("/funcionarios/3/vendas", json={"qnt_vendas": "muitas"}).status_code == 400
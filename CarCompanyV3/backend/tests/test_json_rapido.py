@@ -0,0 +1,32 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from database.conector import LinhasTabela
+from json_rapido import codificar_objetos, serializar
+
+COLUNAS = ["num_locacao", "data_retirada", "valor", "placa", "dia"]
+LINHAS = [
+    (1, datetime(2024, 1, 31, 10, 0), Decimal("540.00"), 'ECO"1', date(2024, 2, 1)),
+    (2, None, Decimal("NaN"), "ECO2", None),
+]
+
+
+def test_tabela_como_lista_de_objetos():
+    dados = json.loads(serializar({"historico": LinhasTabela(COLUNAS, LINHAS)}))
+    assert dados["historico"][0] == {
+        "num_locacao": 1, "data_retirada": "2024-01-31T10:00:00", "valor": 540.0,
+        "placa": 'ECO"1', "dia": "2024-02-01",
+    }
+    assert dados["historico"][1]["valor"] is None
+
+
+def test_caminho_sem_orjson_gera_os_mesmos_objetos():
+    tabela = LinhasTabela(COLUNAS, LINHAS)
+    assert json.loads(codificar_objetos(tabela)) == json.loads(serializar(tabela))
+
+
+def test_tabela_colunar():
+    dados = json.loads(serializar(LinhasTabela(COLUNAS, LINHAS[:1], colunar=True)))
+    assert dados["colunas"] == COLUNAS
+    assert dados["linhas"] == [[1, "2024-01-31T10:00:00", 540.0, 'ECO"1', "2024-02-01"]]
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from relatorio_jobs import CONCLUIDO, ERRO, EXECUTANDO, PENDENTE, FilaRelatorios
+
+liberar = threading.Event()
+
+
+def gerar_bloqueado(conteudo):
+    liberar.wait(5)
+    return conteudo
+
+
+def gerar_com_erro():
+    raise RuntimeError("consulta cancelada")
+
+
+class ExecutorContado(ThreadPoolExecutor):
+    """Executor em threads (no lugar dos processos) que conta os envios"""
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.enviados = 0
+
+    def submit(self, *args, **kwargs):
+        self.enviados += 1
+        return super().submit(*args, **kwargs)
+
+
+def criar_fila(pasta, **kwargs):
+    fila = FilaRelatorios(pasta=str(pasta), **kwargs)
+    fila._executor = ExecutorContado()
+    return fila
+
+
+@pytest.fixture(autouse=True)
+def liberar_no_fim():
+    liberar.clear()
+    yield
+    liberar.set()
+
+
+def esperar(condicao, prazo=5):
+    fim = time.monotonic() + prazo
+    while not condicao():
+        assert time.monotonic() < fim
+        time.sleep(0.01)
+
+
+def test_job_de_outro_processo_aparece_e_nao_e_enfileirado_de_novo(tmp_path):
+    # duas filas na mesma pasta fazem o papel de dois processos do servidor
+    fila_a, fila_b = criar_fila(tmp_path), criar_fila(tmp_path)
+    id_job = fila_a.enfileirar("vendas", ("2024-01-01",), 7, "csv", gerar_bloqueado, (b"a,b\n",))
+
+    assert fila_b.status(id_job, ["csv"])[0] in (PENDENTE, EXECUTANDO)
+    assert fila_b.enfileirar("vendas", ("2024-01-01",), 7, "csv", gerar_bloqueado, (b"a,b\n",)) == id_job
+    assert fila_b._executor.enviados == 0
+
+    liberar.set()
+    esperar(lambda: fila_b.status(id_job, ["csv"])[0] == CONCLUIDO)
+    status, caminho = fila_b.status(id_job, ["csv"])
+    with open(caminho, "rb") as f:
+        assert f.read() == b"a,b\n"
+    assert not os.path.exists(fila_a.caminho(id_job, "pendente"))
+
+
+def test_erro_visivel_em_outro_processo_e_refeito_no_proximo_pedido(tmp_path):
+    fila_a, fila_b = criar_fila(tmp_path), criar_fila(tmp_path)
+    id_job = fila_a.enfileirar("multas", ("2024-01-01",), 1, "csv", gerar_com_erro, ())
+    esperar(lambda: fila_b.status(id_job, ["csv"])[0] == ERRO)
+    assert fila_b.status(id_job, ["csv"]) == (ERRO, "consulta cancelada")
+
+    fila_b.enfileirar("multas", ("2024-01-01",), 1, "csv", gerar_bloqueado, (b"ok",))
+    assert fila_b._executor.enviados == 1
+    liberar.set()
+    esperar(lambda: fila_a.status(id_job, ["csv"])[0] == CONCLUIDO)
+
+
+def test_marca_abandonada_nao_segura_o_job(tmp_path):
+    fila = criar_fila(tmp_path, prazo_pendente=60)
+    id_job = fila.enfileirar("vendas", ("x",), 1, "csv", gerar_bloqueado, (b"1",))
+    liberar.set()
+    esperar(lambda: fila.status(id_job, ["csv"])[0] == CONCLUIDO)
+
+    # outra versão com a marca de um processo que morreu há mais que o prazo
+    outra = criar_fila(tmp_path, prazo_pendente=60)
+    marca = outra.caminho(id_job.rsplit("-", 1)[0] + "-2", "pendente")
+    with open(marca, "w") as f:
+        f.write(PENDENTE)
+    os.utime(marca, (time.time() - 120, time.time() - 120))
+    assert outra.status(os.path.basename(marca)[:-len(".pendente")], ["csv"]) == (None, None)
+
+    outra.enfileirar("vendas", ("x",), 2, "csv", gerar_bloqueado, (b"2",))
+    assert outra._executor.enviados == 1
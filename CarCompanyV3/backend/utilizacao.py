@@ -0,0 +1,242 @@
+"""
+Utilização da frota: fração do período em que cada carro, modelo e
+categoria ficou alugado, e a ocupação da frota dia a dia.
+
+Os intervalos (carro, retirada, devolução) vêm do banco por COPY binário
+já recortados ao período e em segundos desde o início dele, e são lidos
+direto para arrays NumPy (int32), sem passar por tuplas Python. As contas
+são vetorizadas:
+
+- por carro: união dos intervalos (locações sobrepostas do mesmo carro
+  contam uma vez). Ordenando por (carro, início) e somando um deslocamento
+  por carro, um único maximum.accumulate dá o fim já coberto antes de cada
+  intervalo; o que passa dele é tempo novo alugado.
+- por dia: varredura sobre os inícios e fins. O tempo alugado até t é
+  sum(t - início) dos intervalos já iniciados menos sum(t - fim) dos já
+  terminados; com contagens e somas por dia (bincount) acumuladas isso
+  sai para todas as viradas de dia de uma vez, sem ordenar.
+
+Os carros são lidos primeiro e as placas vão como parâmetro do COPY, que
+numera pela posição nessa lista: carro cadastrado ou removido entre as
+duas consultas não desalinha os índices. O período vai até
+MAX_DIAS_PERIODO dias (segundos em int4 e uma linha por dia na resposta).
+
+Locação ainda aberta conta como alugada até agora. Os resultados ficam
+num cache por período, invalidado pela versão dos dados (outbox) e, se o
+período inclui o momento atual, também por tempo.
+"""
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: sem ele /relatorios/utilizacao responde 501
+    np = None
+
+from cache_lru import CacheLRUVersionado
+from copy_binario import LeitorCopyBinario, dtype_copy
+from database.arquivamento import INCLUIR_ARQUIVO, consulta_historico
+from relatorio_jobs import versao_dados
+
+SEGUNDOS_DIA = 86400
+TAMANHO_CACHE = 64
+# períodos que incluem "agora" mudam sozinhos (locações abertas crescem)
+VALIDADE_PERIODO_ATUAL = 60
+MAX_DIAS_PERIODO = 3660
+
+# eventos que mudam intervalos ou a frota
+EVENTOS_UTILIZACAO = (
+    "ALUGUEL_CRIADO", "ALUGUEL_DEVOLVIDO",
+    "CARRO_CADASTRADO", "CARRO_ATUALIZADO", "CARRO_REMOVIDO",
+)
+
+CONSULTA_FROTA = """
+    SELECT placa, nome AS modelo, tipo_categoria AS categoria
+    FROM Carro
+    ORDER BY placa;
+"""
+
+# carro (índice em %(placas)s, as placas de CONSULTA_FROTA), início e fim em
+# segundos desde o início do período, já recortados a [0, duração]
+CONSULTA_INTERVALOS = """
+    COPY (
+        SELECT c.idx,
+               EXTRACT(EPOCH FROM GREATEST(a.data_retirada, %(inicio)s) - %(inicio)s)::int4,
+               EXTRACT(EPOCH FROM LEAST(COALESCE(d.data_real_devolucao, LOCALTIMESTAMP), %(fim)s) - %(inicio)s)::int4
+        FROM {Aluguel} a
+        JOIN (SELECT placa, (ordem - 1)::int4 AS idx
+              FROM unnest(%(placas)s::text[]) WITH ORDINALITY AS p(placa, ordem)) c
+          ON c.placa = a.placa
+        LEFT JOIN {Devolucao} d
+          ON d.num_locacao = a.num_locacao AND d.data_retirada = a.data_retirada
+        WHERE a.data_retirada < %(fim)s
+          AND COALESCE(d.data_real_devolucao, LOCALTIMESTAMP) > %(inicio)s
+    ) TO STDOUT WITH (FORMAT binary)
+"""
+
+# ============================================================
+# Leitura do COPY binário para arrays
+# ============================================================
+
+CAMPOS_INTERVALOS = [("carro", ">i4"), ("inicio", ">i4"), ("fim", ">i4")]
+
+
+class LeitorCopyIntervalos(LeitorCopyBinario):
+    """Linhas (carro, início, fim) de CONSULTA_INTERVALOS"""
+
+    DTYPE = None if np is None else dtype_copy(CAMPOS_INTERVALOS)
+
+    def __init__(self):
+        super().__init__(CAMPOS_INTERVALOS)
+
+    def arrays(self):
+        """(carro, inicio, fim) com todas as linhas lidas"""
+        colunas = self.colunas()
+        return colunas["carro"], colunas["inicio"], colunas["fim"]
+
+
+def carregar_intervalos(db, placas, inicio, fim):
+    sql = db.cursor_tuplas.mogrify(
+        consulta_historico(CONSULTA_INTERVALOS),
+        {"placas": list(placas), "inicio": inicio, "fim": fim}).decode()
+    leitor = LeitorCopyIntervalos()
+    db.copiar(sql, leitor)
+    return leitor.arrays()
+
+# ============================================================
+# Cálculo vetorizado
+# ============================================================
+
+
+def tempo_alugado_por_carro(carro, inicio, fim, num_carros):
+    """
+    Segundos alugados de cada carro (união dos intervalos) e os pedaços
+    (inicio, fim) já sem sobreposição, para a ocupação diária.
+    """
+    validos = fim > inicio
+    carro, inicio, fim = carro[validos], inicio[validos], fim[validos]
+    if carro.size == 0:
+        return np.zeros(num_carros), inicio.astype(np.int64), fim.astype(np.int64)
+
+    # desloca cada carro para uma faixa própria: ordenar pelo início deslocado
+    # ordena por (carro, início) e um único acumulado serve para todos
+    # (um argsort de int64 é várias vezes mais rápido que o lexsort)
+    faixa = int(fim.max()) + 1
+    ini = carro.astype(np.int64) * faixa + inicio
+    ordem = np.argsort(ini)
+    ini = ini[ordem]
+    carro = carro[ordem]
+    deslocamento = ini - inicio[ordem]
+    fi = fim[ordem] + deslocamento
+
+    coberto = np.maximum.accumulate(fi)
+    coberto_antes = np.empty_like(coberto)
+    coberto_antes[0] = ini[0]
+    coberto_antes[1:] = coberto[:-1]
+    ini_novo = np.maximum(ini, coberto_antes)
+    novo = np.clip(fi - ini_novo, 0, None)
+
+    por_carro = np.bincount(carro, weights=novo, minlength=num_carros)
+    pedacos = novo > 0
+    return (por_carro,
+            (ini_novo - deslocamento)[pedacos],
+            (fi - deslocamento)[pedacos])
+
+
+def tempo_alugado_por_dia(inicios, fins, num_dias):
+    """Segundos alugados (somando os carros) em cada dia do período"""
+    viradas = np.arange(num_dias + 1, dtype=np.int64) * SEGUNDOS_DIA
+
+    def acumulado(pontos):
+        # sum(max(0, t - p)) para cada virada t = k dias: só contam os pontos
+        # de dias anteriores a k
+        dia = pontos // SEGUNDOS_DIA
+        contagem = np.bincount(dia, minlength=num_dias + 1)[:num_dias]
+        soma = np.bincount(dia, weights=pontos, minlength=num_dias + 1)[:num_dias]
+        antes = np.concatenate(([0], np.cumsum(contagem)))
+        soma_antes = np.concatenate(([0.0], np.cumsum(soma)))
+        return antes * viradas - soma_antes
+
+    return np.diff(acumulado(inicios) - acumulado(fins))
+
+
+def agrupar(valores, grupos, num_grupos):
+    """Soma de `valores` e quantidade de itens por grupo"""
+    return (np.bincount(grupos, weights=valores, minlength=num_grupos),
+            np.bincount(grupos, minlength=num_grupos))
+
+
+def calcular_utilizacao(frota, carro, inicio, fim, data_min, num_dias):
+    duracao = num_dias * SEGUNDOS_DIA
+    num_carros = len(frota)
+    por_carro, pedaco_ini, pedaco_fim = tempo_alugado_por_carro(carro, inicio, fim, num_carros)
+    por_dia = tempo_alugado_por_dia(pedaco_ini, pedaco_fim, num_dias)
+
+    def ocupacao(segundos, capacidade):
+        return round(float(segundos) / float(capacidade), 4) if capacidade else 0.0
+
+    resultado = {
+        "ocupacao_frota": ocupacao(por_carro.sum(), duracao * num_carros),
+        "carros": [
+            {**c, "dias_alugados": round(float(s) / SEGUNDOS_DIA, 2), "ocupacao": ocupacao(s, duracao)}
+            for c, s in zip(frota, por_carro)
+        ],
+        "dias": [
+            {"dia": (data_min + timedelta(days=i)).isoformat(),
+             "carros_alugados_media": round(float(s) / SEGUNDOS_DIA, 2),
+             "ocupacao": ocupacao(s, SEGUNDOS_DIA * num_carros)}
+            for i, s in enumerate(por_dia)
+        ],
+    }
+    for chave, campo in (("modelos", "modelo"), ("categorias", "categoria")):
+        nomes = sorted({c[campo] for c in frota})
+        indice = {n: i for i, n in enumerate(nomes)}
+        grupos = np.array([indice[c[campo]] for c in frota], dtype=np.int64)
+        soma, quantidade = agrupar(por_carro, grupos, len(nomes)) if num_carros else ((), ())
+        resultado[chave] = [
+            {campo: n, "carros": int(q), "ocupacao": ocupacao(s, duracao * q)}
+            for n, s, q in zip(nomes, soma, quantidade)
+        ]
+    return resultado
+
+# ============================================================
+# Motor com cache por período
+# ============================================================
+
+
+class MotorUtilizacao:
+    def __init__(self, tamanho_cache=TAMANHO_CACHE):
+        self.cache = CacheLRUVersionado(tamanho_cache)
+
+    def utilizacao(self, db, data_min, data_max):
+        """
+        Utilização entre data_min e data_max (datas, inclusive). Levanta
+        ValueError para período maior que MAX_DIAS_PERIODO dias.
+        """
+        num_dias = (data_max - data_min).days + 1
+        if num_dias > MAX_DIAS_PERIODO:
+            raise ValueError(f"O período pode ter no máximo {MAX_DIAS_PERIODO} dias.")
+        inicio = datetime.combine(data_min, datetime.min.time())
+        fim = datetime.combine(data_max, datetime.min.time()) + timedelta(days=1)
+        chave = (data_min, data_max, INCLUIR_ARQUIVO)
+        versao = versao_dados(db, EVENTOS_UTILIZACAO)
+        periodo_atual = fim > datetime.now()
+
+        resultado = self.cache.obter(
+            chave, versao, VALIDADE_PERIODO_ATUAL if periodo_atual else None)
+        if resultado is not None:
+            return resultado
+
+        frota = [dict(r) for r in db.execute_select_all(CONSULTA_FROTA)]
+        carro, ini, fi = carregar_intervalos(db, [c["placa"] for c in frota], inicio, fim)
+        resultado = calcular_utilizacao(frota, carro, ini, fi, data_min, num_dias)
+        resultado.update({
+            "data_min": data_min.isoformat(),
+            "data_max": data_max.isoformat(),
+            "locacoes": int(carro.size),
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        })
+        self.cache.guardar(chave, versao, resultado)
+        return resultado
+
+
+motor_utilizacao = MotorUtilizacao()
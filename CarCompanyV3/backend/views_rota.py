@@ -0,0 +1,102 @@
+from flask import Blueprint, Response, request, jsonify
+from database.conector import DatabaseManager
+
+views_blueprint = Blueprint("views", __name__)
+
+# ============================================================
+# Helpers
+# ============================================================
+
+
+def internal_error(msg="Erro interno no servidor"):
+    print(f"DEBUG: {msg}")
+    return jsonify({"erro": msg}), 500
+
+
+def responder_view(query, params=None):
+    """
+    Executa a consulta da view (que já devolve o JSON pronto, montado no banco)
+    e responde com ETag, devolvendo 304 quando o cliente já tem essa versão.
+    """
+    db = DatabaseManager()
+    row = db.execute_select(query, params)
+    db.conn.commit()
+
+    resp = Response(row[0][0], mimetype="application/json")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+# ============================================================
+# 1. Tela de aluguel: funcionários + carros disponíveis
+# ============================================================
+
+
+@views_blueprint.route("/views/alugar", methods=["GET"])
+def view_alugar():
+    try:
+        query = """
+            WITH funcionarios AS (
+                SELECT json_agg(json_build_object(
+                           'num_funcionario', num_funcionario,
+                           'nome', nome
+                       ) ORDER BY qnt_vendas DESC, nome) AS lista
+                FROM Funcionario
+            ),
+            carros AS (
+                -- um carro disponível por modelo (a maior placa), como em /carros/disponiveis
+                SELECT json_agg(json_build_object(
+                           'placa', placa,
+                           'nome', nome,
+                           'tipo_categoria', tipo_categoria,
+                           'preco', preco
+                       ) ORDER BY nome) AS lista
+                FROM (
+                    SELECT DISTINCT ON (c.nome)
+                        c.placa, c.nome, c.tipo_categoria, cat.preco_diaria AS preco
+                    FROM Carro c
+                    JOIN Categoria cat ON cat.tipo = c.tipo_categoria
+                    WHERE c.status_carro = 'DISPONIVEL'
+                    ORDER BY c.nome, c.placa DESC
+                ) d
+            )
+            SELECT json_build_object(
+                'funcionarios', COALESCE((SELECT lista FROM funcionarios), '[]'::json),
+                'carros', COALESCE((SELECT lista FROM carros), '[]'::json)
+            )::text;
+        """
+        return responder_view(query)
+    except Exception as e:
+        return internal_error(str(e))
+
+# ============================================================
+# 2. Tela de devolução: locações abertas com os detalhes usados no cálculo
+# ============================================================
+
+
+@views_blueprint.route("/views/devolucao", methods=["GET"])
+def view_devolucao():
+    try:
+        query = """
+            WITH locacoes AS (
+                SELECT json_agg(json_build_object(
+                           'num_locacao', a.num_locacao,
+                           'placa', a.placa,
+                           'cpf_cliente', a.cpf_cliente,
+                           'valor_previsto', a.valor_previsto,
+                           'data_prevista_devolucao', a.data_prevista_devolucao::date,
+                           'tipo_carro', car.tipo_categoria,
+                           'preco_diaria', cat.preco_diaria
+                       ) ORDER BY a.num_locacao) AS lista
+                FROM AluguelAberto ab
+                JOIN Aluguel a ON a.num_locacao = ab.num_locacao AND a.data_retirada = ab.data_retirada
+                JOIN Carro car ON a.placa = car.placa
+                JOIN Categoria cat ON car.tipo_categoria = cat.tipo
+            )
+            SELECT json_build_object(
+                'locacoes', COALESCE((SELECT lista FROM locacoes), '[]'::json)
+            )::text;
+        """
+        return responder_view(query)
+    except Exception as e:
+        return internal_error(str(e))
@@ -1,5 +1,7 @@
+DROP SCHEMA IF EXISTS aluguel_arquivo CASCADE;
 DROP SCHEMA IF EXISTS aluguel CASCADE;
 CREATE SCHEMA aluguel;
+CREATE SCHEMA aluguel_arquivo;
 SET search_path TO aluguel;
 
 CREATE TABLE Cliente (
@@ -20,9 +22,11 @@ CREATE TABLE Funcionario (
     data_inicio DATE NOT NULL,
     endereco VARCHAR(200),
     telefone VARCHAR(20),
-    qnt_vendas INTEGER DEFAULT 0,
+    qnt_vendas INTEGER NOT NULL DEFAULT 0,               -- mantido pelo trigger de Aluguel
+    valor_total_vendas NUMERIC(12,2) NOT NULL DEFAULT 0, -- soma de valor_previsto dos aluguéis
     CHECK (cpf ~ '^[0-9]{11}$'),
     CHECK (qnt_vendas >= 0),
+    CHECK (valor_total_vendas >= 0),
     CHECK (data_inicio <= CURRENT_DATE)
 );
 
@@ -33,7 +37,10 @@ CREATE TABLE Categoria (
     tipo VARCHAR(50) PRIMARY KEY,
     preco_diaria NUMERIC(10,2) NOT NULL,
     descricao TEXT,
-    CHECK (preco_diaria >= 0)
+    -- posição da categoria na máscara de PerfilCliente
+    posicao_bit SMALLINT GENERATED BY DEFAULT AS IDENTITY (MINVALUE 0 START WITH 0) UNIQUE,
+    CHECK (preco_diaria >= 0),
+    CHECK (posicao_bit BETWEEN 0 AND 62)
 );
 
 -- ============================================
@@ -48,6 +55,7 @@ CREATE TABLE Carro (
     tipo_categoria VARCHAR(50) NOT NULL,
     imagem_url VARCHAR(200),
     status_carro VARCHAR(20) DEFAULT 'DISPONIVEL',
+    num_manutencao INTEGER,
     
     FOREIGN KEY (tipo_categoria) REFERENCES Categoria(tipo),
     
@@ -75,13 +83,19 @@ CREATE TABLE Manutencao (
     CHECK (cpf_mecanico IS NULL OR cpf_mecanico ~ '^[0-9]{11}$')
 );
 
+-- manutenção corrente do carro (FK criada depois por causa da referência circular)
+ALTER TABLE Carro ADD FOREIGN KEY (num_manutencao) REFERENCES Manutencao(num_manutencao);
+
 -- ============================================
 -- 6. ACESSORIO
 -- ============================================
 CREATE TABLE Acessorio (
     tipo VARCHAR(50) PRIMARY KEY,
     preco_adicional NUMERIC(10,2) NOT NULL,
-    CHECK (preco_adicional >= 0)
+    -- posição do acessório na máscara de PerfilCliente
+    posicao_bit SMALLINT GENERATED BY DEFAULT AS IDENTITY (MINVALUE 0 START WITH 0) UNIQUE,
+    CHECK (preco_adicional >= 0),
+    CHECK (posicao_bit BETWEEN 0 AND 62)
 );
 
 -- ============================================
@@ -92,14 +106,19 @@ CREATE TABLE Pagamento (
     num_pagamento SERIAL PRIMARY KEY,
     valor_total NUMERIC(10,2) NOT NULL,
     forma_pagamento VARCHAR(50),
+    -- transação que criou/alterou a linha (exportação incremental, seção 19)
+    xid_alteracao XID8 NOT NULL DEFAULT pg_current_xact_id(),
     CHECK (valor_total >= 0)
 );
 
 -- ============================================
 -- 8. ALUGUEL
+-- Particionada por mês de data_retirada (ver seção 16);
+-- a PK inclui a chave de partição, e as tabelas filhas
+-- referenciam (num_locacao, data_retirada)
 -- ============================================
 CREATE TABLE Aluguel (
-    num_locacao SERIAL PRIMARY KEY,
+    num_locacao SERIAL,
     data_retirada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     data_prevista_devolucao TIMESTAMP NOT NULL,
     valor_previsto NUMERIC(10,2),
@@ -107,24 +126,88 @@ CREATE TABLE Aluguel (
     placa VARCHAR(10) NOT NULL,
     cpf_cliente CHAR(11) NOT NULL,
     seguro_contratado BOOLEAN DEFAULT FALSE,
+    -- dia em que a locação foi registrada (desconto de reserva antecipada)
+    data_reserva DATE NOT NULL DEFAULT CURRENT_DATE,
     num_pagamento INTEGER,
+    -- transação que criou/alterou a linha (exportação incremental, seção 19)
+    xid_alteracao XID8 NOT NULL DEFAULT pg_current_xact_id(),
     
+    PRIMARY KEY (num_locacao, data_retirada),
     FOREIGN KEY (num_pagamento) REFERENCES Pagamento(num_pagamento),
     FOREIGN KEY (num_funcionario) REFERENCES Funcionario(num_funcionario),
     FOREIGN KEY (placa) REFERENCES Carro(placa),
     
     CHECK (valor_previsto IS NULL OR valor_previsto >= 0),
     CHECK (data_prevista_devolucao > data_retirada)
-);
+) PARTITION BY RANGE (data_retirada);
+
+CREATE INDEX idx_aluguel_placa ON Aluguel (placa);
+CREATE INDEX idx_aluguel_cpf_cliente ON Aluguel (cpf_cliente);
+CREATE INDEX idx_aluguel_funcionario ON Aluguel (num_funcionario);
+
+-- Contadores de vendas do funcionário: atualizados na mesma transação de
+-- cada INSERT/UPDATE/DELETE em Aluguel. O UPDATE relativo (x = x + n) trava
+-- a linha do funcionário, então aluguéis simultâneos não perdem incrementos.
+CREATE FUNCTION atualizar_vendas_funcionario() RETURNS trigger AS $$
+BEGIN
+    -- arquivar_alugueis só move a locação de tabela: a venda continua contada
+    IF current_setting('carcompany.arquivando', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE Funcionario
+        SET qnt_vendas = qnt_vendas - 1,
+            valor_total_vendas = valor_total_vendas - COALESCE(OLD.valor_previsto, 0)
+        WHERE num_funcionario = OLD.num_funcionario;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE Funcionario
+        SET qnt_vendas = qnt_vendas + 1,
+            valor_total_vendas = valor_total_vendas + COALESCE(NEW.valor_previsto, 0)
+        WHERE num_funcionario = NEW.num_funcionario;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_aluguel_vendas_funcionario
+AFTER INSERT OR DELETE OR UPDATE OF num_funcionario, valor_previsto ON Aluguel
+FOR EACH ROW EXECUTE FUNCTION atualizar_vendas_funcionario();
+
+-- Recalcula os contadores a partir de Aluguel (de um funcionário ou de todos, se NULL)
+CREATE FUNCTION recontar_vendas_funcionario(p_num_funcionario INTEGER DEFAULT NULL) RETURNS INTEGER AS $$
+DECLARE
+    total INTEGER;
+BEGIN
+    UPDATE Funcionario f
+    SET qnt_vendas = COALESCE(v.qnt, 0),
+        valor_total_vendas = COALESCE(v.valor, 0)
+    FROM Funcionario f2
+    LEFT JOIN (
+        SELECT num_funcionario, COUNT(*) AS qnt, SUM(COALESCE(valor_previsto, 0)) AS valor
+        FROM TodosAlugueis
+        GROUP BY num_funcionario
+    ) v ON v.num_funcionario = f2.num_funcionario
+    WHERE f.num_funcionario = f2.num_funcionario
+      AND (p_num_funcionario IS NULL OR f.num_funcionario = p_num_funcionario);
+
+    GET DIAGNOSTICS total = ROW_COUNT;
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql;
 
 -- ============================================
 -- 9. ALUGUEL_ACESSORIO
 -- ============================================
 CREATE TABLE Aluguel_Acessorio (
     num_locacao INTEGER NOT NULL,
+    data_retirada TIMESTAMP NOT NULL,
     tipo_acessorio VARCHAR(50) NOT NULL,
     PRIMARY KEY (num_locacao, tipo_acessorio),
-    FOREIGN KEY (num_locacao) REFERENCES Aluguel(num_locacao),
+    FOREIGN KEY (num_locacao, data_retirada) REFERENCES Aluguel(num_locacao, data_retirada),
     FOREIGN KEY (tipo_acessorio) REFERENCES Acessorio(tipo)
 );
 
@@ -136,6 +219,8 @@ CREATE TABLE Multa (
     num_pagamento INTEGER NOT NULL,
     tipo_multa VARCHAR(100) NOT NULL,
     valor NUMERIC(10,2) NOT NULL,
+    -- transação que criou/alterou a linha (exportação incremental, seção 19)
+    xid_alteracao XID8 NOT NULL DEFAULT pg_current_xact_id(),
     
     FOREIGN KEY (num_pagamento) REFERENCES Pagamento(num_pagamento),
     CHECK (valor >= 0)
@@ -150,6 +235,8 @@ CREATE TABLE Desconto (
     tipo_desconto VARCHAR(100) NOT NULL,
     valor NUMERIC(10,2) NOT NULL,
     flag_ativo BOOLEAN NOT NULL DEFAULT TRUE,
+    -- transação que criou/alterou a linha (exportação incremental, seção 19)
+    xid_alteracao XID8 NOT NULL DEFAULT pg_current_xact_id(),
     
     FOREIGN KEY (num_pagamento) REFERENCES Pagamento(num_pagamento),
     CHECK (valor >= 0)
@@ -157,32 +244,414 @@ CREATE TABLE Desconto (
 
 -- ============================================
 -- 12. DEVOLUCAO
+-- Particionada como Aluguel (data_retirada da locação), para
+-- que o anti-join Aluguel x Devolucao seja feito partição a partição
 -- ============================================
 CREATE TABLE Devolucao (
-    num_locacao INTEGER PRIMARY KEY,
+    num_locacao INTEGER NOT NULL,
+    data_retirada TIMESTAMP NOT NULL,
     num_pagamento INTEGER NOT NULL,
     data_real_devolucao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     combustivel_completo BOOLEAN NOT NULL,
     estado_carro VARCHAR(200),
+    -- transação que criou/alterou a linha (exportação incremental, seção 19)
+    xid_alteracao XID8 NOT NULL DEFAULT pg_current_xact_id(),
     
-    FOREIGN KEY (num_locacao) REFERENCES Aluguel(num_locacao),
+    PRIMARY KEY (num_locacao, data_retirada),
+    FOREIGN KEY (num_locacao, data_retirada) REFERENCES Aluguel(num_locacao, data_retirada),
     FOREIGN KEY (num_pagamento) REFERENCES Pagamento(num_pagamento)
-);
+) PARTITION BY RANGE (data_retirada);
+
+CREATE INDEX idx_devolucao_pagamento ON Devolucao (num_pagamento);
 
 -- ============================================
 -- 13. HISTORICO ALUGUEL
 -- ============================================
 CREATE TABLE HistoricoAluguel (
-    id_historico SERIAL PRIMARY KEY,
+    id_historico SERIAL,
     num_locacao INTEGER NOT NULL,
+    data_retirada TIMESTAMP NOT NULL,
     cpf CHAR(11) NOT NULL,
     data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
-    FOREIGN KEY (num_locacao) REFERENCES Aluguel(num_locacao),
+    PRIMARY KEY (id_historico, data_retirada),
+    FOREIGN KEY (num_locacao, data_retirada) REFERENCES Aluguel(num_locacao, data_retirada),
     FOREIGN KEY (cpf) REFERENCES Cliente(cpf),
     CHECK (cpf ~ '^[0-9]{11}$')
+) PARTITION BY RANGE (data_retirada);
+
+-- ============================================
+-- 14. EVENTO OUTBOX
+-- Eventos gravados na mesma transação das alterações;
+-- o trigger publica cada um no canal carcompany_eventos
+-- (o NOTIFY só é entregue após o commit)
+-- ============================================
+CREATE TABLE EventoOutbox (
+    id_evento BIGSERIAL PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    chave VARCHAR(50),
+    payload JSONB NOT NULL DEFAULT '{}',
+    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE FUNCTION notificar_evento() RETURNS trigger AS $$
+DECLARE
+    mensagem TEXT;
+BEGIN
+    mensagem := json_build_object(
+        'id_evento', NEW.id_evento,
+        'tipo', NEW.tipo,
+        'chave', NEW.chave,
+        'payload', NEW.payload,
+        'criado_em', NEW.criado_em
+    )::text;
+
+    -- NOTIFY aceita até 8000 bytes; acima disso o ouvinte busca na tabela
+    IF octet_length(mensagem) > 7900 THEN
+        mensagem := json_build_object(
+            'id_evento', NEW.id_evento,
+            'tipo', NEW.tipo,
+            'chave', NEW.chave,
+            'truncado', TRUE
+        )::text;
+    END IF;
+
+    PERFORM pg_notify('carcompany_eventos', mensagem);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_evento_outbox_notify
+AFTER INSERT ON EventoOutbox
+FOR EACH ROW EXECUTE FUNCTION notificar_evento();
+
+-- ============================================
+-- 15. PERFIL CLIENTE
+-- Resumo do histórico usado nos descontos, atualizado
+-- na mesma transação de criar_aluguel/devolver_carro:
+-- bit N da máscara = categoria/acessório com posicao_bit N
+-- ============================================
+CREATE TABLE PerfilCliente (
+    cpf CHAR(11) PRIMARY KEY,
+    total_alugueis INTEGER NOT NULL DEFAULT 0,
+    mascara_categorias BIGINT NOT NULL DEFAULT 0,
+    mascara_acessorios BIGINT NOT NULL DEFAULT 0,
+    sequencia_sem_multas INTEGER NOT NULL DEFAULT 0, -- devoluções seguidas sem multa (mais recentes)
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (cpf) REFERENCES Cliente(cpf) ON DELETE CASCADE,
+    CHECK (total_alugueis >= 0),
+    CHECK (sequencia_sem_multas >= 0)
+);
+
+-- Recalcula o perfil a partir do histórico (de um cliente ou de todos, se NULL)
+CREATE FUNCTION reconstruir_perfil_cliente(p_cpf CHAR(11) DEFAULT NULL) RETURNS INTEGER AS $$
+DECLARE
+    total INTEGER;
+BEGIN
+    DELETE FROM PerfilCliente WHERE p_cpf IS NULL OR cpf = p_cpf;
+
+    INSERT INTO PerfilCliente (cpf, total_alugueis, mascara_categorias, mascara_acessorios, sequencia_sem_multas)
+    SELECT cli.cpf,
+           COALESCE(al.total, 0),
+           COALESCE(al.mascara, 0),
+           COALESCE(ac.mascara, 0),
+           COALESCE(sq.sequencia, 0)
+    FROM Cliente cli
+    LEFT JOIN (
+        SELECT a.cpf_cliente, COUNT(*) AS total, bit_or(1::BIGINT << cat.posicao_bit) AS mascara
+        FROM TodosAlugueis a
+        JOIN Carro car ON car.placa = a.placa
+        JOIN Categoria cat ON cat.tipo = car.tipo_categoria
+        GROUP BY a.cpf_cliente
+    ) al ON al.cpf_cliente = cli.cpf
+    LEFT JOIN (
+        SELECT a.cpf_cliente, bit_or(1::BIGINT << ace.posicao_bit) AS mascara
+        FROM TodosAlugueis a
+        JOIN TodosAlugueisAcessorios aa ON aa.num_locacao = a.num_locacao AND aa.data_retirada = a.data_retirada
+        JOIN Acessorio ace ON ace.tipo = aa.tipo_acessorio
+        GROUP BY a.cpf_cliente
+    ) ac ON ac.cpf_cliente = cli.cpf
+    LEFT JOIN (
+        -- devoluções mais recentes até a última que teve multa
+        SELECT cpf_cliente, COUNT(*) AS sequencia
+        FROM (
+            SELECT a.cpf_cliente,
+                   COUNT(m.num_pagamento) OVER (
+                       PARTITION BY a.cpf_cliente
+                       ORDER BY d.data_real_devolucao DESC, d.num_locacao DESC
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                   ) AS multas_ate_aqui
+            FROM TodasDevolucoes d
+            JOIN TodosAlugueis a ON a.num_locacao = d.num_locacao AND a.data_retirada = d.data_retirada
+            LEFT JOIN (SELECT DISTINCT num_pagamento FROM TodasMultas) m ON m.num_pagamento = d.num_pagamento
+        ) dev
+        WHERE multas_ate_aqui = 0
+        GROUP BY cpf_cliente
+    ) sq ON sq.cpf_cliente = cli.cpf
+    WHERE p_cpf IS NULL OR cli.cpf = p_cpf;
+
+    GET DIAGNOSTICS total = ROW_COUNT;
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================
+-- 16. PARTICIONAMENTO
+-- Aluguel, Devolucao e HistoricoAluguel têm uma partição
+-- por mês de data_retirada, com os mesmos limites nas três
+-- tabelas. A partição padrão só recebe linhas fora dos meses
+-- já criados; as futuras são criadas com antecedência por
+-- "python -m database.particionamento" (na pasta backend)
+-- ============================================
+CREATE TABLE aluguel_padrao PARTITION OF Aluguel DEFAULT;
+CREATE TABLE devolucao_padrao PARTITION OF Devolucao DEFAULT;
+CREATE TABLE historicoaluguel_padrao PARTITION OF HistoricoAluguel DEFAULT;
+
+-- Cria as partições mensais que faltam entre p_inicio e p_fim; retorna quantas criou.
+-- Falha se a partição padrão já tiver linhas do mês (crie os meses antes de usá-los).
+CREATE FUNCTION criar_particoes_aluguel(p_inicio DATE, p_fim DATE) RETURNS INTEGER AS $$
+DECLARE
+    mes DATE := date_trunc('month', p_inicio)::date;
+    tabela TEXT;
+    particao TEXT;
+    criadas INTEGER := 0;
+BEGIN
+    WHILE mes <= p_fim LOOP
+        FOREACH tabela IN ARRAY ARRAY['aluguel', 'devolucao', 'historicoaluguel'] LOOP
+            particao := tabela || '_' || to_char(mes, 'YYYY_MM');
+            IF to_regclass(particao) IS NULL THEN
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                               particao, tabela, mes, (mes + INTERVAL '1 month')::date);
+                criadas := criadas + 1;
+            END IF;
+        END LOOP;
+        mes := (mes + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN criadas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- meses da carga inicial até três meses à frente
+SELECT criar_particoes_aluguel('2024-01-01', (CURRENT_DATE + INTERVAL '3 months')::date);
+
+-- ============================================
+-- 17. ARQUIVO (schema aluguel_arquivo)
+-- Locações devolvidas há muito tempo saem das tabelas
+-- quentes (e dos índices usados nas verificações de
+-- locação aberta) para tabelas de arquivo, com o mesmo
+-- formato e sem FKs. As views Todos*/Todas* juntam as
+-- duas partes para o histórico e os relatórios
+-- ============================================
+CREATE TABLE aluguel_arquivo.Pagamento (LIKE Pagamento, PRIMARY KEY (num_pagamento));
+CREATE TABLE aluguel_arquivo.Aluguel (LIKE Aluguel, PRIMARY KEY (num_locacao, data_retirada));
+CREATE TABLE aluguel_arquivo.Aluguel_Acessorio (LIKE Aluguel_Acessorio, PRIMARY KEY (num_locacao, tipo_acessorio));
+CREATE TABLE aluguel_arquivo.Multa (LIKE Multa, PRIMARY KEY (id_multa));
+CREATE TABLE aluguel_arquivo.Desconto (LIKE Desconto, PRIMARY KEY (id_desconto));
+CREATE TABLE aluguel_arquivo.Devolucao (LIKE Devolucao, PRIMARY KEY (num_locacao, data_retirada));
+CREATE TABLE aluguel_arquivo.HistoricoAluguel (LIKE HistoricoAluguel, PRIMARY KEY (id_historico, data_retirada));
+
+-- consultas de histórico são por cliente/funcionário/pagamento
+CREATE INDEX idx_arquivo_aluguel_cpf ON aluguel_arquivo.Aluguel (cpf_cliente);
+CREATE INDEX idx_arquivo_aluguel_funcionario ON aluguel_arquivo.Aluguel (num_funcionario);
+CREATE INDEX idx_arquivo_aluguel_placa ON aluguel_arquivo.Aluguel (placa);
+CREATE INDEX idx_arquivo_multa_pagamento ON aluguel_arquivo.Multa (num_pagamento);
+CREATE INDEX idx_arquivo_desconto_pagamento ON aluguel_arquivo.Desconto (num_pagamento);
+CREATE INDEX idx_arquivo_devolucao_pagamento ON aluguel_arquivo.Devolucao (num_pagamento);
+
+CREATE VIEW TodosAlugueis AS
+    SELECT * FROM Aluguel UNION ALL SELECT * FROM aluguel_arquivo.Aluguel;
+CREATE VIEW TodosAlugueisAcessorios AS
+    SELECT * FROM Aluguel_Acessorio UNION ALL SELECT * FROM aluguel_arquivo.Aluguel_Acessorio;
+CREATE VIEW TodasDevolucoes AS
+    SELECT * FROM Devolucao UNION ALL SELECT * FROM aluguel_arquivo.Devolucao;
+CREATE VIEW TodosPagamentos AS
+    SELECT * FROM Pagamento UNION ALL SELECT * FROM aluguel_arquivo.Pagamento;
+CREATE VIEW TodasMultas AS
+    SELECT * FROM Multa UNION ALL SELECT * FROM aluguel_arquivo.Multa;
+CREATE VIEW TodosDescontos AS
+    SELECT * FROM Desconto UNION ALL SELECT * FROM aluguel_arquivo.Desconto;
+
+-- Move até p_limite locações devolvidas com retirada anterior a p_antes (com
+-- devolução, pagamento, multas, descontos, acessórios e histórico) para o
+-- arquivo. Cada chamada é um lote; retorna quantas locações moveu.
+CREATE FUNCTION arquivar_alugueis(p_antes TIMESTAMP, p_limite INTEGER DEFAULT 1000) RETURNS INTEGER AS $$
+DECLARE
+    total INTEGER;
+BEGIN
+    -- o trigger de vendas ignora os DELETEs deste bloco
+    PERFORM set_config('carcompany.arquivando', 'on', TRUE);
+
+    CREATE TEMP TABLE lote_arquivo ON COMMIT DROP AS
+    SELECT a.num_locacao, a.data_retirada, d.num_pagamento AS pagamento_devolucao,
+           a.num_pagamento AS pagamento_aluguel
+    FROM Aluguel a
+    JOIN Devolucao d ON d.num_locacao = a.num_locacao AND d.data_retirada = a.data_retirada
+    WHERE a.data_retirada < p_antes
+    ORDER BY a.data_retirada
+    LIMIT p_limite
+    FOR UPDATE OF a SKIP LOCKED;
+
+    GET DIAGNOSTICS total = ROW_COUNT;
+    IF total > 0 THEN
+        CREATE TEMP TABLE lote_pagamentos ON COMMIT DROP AS
+        SELECT pagamento_devolucao AS num_pagamento FROM lote_arquivo
+        UNION
+        SELECT pagamento_aluguel FROM lote_arquivo WHERE pagamento_aluguel IS NOT NULL;
+
+        WITH movidas AS (
+            DELETE FROM Multa WHERE num_pagamento IN (SELECT num_pagamento FROM lote_pagamentos)
+            RETURNING *
+        ) INSERT INTO aluguel_arquivo.Multa SELECT * FROM movidas;
+
+        WITH movidos AS (
+            DELETE FROM Desconto WHERE num_pagamento IN (SELECT num_pagamento FROM lote_pagamentos)
+            RETURNING *
+        ) INSERT INTO aluguel_arquivo.Desconto SELECT * FROM movidos;
+
+        WITH movidos AS (
+            DELETE FROM Aluguel_Acessorio t USING lote_arquivo l
+            WHERE t.num_locacao = l.num_locacao AND t.data_retirada = l.data_retirada
+            RETURNING t.*
+        ) INSERT INTO aluguel_arquivo.Aluguel_Acessorio SELECT * FROM movidos;
+
+        WITH movidos AS (
+            DELETE FROM HistoricoAluguel t USING lote_arquivo l
+            WHERE t.num_locacao = l.num_locacao AND t.data_retirada = l.data_retirada
+            RETURNING t.*
+        ) INSERT INTO aluguel_arquivo.HistoricoAluguel SELECT * FROM movidos;
+
+        WITH movidas AS (
+            DELETE FROM Devolucao t USING lote_arquivo l
+            WHERE t.num_locacao = l.num_locacao AND t.data_retirada = l.data_retirada
+            RETURNING t.*
+        ) INSERT INTO aluguel_arquivo.Devolucao SELECT * FROM movidas;
+
+        WITH movidos AS (
+            DELETE FROM Aluguel t USING lote_arquivo l
+            WHERE t.num_locacao = l.num_locacao AND t.data_retirada = l.data_retirada
+            RETURNING t.*
+        ) INSERT INTO aluguel_arquivo.Aluguel SELECT * FROM movidos;
+
+        WITH movidos AS (
+            DELETE FROM Pagamento WHERE num_pagamento IN (SELECT num_pagamento FROM lote_pagamentos)
+            RETURNING *
+        ) INSERT INTO aluguel_arquivo.Pagamento SELECT * FROM movidos;
+
+        DROP TABLE lote_pagamentos;
+    END IF;
+
+    DROP TABLE lote_arquivo;
+    PERFORM set_config('carcompany.arquivando', 'off', TRUE);
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================
+-- 18. ALUGUEL ABERTO
+-- Uma linha por locação ainda sem devolução, mantida pelos
+-- triggers de Aluguel (abre) e Devolucao (fecha). "O carro /
+-- o cliente está com locação em andamento?" vira busca por
+-- índice numa tabela do tamanho da frota alugada, e o UNIQUE
+-- em placa impede duas locações abertas do mesmo carro
+-- mesmo com requisições simultâneas
+-- ============================================
+CREATE TABLE AluguelAberto (
+    num_locacao INTEGER PRIMARY KEY,
+    data_retirada TIMESTAMP NOT NULL,
+    placa VARCHAR(10) NOT NULL,
+    cpf_cliente CHAR(11) NOT NULL,
+
+    CONSTRAINT uq_aluguel_aberto_placa UNIQUE (placa),
+    FOREIGN KEY (num_locacao, data_retirada)
+        REFERENCES Aluguel(num_locacao, data_retirada) ON DELETE CASCADE
 );
 
+CREATE INDEX idx_aluguel_aberto_cpf ON AluguelAberto (cpf_cliente);
+
+CREATE FUNCTION abrir_aluguel() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO AluguelAberto (num_locacao, data_retirada, placa, cpf_cliente)
+    VALUES (NEW.num_locacao, NEW.data_retirada, NEW.placa, NEW.cpf_cliente);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_aluguel_aberto
+AFTER INSERT ON Aluguel
+FOR EACH ROW EXECUTE FUNCTION abrir_aluguel();
+
+CREATE FUNCTION fechar_aluguel() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM AluguelAberto WHERE num_locacao = NEW.num_locacao;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_devolucao_fecha_aluguel
+AFTER INSERT ON Devolucao
+FOR EACH ROW EXECUTE FUNCTION fechar_aluguel();
+
+-- Refaz AluguelAberto a partir de Aluguel x Devolucao; retorna quantas locações estão abertas
+CREATE FUNCTION reconstruir_alugueis_abertos() RETURNS INTEGER AS $$
+DECLARE
+    total INTEGER;
+BEGIN
+    DELETE FROM AluguelAberto;
+
+    INSERT INTO AluguelAberto (num_locacao, data_retirada, placa, cpf_cliente)
+    SELECT a.num_locacao, a.data_retirada, a.placa, a.cpf_cliente
+    FROM Aluguel a
+    LEFT JOIN Devolucao d ON d.num_locacao = a.num_locacao AND d.data_retirada = a.data_retirada
+    WHERE d.num_locacao IS NULL;
+
+    GET DIAGNOSTICS total = ROW_COUNT;
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================
+-- 19. EXPORTAÇÃO INCREMENTAL
+-- Aluguel, Devolucao, Pagamento, Multa e Desconto guardam em
+-- xid_alteracao a transação que criou (DEFAULT) ou alterou
+-- (trigger) cada linha. A exportação devolve as linhas com
+-- xid_alteracao >= marca e a nova marca é o xmin do snapshot
+-- da consulta: toda transação abaixo dele já terminou, então
+-- uma transação longa que commita depois não fica para trás
+-- (no pior caso a linha vem de novo na exportação seguinte).
+-- O arquivamento copia a coluna sem mudar, então não conta
+-- como alteração
+-- ============================================
+CREATE FUNCTION marcar_alteracao() RETURNS trigger AS $$
+BEGIN
+    NEW.xid_alteracao := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_aluguel_alteracao BEFORE UPDATE ON Aluguel
+FOR EACH ROW EXECUTE FUNCTION marcar_alteracao();
+CREATE TRIGGER trg_devolucao_alteracao BEFORE UPDATE ON Devolucao
+FOR EACH ROW EXECUTE FUNCTION marcar_alteracao();
+CREATE TRIGGER trg_pagamento_alteracao BEFORE UPDATE ON Pagamento
+FOR EACH ROW EXECUTE FUNCTION marcar_alteracao();
+CREATE TRIGGER trg_multa_alteracao BEFORE UPDATE ON Multa
+FOR EACH ROW EXECUTE FUNCTION marcar_alteracao();
+CREATE TRIGGER trg_desconto_alteracao BEFORE UPDATE ON Desconto
+FOR EACH ROW EXECUTE FUNCTION marcar_alteracao();
+
+CREATE INDEX idx_aluguel_xid_alteracao ON Aluguel (xid_alteracao);
+CREATE INDEX idx_devolucao_xid_alteracao ON Devolucao (xid_alteracao);
+CREATE INDEX idx_pagamento_xid_alteracao ON Pagamento (xid_alteracao);
+CREATE INDEX idx_multa_xid_alteracao ON Multa (xid_alteracao);
+CREATE INDEX idx_desconto_xid_alteracao ON Desconto (xid_alteracao);
+-- a exportação lê as views com o arquivo
+CREATE INDEX idx_arquivo_aluguel_xid_alteracao ON aluguel_arquivo.Aluguel (xid_alteracao);
+CREATE INDEX idx_arquivo_devolucao_xid_alteracao ON aluguel_arquivo.Devolucao (xid_alteracao);
+CREATE INDEX idx_arquivo_pagamento_xid_alteracao ON aluguel_arquivo.Pagamento (xid_alteracao);
+CREATE INDEX idx_arquivo_multa_xid_alteracao ON aluguel_arquivo.Multa (xid_alteracao);
+CREATE INDEX idx_arquivo_desconto_xid_alteracao ON aluguel_arquivo.Desconto (xid_alteracao);
+
 SET search_path TO aluguel;
 
 -- ============================================
@@ -343,6 +812,11 @@ INSERT INTO Manutencao (placa_carro, custo, data_inicio, data_retorno, descricao
 ('LUX0004', 0.00, CURRENT_DATE, NULL, 'Em Andamento - Suspensão'), -- Manutenção Atual
 ('LUX0005', 750.00, '2024-05-05', '2024-05-08', 'Revisão Geral');
 
+-- Liga cada carro à sua manutenção em andamento
+UPDATE Carro c SET num_manutencao = m.num_manutencao
+FROM Manutencao m
+WHERE m.placa_carro = c.placa AND m.data_retorno IS NULL;
+
 -- ============================================
 -- 7. ALUGUEL (25 Registros)
 -- IDs 1 a 20: Aluguéis Passados (Finalizados)
@@ -350,6 +824,10 @@ INSERT INTO Manutencao (placa_carro, custo, data_inicio, data_retorno, descricao
 -- ============================================
 
 -- Aluguéis Finalizados (Passados)
+-- (carga do histórico: os mesmos carros aparecem em várias locações
+-- já devolvidas, então elas não passam por AluguelAberto)
+ALTER TABLE Aluguel DISABLE TRIGGER trg_aluguel_aberto;
+
 INSERT INTO Aluguel (data_retirada, data_prevista_devolucao, valor_previsto, num_funcionario, placa, cpf_cliente, seguro_contratado) VALUES
 ('2024-01-01 10:00', '2024-01-05 10:00', 500.00, 1, 'ECO0001', '11111111101', TRUE),
 ('2024-02-01 10:00', '2024-02-03 10:00', 200.00, 2, 'ECO0002', '11111111102', FALSE),
@@ -372,6 +850,8 @@ INSERT INTO Aluguel (data_retirada, data_prevista_devolucao, valor_previsto, num
 ('2024-07-15 10:00', '2024-07-20 10:00', 500.00, 19, 'ECO0001', '11111111119', TRUE), -- Reuso de carro
 ('2024-08-15 10:00', '2024-08-18 10:00', 300.00, 20, 'ECO0002', '11111111120', FALSE);
 
+ALTER TABLE Aluguel ENABLE TRIGGER trg_aluguel_aberto;
+
 -- Aluguéis EM ABERTO (Carros marcados como ALUGADO acima)
 -- Data retirada = Hoje ou ontem
 INSERT INTO Aluguel (data_retirada, data_prevista_devolucao, valor_previsto, num_funcionario, placa, cpf_cliente, seguro_contratado) VALUES
@@ -409,7 +889,9 @@ INSERT INTO Pagamento (valor_total, forma_pagamento) VALUES
 -- ============================================
 -- 9. DEVOLUCAO (20 Registros - Finalizados)
 -- ============================================
-INSERT INTO Devolucao (num_locacao, num_pagamento, combustivel_completo, estado_carro, data_real_devolucao) VALUES
+INSERT INTO Devolucao (num_locacao, data_retirada, num_pagamento, combustivel_completo, estado_carro, data_real_devolucao)
+SELECT v.num_locacao, a.data_retirada, v.num_pagamento, v.combustivel_completo, v.estado_carro, v.data_real_devolucao::timestamp
+FROM (VALUES
 (1, 1, TRUE, 'OK', '2024-01-05 10:00'),
 (2, 2, TRUE, 'OK', '2024-02-03 10:00'),
 (3, 3, TRUE, 'OK', '2024-03-05 10:00'),
@@ -429,7 +911,9 @@ INSERT INTO Devolucao (num_locacao, num_pagamento, combustivel_completo, estado_
 (17, 17, TRUE, 'OK', '2024-05-20 10:00'),
 (18, 18, TRUE, 'OK', '2024-06-17 10:00'),
 (19, 19, TRUE, 'MANUTENCAO', '2024-07-20 10:00'), -- Avaria (Gera Multa)
-(20, 20, TRUE, 'OK', '2024-08-18 10:00');
+(20, 20, TRUE, 'OK', '2024-08-18 10:00')
+) v (num_locacao, num_pagamento, combustivel_completo, estado_carro, data_real_devolucao)
+JOIN Aluguel a ON a.num_locacao = v.num_locacao;
 
 -- ============================================
 -- 10. MULTA (Associada a Pagamentos)
@@ -448,7 +932,9 @@ INSERT INTO Desconto (num_pagamento, tipo_desconto, valor, flag_ativo) VALUES
 -- ============================================
 -- 12. ALUGUEL_ACESSORIO (Mix aleatório)
 -- ============================================
-INSERT INTO Aluguel_Acessorio (num_locacao, tipo_acessorio) VALUES
+INSERT INTO Aluguel_Acessorio (num_locacao, data_retirada, tipo_acessorio)
+SELECT v.num_locacao, a.data_retirada, v.tipo_acessorio
+FROM (VALUES
 (1, 'GPS'),
 (1, 'Cadeirinha'), -- Locação 1 levou 2 itens
 (3, 'GPS'),
@@ -460,10 +946,20 @@ INSERT INTO Aluguel_Acessorio (num_locacao, tipo_acessorio) VALUES
 (15, 'GPS'),
 (17, 'Condutor Adicional'),
 (21, 'GPS'),       -- Locação Aberta com acessorio
-(22, 'Cadeirinha');
+(22, 'Cadeirinha')
+) v (num_locacao, tipo_acessorio)
+JOIN Aluguel a ON a.num_locacao = v.num_locacao;
 
 -- ============================================
 -- 13. HISTORICO ALUGUEL (Espelho dos Alugueis)
 -- ============================================
-INSERT INTO HistoricoAluguel (num_locacao, cpf) 
-SELECT num_locacao, cpf_cliente FROM Aluguel;
+INSERT INTO HistoricoAluguel (num_locacao, data_retirada, cpf) 
+SELECT num_locacao, data_retirada, cpf_cliente FROM Aluguel;
+
+-- ============================================
+-- 14. PERFIL CLIENTE (calculado a partir do histórico acima)
+-- ============================================
+SELECT reconstruir_perfil_cliente();
+
+-- a carga inicial de Funcionario traz contadores fictícios: recalcula pelos aluguéis
+SELECT recontar_vendas_funcionario();
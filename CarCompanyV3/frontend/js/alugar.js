@@ -7,54 +7,67 @@ class AluguelForm {
 
     async init() {
         try {
-            await this.carregarFuncionarios();
-            await this.carregarCarrosDisponiveis();
+            await this.carregarDadosTela();
             this.configurarEventos();
+            this.acompanharFrota();
         } catch (error) {
             console.error('Erro na inicialização:', error);
             showError('Erro ao carregar dados iniciais.');
         }
     }
 
-    async carregarFuncionarios() {
-        const selectFunc = document.getElementById('func');
+    async carregarDadosTela() {
+        // funcionários e carros disponíveis numa única requisição
         try {
-            const funcData = await apiFetch('/funcionarios');
-            const funcionarios = funcData.funcionarios || [];
-            
-            selectFunc.innerHTML = '<option value="">Selecione o funcionário...</option>';
-            
-            funcionarios.forEach(f => {
-                const opt = document.createElement('option');
-                opt.value = f.num_funcionario;
-                opt.textContent = `${f.nome} (ID: ${f.num_funcionario})`;
-                selectFunc.appendChild(opt);
-            });
+            const dados = await apiFetch('/views/alugar');
+            this.preencherFuncionarios(dados.funcionarios || []);
+            this.preencherCarros(dados.carros || []);
         } catch (error) {
-            console.error('Erro ao carregar funcionários:', error);
-            selectFunc.innerHTML = '<option value="">Erro ao carregar funcionários</option>';
+            console.error('Erro ao carregar dados da tela:', error);
+            document.getElementById('func').innerHTML = '<option value="">Erro ao carregar funcionários</option>';
+            document.getElementById('carro').innerHTML = '<option value="">Erro ao carregar carros</option>';
         }
     }
 
-    async carregarCarrosDisponiveis() {
+    preencherFuncionarios(funcionarios) {
+        const selectFunc = document.getElementById('func');
+        const selecionado = selectFunc.value;
+        selectFunc.innerHTML = '<option value="">Selecione o funcionário...</option>';
+
+        funcionarios.forEach(f => {
+            const opt = document.createElement('option');
+            opt.value = f.num_funcionario;
+            opt.textContent = `${f.nome} (ID: ${f.num_funcionario})`;
+            selectFunc.appendChild(opt);
+        });
+        // mantém a escolha ao recarregar pelo feed de eventos
+        selectFunc.value = selecionado;
+    }
+
+    preencherCarros(carros) {
         const selectCarro = document.getElementById('carro');
-        try {
-            const carrosData = await apiFetch('/carros/disponiveis');
-            const carros = carrosData.carros || [];
-            
-            selectCarro.innerHTML = '<option value="">Selecione o carro...</option>';
-            
-            carros.forEach(c => {
-                const opt = document.createElement('option');
-                opt.value = c.placa;
-                opt.textContent = `${c.nome} - ${c.tipo_categoria} (${formatCurrency(c.preco)}/dia)`;
-                opt.dataset.preco = c.preco;
-                selectCarro.appendChild(opt);
+        selectCarro.innerHTML = '<option value="">Selecione o carro...</option>';
+
+        carros.forEach(c => {
+            const opt = document.createElement('option');
+            opt.value = c.placa;
+            opt.textContent = `${c.nome} - ${c.tipo_categoria} (${formatCurrency(c.preco)}/dia)`;
+            opt.dataset.preco = c.preco;
+            selectCarro.appendChild(opt);
+        });
+    }
+
+    acompanharFrota() {
+        // Recarrega os carros disponíveis quando o status da frota mudar (SSE)
+        if (!window.EventSource) return;
+        const feed = new EventSource(`${API_URL}/eventos/stream`);
+        const tipos = ['ALUGUEL_CRIADO', 'ALUGUEL_DEVOLVIDO', 'CARRO_STATUS_ALTERADO', 'MANUTENCAO_CRIADA'];
+        tipos.forEach(tipo => {
+            feed.addEventListener(tipo, () => {
+                // não troca a lista se o usuário já escolheu um carro
+                if (!document.getElementById('carro').value) this.carregarDadosTela();
             });
-        } catch (error) {
-            console.error('Erro ao carregar carros:', error);
-            selectCarro.innerHTML = '<option value="">Erro ao carregar carros</option>';
-        }
+        });
     }
 
     configurarEventos() {
@@ -74,17 +87,50 @@ class AluguelForm {
         this.form.addEventListener('submit', (e) => this.enviarFormulario(e));
     }
 
-    calcularValorPrevisto() {
+    async calcularValorPrevisto() {
         const carroSelect = document.getElementById('carro');
         const dataRetirada = document.getElementById('data-retirada').value;
         const dataDevolucao = document.getElementById('data-devolucao').value;
         const seguro = document.getElementById('seguro').checked;
 
+        this.valorPrevisto = 0;
         if (!carroSelect.value || !dataRetirada || !dataDevolucao) {
             document.getElementById('valor-previsto').textContent = 'R$ 0,00';
             return;
         }
 
+        // uma cotação (/cotacao) por período e seguro; trocar de carro só consulta o mapa
+        const chave = `${dataRetirada}|${dataDevolucao}|${seguro}`;
+        if (this.chaveCotacao !== chave) {
+            this.chaveCotacao = chave;
+            this.cotacoes = null;
+            try {
+                const params = new URLSearchParams({
+                    data_retirada: dataRetirada,
+                    data_prevista_devolucao: dataDevolucao,
+                    seguro: seguro
+                });
+                const resposta = await apiFetch(`/cotacao?${params}`);
+                if (this.chaveCotacao !== chave) return; // chegou uma mudança mais nova
+                this.cotacoes = {};
+                resposta.periodos[0].cotacoes.forEach(c => { this.cotacoes[c.placa] = c; });
+            } catch (error) {
+                console.error('Erro ao buscar cotação, calculando localmente:', error);
+            }
+        }
+
+        const cotacao = this.cotacoes && this.cotacoes[carroSelect.value];
+        if (cotacao) {
+            // valor_previsto continua sem descontos (são aplicados na devolução)
+            this.valorPrevisto = cotacao.valor_base + cotacao.valor_seguro + cotacao.valor_acessorios;
+            let texto = formatCurrency(this.valorPrevisto);
+            if (cotacao.descontos > 0) {
+                texto += ` (${formatCurrency(cotacao.total)} com descontos, se devolvido no prazo)`;
+            }
+            document.getElementById('valor-previsto').textContent = texto;
+            return;
+        }
+
         const precoDiaria = parseFloat(carroSelect.options[carroSelect.selectedIndex].dataset.preco || 0);
         
         // Calcular dias
@@ -97,6 +143,7 @@ class AluguelForm {
             valor *= 1.2; // +20% para seguro
         }
 
+        this.valorPrevisto = valor;
         document.getElementById('valor-previsto').textContent = formatCurrency(valor);
     }
 
@@ -110,7 +157,7 @@ class AluguelForm {
             data_retirada: document.getElementById('data-retirada').value,
             data_prevista_devolucao: document.getElementById('data-devolucao').value,
             seguro_contratado: document.getElementById('seguro').checked,
-            valor_previsto: document.getElementById('valor-previsto').textContent
+            valor_previsto: this.valorPrevisto || 0
         };
 
         // Validações
@@ -15,7 +15,11 @@ async function carregarCarro() {
             throw new Error(carro.erro || "Erro ao carregar carro");
         }
 
-        document.getElementById("carro-imagem").src = `images/${carro.imagem}`;
+        // variante "detalhe" (WebP é aceito por todos os navegadores atuais)
+        const detalhe = carro.imagens && carro.imagens.detalhe;
+        document.getElementById("carro-imagem").src = detalhe
+            ? (detalhe.webp || detalhe.jpeg)
+            : `images/${carro.imagem}`;
         document.getElementById("carro-imagem").alt = carro.nome;
         document.getElementById("carro-nome").textContent = carro.nome;
         document.getElementById("carro-descricao").textContent = carro.tipo_categoria;
@@ -10,6 +10,18 @@ async function carregarCarros() {
     const container = document.getElementById("lista-carros");
     container.innerHTML = "";
 
+    // <picture> com as variantes do servidor (AVIF/WebP e JPEG de reserva);
+    // sem variantes usa a imagem original
+    function imagemCarro(carro) {
+        const card = carro.imagens && carro.imagens.card;
+        if (!card) return `<img src="images/${carro.imagem}" alt="${carro.nome}">`;
+        const fontes = [["avif", "image/avif"], ["webp", "image/webp"]]
+            .filter(([formato]) => card[formato])
+            .map(([formato, tipo]) => `<source srcset="${card[formato]}" type="${tipo}">`)
+            .join("");
+        return `<picture>${fontes}<img src="${card.jpeg}" alt="${carro.nome}" loading="lazy"></picture>`;
+    }
+
     carros.forEach(carro => {
         const card = document.createElement("div");
         card.classList.add("col-md-4", "col-sm-6", "car-card");
@@ -17,7 +29,7 @@ async function carregarCarros() {
         card.innerHTML = `
             <a href="carro.html?placa=${carro.placa}" class="car-link">
                 <div class="car-box">
-                    <img src="images/${carro.imagem}" alt="${carro.nome}">
+                    ${imagemCarro(carro)}
                     <h3>${carro.nome}</h3>
                     <p>${carro.descricao}</p>
                     <span class="price">
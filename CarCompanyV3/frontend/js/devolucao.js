@@ -30,9 +30,9 @@ async function carregarOpcoes() {
         });
     } else console.warn("selectCombustivel não encontrado no DOM");
 
-    // 🔹 3. Buscar LOCAÇÕES abertas no backend
+    // 🔹 3. Buscar LOCAÇÕES abertas (já com os detalhes usados no cálculo)
     try {
-        const response = await fetch("http://127.0.0.1:5000/locacoes-abertas");
+        const response = await fetch("http://127.0.0.1:5000/views/devolucao");
         if (!response.ok) throw new Error("Resposta não-OK ao buscar locações");
         const data = await response.json();
         const locacoes = data.locacoes || [];
@@ -54,7 +54,7 @@ async function carregarOpcoes() {
             if (loc.valor_previsto) option.dataset.valorPrevisto = String(loc.valor_previsto);
             if (loc.data_prevista_devolucao) option.dataset.dataPrevista = loc.data_prevista_devolucao;
 
-            option.dataset.precoDiaria = loc.preco_diaria;   // ADICIONADO ❤️
+            option.dataset.precoDiaria = String(loc.preco_diaria ?? 0);
 
             selectLocacao.appendChild(option);
 });
@@ -69,6 +69,18 @@ async function carregarOpcoes() {
 
 carregarOpcoes();
 
+// 🔹 Atualiza a lista de locações abertas quando o backend avisar (SSE)
+if (window.EventSource) {
+    const feed = new EventSource("http://127.0.0.1:5000/eventos/stream");
+    ["ALUGUEL_CRIADO", "ALUGUEL_DEVOLVIDO"].forEach(tipo => {
+        feed.addEventListener(tipo, () => {
+            const selectLocacao = document.getElementById("selectLocacao");
+            // não recarrega no meio de uma seleção
+            if (selectLocacao && !selectLocacao.value) carregarOpcoes();
+        });
+    });
+}
+
 
 // ---------------- Envio de devolução ----------------
 // ---------------- Envio de devolução (corrigido) ----------------
@@ -135,7 +147,7 @@ if (form) {
 // ---------------- Ao trocar de locação ----------------
 const selectLocacaoEl = document.getElementById("selectLocacao");
 if (selectLocacaoEl) {
-    selectLocacaoEl.addEventListener("change", async function () {
+    selectLocacaoEl.addEventListener("change", function () {
         const numLocacao = this.value;
 
         // limpa campos visuais
@@ -147,39 +159,13 @@ if (selectLocacaoEl) {
 
         if (!numLocacao) return;
 
-        try {
-            // Buscamos os detalhes completos da locação (contendo preco_diaria, valor_previsto e data_prevista_devolucao)
-            const resp = await fetch(`http://127.0.0.1:5000/aluguel/${numLocacao}/detalhes`);
-            if (!resp.ok) throw new Error("Erro ao buscar detalhes da locação");
-            const dados = await resp.json();
-
-            // pega a option correspondente
-            const selectedOption = selectLocacaoEl.querySelector(`option[value="${numLocacao}"]`);
-            if (selectedOption) {
-                // salva no dataset: precoDiaria e valorPrevisto (strings)
-                selectedOption.dataset.precoDiaria = String(dados.preco_diaria ?? dados.precoDiaria ?? 0);
-                selectedOption.dataset.valorPrevisto = String(dados.valor_previsto ?? dados.valorPrevisto ?? 0);
-                selectedOption.dataset.diasPrevistos = String(dados.dias_previstos ?? dados.diasPrevistos ?? "");
-            }
+        // os detalhes (preco_diaria, valor_previsto e data_prevista_devolucao)
+        // já vieram junto com a lista em /views/devolucao
+        const selectedOption = this.selectedOptions[0];
+        if (dataPrevInput) dataPrevInput.value = selectedOption?.dataset.dataPrevista || "";
 
-            // preenche data prevista no campo (se disponível)
-            if (dados.data_prevista_devolucao) {
-                // Se seu backend retornar no formato YYYY-MM-DD, tudo certo.
-                if (dataPrevInput) dataPrevInput.value = dados.data_prevista_devolucao;
-            } else {
-                if (dataPrevInput) dataPrevInput.value = "";
-            }
-
-            // DEBUG - opcional, para ver o que chegou
-            console.log("detalhes locacao:", dados);
-            console.log("dataset option agora:", selectedOption?.dataset);
-
-            // recalcula com os dados novos
-            calcularValorFinal();
-        } catch (err) {
-            console.error("Erro ao buscar detalhes do aluguel:", err);
-            if (dataPrevInput) dataPrevInput.value = "";
-        }
+        // recalcula com os dados da locação escolhida
+        calcularValorFinal();
     });
 } else {
     console.warn("selectLocacao não encontrado — não será possível escolher locações.");
@@ -259,6 +245,8 @@ document.getElementById("btnGerarPagamento").addEventListener("click", async ()
         }
 
         document.getElementById("qrcodeImagem").src = data.qr_code_url;
+        const copiaCola = document.getElementById("pixCopiaCola");
+        if (copiaCola) copiaCola.value = data.pix_copia_e_cola || "";
         document.getElementById("areaQrcode").style.display = "block";
 
     } catch (err) {
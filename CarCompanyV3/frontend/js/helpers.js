@@ -1,5 +1,9 @@
 // js/helpers.js - CORRIGIDO
 const API_URL = "http://127.0.0.1:5000";
+// posição do WAL da última escrita (read-your-writes): o backend devolve no
+// cabeçalho e quer de volta nas próximas leituras, que ficam no principal
+// até a réplica alcançar. O cookie não vai em requisições entre origens.
+const CABECALHO_LSN = "X-Carcompany-LSN";
 
 async function apiFetch(path, options = {}) {
     const url = `${API_URL}${path}`;
@@ -8,6 +12,10 @@ async function apiFetch(path, options = {}) {
         credentials: "same-origin",
         ...options
     };
+    const lsn = sessionStorage.getItem(CABECALHO_LSN);
+    if (lsn) {
+        opts.headers = { ...opts.headers, [CABECALHO_LSN]: lsn };
+    }
     
     if (opts.body && typeof opts.body !== "string") {
         opts.body = JSON.stringify(opts.body);
@@ -15,6 +23,10 @@ async function apiFetch(path, options = {}) {
     
     try {
         const res = await fetch(url, opts);
+        const novoLsn = res.headers.get(CABECALHO_LSN);
+        if (novoLsn) {
+            sessionStorage.setItem(CABECALHO_LSN, novoLsn);
+        }
         let payload = null;
         
         // Tentar parsear JSON apenas se houver conteúdo
@@ -54,9 +54,12 @@ document.addEventListener("DOMContentLoaded", () => {
   const BASE_URL = "http://127.0.0.1:5000";
 ; // ex: "http://127.0.0.1:5000" caso necessário
 
-  function formatFilename(min, max) {
+  // formato do arquivo (csv, parquet ou arrow); sem o select usa CSV
+  const selectFormato = form.querySelector("#formato-relatorio");
+
+  function formatFilename(min, max, formato) {
     const a = (s) => s ? s.replaceAll("-", "") : "";
-    return `vendas_${a(min)}_${a(max)}.csv`;
+    return `vendas_${a(min)}_${a(max)}.${formato || "csv"}`;
   }
 
   async function gerarRelatorio() {
@@ -68,6 +71,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
     const dataMin = inputMin.value;
     const dataMax = inputMax.value;
+    const formato = selectFormato ? selectFormato.value : "csv";
 
     if (!dataMin || !dataMax) {
       alert("Por favor selecione data mínima e máxima.");
@@ -85,15 +89,15 @@ document.addEventListener("DOMContentLoaded", () => {
     const endpoint = `${BASE_URL}/relatorios/vendas`.replace(/([^:]\/)\/+/g, "$1");
 
     try {
-      console.log("Enviando requisição para:", endpoint, { data_min: dataMin, data_max: dataMax });
+      console.log("Enviando requisição para:", endpoint, { data_min: dataMin, data_max: dataMax, formato });
 
       const resp = await fetch(endpoint, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
-          "Accept": "text/csv, application/json"
+          "Accept": "text/csv, application/vnd.apache.parquet, application/vnd.apache.arrow.file, application/json"
         },
-        body: JSON.stringify({ data_min: dataMin, data_max: dataMax })
+        body: JSON.stringify({ data_min: dataMin, data_max: dataMax, formato })
       });
 
       console.log("Resposta:", resp.status, resp.statusText);
@@ -108,13 +112,13 @@ document.addEventListener("DOMContentLoaded", () => {
       }
 
       const contentType = resp.headers.get("Content-Type") || "";
-      if (contentType.includes("text/csv") || contentType.includes("application/octet-stream")) {
+      if (contentType.includes("text/csv") || contentType.includes("application/vnd.apache") || contentType.includes("application/octet-stream")) {
         const blob = await resp.blob();
         const cd = resp.headers.get("Content-Disposition") || "";
         let filename = "";
         const m = cd.match(/filename\*=UTF-8''(.+)|filename="?(.*?)"?(;|$)/);
         if (m) filename = decodeURIComponent(m[1] || m[2]);
-        if (!filename) filename = formatFilename(dataMin, dataMax);
+        if (!filename) filename = formatFilename(dataMin, dataMax, formato);
 
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement("a");